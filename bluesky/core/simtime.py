@@ -88,6 +88,26 @@ def reset():
         timer.reset()
 
 
+def getstate():
+    ''' Return the state of the simulation clock and its timers. '''
+    timers = {name: (timer.dt_requested, timer.dt_act, timer.rel_freq,
+                     timer.counter, timer.tprev) for name, timer in _timers.items()}
+    return dict(t=_clock.t, dt=_clock.dt, timers=timers)
+
+
+def setstate(state):
+    ''' Restore the state of the simulation clock and its timers. '''
+    _clock.t = state['t']
+    _clock.dt = state['dt']
+    _clock.ft = float(_clock.t)
+    _clock.fdt = float(_clock.dt)
+    for name, values in state['timers'].items():
+        timer = _timers.get(name)
+        if timer is not None:
+            timer.dt_requested, timer.dt_act, timer.rel_freq, \
+                timer.counter, timer.tprev = values
+
+
 class Timer:
     ''' Timer class for simulation-time periodic functions. '''
     @classmethod
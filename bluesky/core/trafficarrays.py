@@ -1,131 +1,298 @@
-""" Classes that derive from TrafficArrays (like Traffic) get automated create,
-    delete, and reset functionality for all registered child arrays."""
-# -*- coding: utf-8 -*-
-try:
-    from collections.abc import Collection
-except ImportError:
-    # In python <3.3 collections.abc doesn't exist
-    from collections import Collection
-import numpy as np
-
-defaults = {"float": 0.0, "int": 0, "uint":0, "bool": False, "S": "", "str": ""}
-
-
-class RegisterElementParameters:
-    """ Class to use in 'with'-syntax. This class automatically
-        calls for the _init_trafarrays function of the
-        DynamicArray, with all parameters defined in 'with'."""
-
-    def __init__(self, parent):
-        self._parent = parent
-        self.keys0 = set(parent.__dict__.keys())
-
-    def __enter__(self):
-        pass
-
-    def __exit__(self, exc_type, exc_value, tb):
-        self._parent._init_trafarrays(set(self._parent.__dict__.keys()) - self.keys0)
-
-
-class TrafficArrays:
-    """ Parent class to use separate arrays and lists to allow
-        vectorizing but still maintain and object like benefits
-        for creation and deletion of an element for all parameters"""
-
-    # The TrafficArrays class keeps track of all of the constructed
-    # TrafficArray objects
-    root = None
-    ntraf = 0
-
-    @staticmethod
-    def setroot(obj):
-        ''' This function is used to set the root of the tree of TrafficArray
-            objects (which is the traffic object.)'''
-        TrafficArrays.root = obj
-
-    def __init__(self):
-        super().__init__()
-        self._parent   = TrafficArrays.root
-        if self._parent:
-            self._parent._children.append(self)
-        self._children = []
-        self._ArrVars  = []
-        self._LstVars  = []
-
-    def reparent(self, newparent):
-        ''' Give TrafficArrays object a new parent. '''
-        # Remove myself from the parent list of children, and add to new parent
-        self._parent._children.pop(self._parent._children.index(self))
-        newparent._children.append(self)
-        self._parent = newparent
-
-    def settrafarrays(self):
-        ''' Convenience function for with-style traffic array registration. '''
-        return RegisterElementParameters(self)
-
-    def _init_trafarrays(self, keys):
-        for key in keys:
-            if isinstance(self.__dict__[key], list):
-                self._LstVars.append(key)
-            elif isinstance(self.__dict__[key], np.ndarray):
-                self._ArrVars.append(key)
-            elif isinstance(self.__dict__[key], TrafficArrays):
-                self.__dict__[key].reparent(self)
-
-        # In plugins and replaceable classes it could be that their instance
-        # is created when the simulation is already running, and traffic is
-        # present. Size traffic arrays accordingly here
-        if TrafficArrays.root.ntraf:
-            self.create(TrafficArrays.root.ntraf)
-
-    def create(self, n=1):
-        ''' Append n elements (aircraft) to all lists and arrays. '''
-
-        for v in self._LstVars:  # Lists (mostly used for strings)
-            lst = self.__dict__.get(v)
-            vartype = type(lst[0]).__name__ if lst else 'str'
-            lst.extend([defaults.get(vartype)] * n)
-
-        for v in self._ArrVars:  # Numpy array
-            # Get type without byte length
-            vartype = ''.join(c for c in str(self.__dict__[v].dtype) if c.isalpha())
-            self.__dict__[v] = np.append(self.__dict__[v], [defaults.get(vartype, 0)] * n)
-
-    def istrafarray(self, name):
-        ''' Returns true if parameter 'name' is a traffic array. '''
-        return name in self._LstVars or name in self._ArrVars
-
-    def create_children(self, n=1):
-        ''' Call create (aircraft create) on all children. '''
-        for child in self._children:
-            child.create(n)
-            child.create_children(n)
-
-    def delete(self, idx):
-        ''' Aircraft delete. '''
-        # Remove element (aircraft) idx from all lists and arrays
-        for child in self._children:
-            child.delete(idx)
-
-        for v in self._ArrVars:
-            self.__dict__[v] = np.delete(self.__dict__[v], idx)
-
-        if self._LstVars:
-            if isinstance(idx, Collection):
-                for i in reversed(idx):
-                    for v in self._LstVars:
-                        del self.__dict__[v][i]
-            else:
-                for v in self._LstVars:
-                    del self.__dict__[v][idx]
-
-    def reset(self):
-        ''' Delete all elements from arrays and start at 0 aircraft. '''
-        for child in self._children:
-            child.reset()
-
-        for v in self._ArrVars:
-            self.__dict__[v] = np.array([], dtype=self.__dict__[v].dtype)
-
-        for v in self._LstVars:
-            self.__dict__[v] = []
+""" Classes that derive from TrafficArrays (like Traffic) get automated create,
+    delete, and reset functionality for all registered child arrays."""
+# -*- coding: utf-8 -*-
+import numpy as np
+from bluesky import settings
+
+# Register settings defaults
+settings.set_variable_defaults(traf_float32=False)
+
+defaults = {"float": 0.0, "int": 0, "uint":0, "bool": False, "S": "", "str": ""}
+
+# Minimum number of elements allocated for a traffic array
+mincapacity = 16
+
+# Above this number of deleted elements, arrays and lists are compacted with a
+# gather of all remaining elements, instead of by moving the blocks of
+# elements between the deleted elements
+maxmoves = 32
+
+
+class RegisterElementParameters:
+    """ Class to use in 'with'-syntax. This class automatically
+        calls for the _init_trafarrays function of the
+        DynamicArray, with all parameters defined in 'with'."""
+
+    def __init__(self, parent):
+        self._parent = parent
+        self.keys0 = set(parent.__dict__.keys())
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._parent._init_trafarrays(set(self._parent.__dict__.keys()) - self.keys0)
+
+
+class TrafficArrays:
+    """ Parent class to use separate arrays and lists to allow
+        vectorizing but still maintain and object like benefits
+        for creation and deletion of an element for all parameters"""
+
+    # The TrafficArrays class keeps track of all of the constructed
+    # TrafficArray objects
+    root = None
+    ntraf = 0
+
+    # Names of other (non-traffic array) attributes that are stored in
+    # simulation checkpoints
+    checkpointvars = ()
+
+    # Names of float arrays that are kept in double precision when
+    # settings.traf_float32 is on (positions, and absolute times)
+    float64vars = ()
+
+    @staticmethod
+    def setroot(obj):
+        ''' This function is used to set the root of the tree of TrafficArray
+            objects (which is the traffic object.)'''
+        TrafficArrays.root = obj
+
+    def __init__(self):
+        super().__init__()
+        self._parent   = TrafficArrays.root
+        if self._parent:
+            self._parent._children.append(self)
+        self._children = []
+        self._ArrVars  = []
+        self._LstVars  = []
+        # Capacity-backed storage of the arrays in _ArrVars, as (buffer, view)
+        # tuples. The arrays themselves are views of the first ntraf elements
+        # of these buffers
+        self._buffers  = dict()
+        # Arrays that are stored in a different type than they were
+        # registered with (float32 mode), with their storage type
+        self._dtypes   = dict()
+
+    def reparent(self, newparent):
+        ''' Give TrafficArrays object a new parent. '''
+        # Remove myself from the parent list of children, and add to new parent
+        self._parent._children.pop(self._parent._children.index(self))
+        newparent._children.append(self)
+        self._parent = newparent
+
+    def settrafarrays(self):
+        ''' Convenience function for with-style traffic array registration. '''
+        return RegisterElementParameters(self)
+
+    def _init_trafarrays(self, keys):
+        for key in keys:
+            if isinstance(self.__dict__[key], list):
+                self._LstVars.append(key)
+            elif isinstance(self.__dict__[key], np.ndarray):
+                self._ArrVars.append(key)
+                # In float32 mode, double precision arrays are stored in
+                # single precision, except for the arrays in float64vars
+                if settings.traf_float32 and key not in self.float64vars and \
+                        self.__dict__[key].dtype == np.float64:
+                    self._dtypes[key] = np.dtype(np.float32)
+                    self.__dict__[key] = self.__dict__[key].astype(np.float32)
+            elif isinstance(self.__dict__[key], TrafficArrays):
+                self.__dict__[key].reparent(self)
+
+        # In plugins and replaceable classes it could be that their instance
+        # is created when the simulation is already running, and traffic is
+        # present. Size traffic arrays accordingly here
+        if TrafficArrays.root.ntraf:
+            self.create(TrafficArrays.root.ntraf)
+
+    def create(self, n=1):
+        ''' Append n elements (aircraft) to all lists and arrays. '''
+
+        for v in self._LstVars:  # Lists (mostly used for strings)
+            lst = self.__dict__.get(v)
+            vartype = type(lst[0]).__name__ if lst else 'str'
+            lst.extend([defaults.get(vartype)] * n)
+
+        created = dict()
+        for v in self._ArrVars:  # Numpy array
+            arr = self.__dict__[v]
+            # Names bound to the same array get the same grown array
+            if id(arr) in created:
+                self.aliasarray(v, created[id(arr)][1])
+                continue
+            created[id(arr)] = (arr, v)
+            nold = len(arr)
+            nnew = nold + n
+            buf, view = self._buffers.get(v, (None, None))
+            # Allocate a new buffer when the current one is full, or when the
+            # array was replaced by an array that is not a view of the buffer
+            if view is not arr or nnew > len(buf):
+                capacity = max(mincapacity, 2 * nnew)
+                buf = np.empty(capacity, dtype=storagetype(self._dtypes.get(v, arr.dtype)))
+                buf[:nold] = arr
+            buf[nold:nnew] = filldefault(arr.dtype)
+            self.__dict__[v] = view = buf[:nnew]
+            self._buffers[v] = (buf, view)
+
+    def aliasarray(self, name, first):
+        ''' Bind array name to the (new) array of name first, when both names
+            referred to the same array. '''
+        self.__dict__[name] = self.__dict__[first]
+        if first in self._buffers:
+            self._buffers[name] = self._buffers[first]
+
+    def istrafarray(self, name):
+        ''' Returns true if parameter 'name' is a traffic array. '''
+        return name in self._LstVars or name in self._ArrVars
+
+    def create_children(self, n=1):
+        ''' Call create (aircraft create) on all children. '''
+        for child in self._children:
+            child.create(n)
+            child.create_children(n)
+
+    def delete(self, idx):
+        ''' Aircraft delete. '''
+        # Remove element (aircraft) idx from all lists and arrays
+        for child in self._children:
+            child.delete(idx)
+
+        # Compact all arrays and lists. Elements before the first deleted
+        # element stay in place
+        compact = dict()
+        compacted = dict()
+        for v in self._ArrVars:
+            arr = self.__dict__[v]
+            # Names bound to the same array (e.g., trk = hdg) get the array
+            # that was compacted for the first of these names
+            if id(arr) in compacted:
+                self.aliasarray(v, compacted[id(arr)][1])
+                continue
+            compacted[id(arr)] = (arr, v)
+            if len(arr) not in compact:
+                compact[len(arr)] = compaction(len(arr), idx)
+            moves, nnew, delidx = compact[len(arr)]
+            buf, view = self._buffers.get(v, (None, None))
+            if view is arr:
+                for dst, src in moves:
+                    buf[dst] = arr[src]
+                self.__dict__[v] = view = buf[:nnew]
+                self._buffers[v] = (buf, view)
+            else:
+                self.__dict__[v] = np.delete(arr, delidx)
+
+        for v in self._LstVars:
+            lst = self.__dict__[v]
+            if len(lst) not in compact:
+                compact[len(lst)] = compaction(len(lst), idx)
+            moves, _, delidx = compact[len(lst)]
+            if len(delidx) > maxmoves:
+                dst, src = moves[0]
+                lst[dst.start:] = [lst[i] for i in src.tolist()]
+            else:
+                for i in reversed(delidx.tolist()):
+                    del lst[i]
+
+    def getcheckpoint(self):
+        ''' Return the traffic arrays and lists, and the checkpointvars of
+            this object (without its children). '''
+        names = self._ArrVars + self._LstVars + list(self.checkpointvars)
+        return {v: self.__dict__[v] for v in names}
+
+    def setcheckpoint(self, state, n):
+        ''' Restore the variables in state of this object (without its
+            children). Traffic arrays and lists that are not in state are
+            filled with n default elements. '''
+        self._buffers.clear()
+        for v in self._ArrVars:
+            dtype = storagetype(self._dtypes.get(v, self.__dict__[v].dtype))
+            arr = state.get(v)
+            if arr is not None and dtype.kind in 'US':
+                dtype = np.result_type(dtype, arr.dtype)
+            buf = np.empty(max(mincapacity, 2 * n), dtype=dtype)
+            buf[:n] = arr if arr is not None and len(arr) == n else filldefault(dtype)
+            self.__dict__[v] = view = buf[:n]
+            self._buffers[v] = (buf, view)
+
+        for v in self._LstVars:
+            lst = state.get(v)
+            self.__dict__[v] = list(lst) if lst is not None and len(lst) == n \
+                else [defaults['str']] * n
+
+        for v in self.checkpointvars:
+            if v in state:
+                self.__dict__[v] = state[v]
+
+    def reset(self):
+        ''' Delete all elements from arrays and start at 0 aircraft. '''
+        for child in self._children:
+            child.reset()
+
+        self._buffers.clear()
+        for v in self._ArrVars:
+            self.__dict__[v] = np.array([], dtype=self._dtypes.get(v, self.__dict__[v].dtype))
+
+        for v in self._LstVars:
+            self.__dict__[v] = []
+
+    def castarrays(self):
+        ''' Store arrays that were replaced by an array of another type
+            (e.g., double precision results in float32 mode) in their storage
+            type again. Also calls castarrays on all children. '''
+        for child in self._children:
+            child.castarrays()
+
+        for v, dtype in self._dtypes.items():
+            arr = self.__dict__[v]
+            if arr.dtype != dtype:
+                # Use a new buffer: other objects may still refer to a view
+                # of the old buffer
+                n = len(arr)
+                buf = np.empty(max(mincapacity, 2 * n), dtype=dtype)
+                buf[:n] = arr
+                self.__dict__[v] = view = buf[:n]
+                self._buffers[v] = (buf, view)
+
+
+def storagetype(dtype):
+    ''' Type of the buffer of an array of type dtype. Strings are stored with
+        room for at least 21 characters, also when the array was declared as
+        np.array([], dtype=str). '''
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'US':
+        return np.result_type(dtype, np.dtype(dtype.kind + '21'))
+    return dtype
+
+
+def filldefault(dtype, cache=dict()):
+    ''' Default value of new elements in an array of type dtype. '''
+    if dtype not in cache:
+        # Get type without byte length
+        vartype = ''.join(c for c in str(dtype) if c.isalpha())
+        cache[dtype] = defaults.get(vartype, 0)
+    return cache[dtype]
+
+
+
+def compaction(n, idx):
+    ''' Moves (destination, source) that compact n elements after deleting
+        idx, the remaining number of elements, and the sorted deleted indices. '''
+    delidx = np.unique(np.arange(n)[np.atleast_1d(idx)])
+    nnew = n - len(delidx)
+    if not len(delidx):
+        return [], nnew, delidx
+    if len(delidx) > maxmoves:
+        # Gather all remaining elements after the first deleted element
+        mask = np.ones(n, dtype=bool)
+        mask[delidx] = False
+        i0 = delidx[0]
+        return [(slice(i0, nnew), i0 + np.flatnonzero(mask[i0:]))], nnew, delidx
+    # Move each block of elements between deleted elements
+    moves = []
+    bounds = delidx.tolist() + [n]
+    for k in range(len(delidx)):
+        start, end = bounds[k] + 1, bounds[k + 1]
+        if end > start:
+            moves.append((slice(start - k - 1, end - k - 1), slice(start, end)))
+    return moves, nnew, delidx
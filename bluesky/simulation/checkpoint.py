@@ -0,0 +1,114 @@
+''' Binary checkpoints of the complete simulation state.
+
+    A checkpoint file starts with a header and a pickle of the simulation
+    state: the simulation clock, the scenario stack, and the traffic arrays
+    and checkpointvars of all TrafficArrays objects (including the Route
+    objects of the autopilot, and the conflict and datafeed state). All
+    numpy arrays are stored out-of-band after the pickle, as aligned raw
+    sections which are memory-mapped when the checkpoint is loaded (see
+    cachefile.dumparrays). '''
+import os
+import pickle
+
+import bluesky as bs
+from bluesky.core import simtime
+from bluesky.tools import cachefile
+from bluesky.stack import command
+from bluesky.stack.stackbase import Stack
+
+
+bs.settings.set_variable_defaults(log_path='output')
+
+# File identification, including the version of the file format
+magic = b'BSCKPT01'
+
+
+@command
+def savecheckpoint(fname: 'word'):
+    ''' SAVECHECKPOINT: Save the complete simulation state to a binary
+        checkpoint file.
+
+        Arguments:
+        - fname: The filename of the checkpoint. Without a path the file
+          is stored in the output folder. '''
+    fname = makefname(fname)
+    state = dict(
+        sim=dict(simt=bs.sim.simt, simdt=bs.sim.simdt, utc=bs.sim.utc, dtmult=bs.sim.dtmult),
+        clock=simtime.getstate(),
+        stack=(Stack.scenname, list(Stack.scentime), list(Stack.scencmd)),
+        ntraf=bs.traf.ntraf,
+        traf={name: node.getcheckpoint() for name, node in trafnodes(bs.traf)})
+    try:
+        write(fname, state)
+    except (OSError, pickle.PicklingError) as e:
+        return False, f'SAVECHECKPOINT: Error writing {fname}: {e}'
+    return True, f'SAVECHECKPOINT: Saved {bs.traf.ntraf} aircraft to {fname}'
+
+
+@command
+def loadcheckpoint(fname: 'word'):
+    ''' LOADCHECKPOINT: Restore the simulation state from a checkpoint file.
+        The simulation is put on hold after loading.
+
+        Arguments:
+        - fname: The filename of the checkpoint. Without a path the file
+          is read from the output folder. '''
+    fname = makefname(fname)
+    try:
+        state = read(fname)
+    except (OSError, ValueError, pickle.UnpicklingError) as e:
+        return False, f'LOADCHECKPOINT: Error reading {fname}: {e}'
+
+    bs.sim.reset()
+    simtime.setstate(state['clock'])
+    sim = state['sim']
+    bs.sim.simt, bs.sim.simdt, bs.sim.utc = sim['simt'], sim['simdt'], sim['utc']
+    bs.sim.set_dtmult(sim['dtmult'])
+    Stack.scenname, Stack.scentime, Stack.scencmd = state['stack']
+
+    # Restore all TrafficArrays objects. Objects that are not in the
+    # checkpoint (e.g., of plugins loaded later) get default values
+    ntraf = state['ntraf']
+    for name, node in trafnodes(bs.traf):
+        node.setcheckpoint(state['traf'].get(name, dict()), ntraf)
+    bs.traf.ntraf = ntraf
+
+    bs.sim.hold()
+    return True, f'LOADCHECKPOINT: Loaded {ntraf} aircraft at t={bs.sim.simt:.2f} from {fname}'
+
+
+def makefname(fname):
+    ''' Add the default extension and path to a checkpoint filename. '''
+    if not os.path.splitext(fname)[1]:
+        fname += '.ckpt'
+    if not os.path.dirname(fname):
+        fname = os.path.join(bs.settings.log_path, fname)
+    return fname
+
+
+def trafnodes(node, name='traf'):
+    ''' Iterate over all TrafficArrays objects in the tree of node, with a
+        name that is based on the attribute names of the objects. '''
+    yield name, node
+    names = set()
+    for child in node._children:
+        childname = next((key for key, value in vars(node).items() if value is child),
+                         type(child).__name__)
+        if childname in names:
+            childname += str(len(names))
+        names.add(childname)
+        yield from trafnodes(child, name + '.' + childname)
+
+
+def write(fname, state):
+    ''' Write state to a checkpoint file. '''
+    cachefile.dumparrays(fname, state, magic)
+
+
+def read(fname):
+    ''' Read the state from a checkpoint file. The numpy arrays in the state
+        are copy-on-write memory-mapped sections of the file. '''
+    try:
+        return cachefile.loadarrays(fname, magic)
+    except ValueError:
+        raise ValueError('not a BlueSky checkpoint file')
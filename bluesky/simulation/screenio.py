@@ -325,10 +325,10 @@ class ScreenIO:
             data['type']        = bs.traf.type
             data['tcpamax']     = bs.traf.cd.tcpamax
             data['rpz']         = bs.traf.cd.rpz
-            data['nconf_cur']   = len(bs.traf.cd.confpairs_unique)
-            data['nconf_tot']   = len(bs.traf.cd.confpairs_all)
-            data['nlos_cur']    = len(bs.traf.cd.lospairs_unique)
-            data['nlos_tot']    = len(bs.traf.cd.lospairs_all)
+            data['nconf_cur']   = len(bs.traf.cd.confunique)
+            data['nconf_tot']   = bs.traf.cd.nconf_tot
+            data['nlos_cur']    = len(bs.traf.cd.losunique)
+            data['nlos_tot']    = bs.traf.cd.nlos_tot
             data['trk']         = bs.traf.trk
             data['vs']          = bs.traf.vs
             data['vmin']        = bs.traf.perf.vmin
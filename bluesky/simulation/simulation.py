@@ -10,6 +10,7 @@ import bluesky.core as core
 from bluesky.core import plugin, simtime
 from bluesky.stack import simstack, recorder
 from bluesky.tools import datalog, areafilter, plotter
+from bluesky.simulation import checkpoint  # Registers the checkpoint stack commands
 
 # Minimum sleep interval
 MINSLEEP = 1e-3
@@ -154,6 +154,12 @@ def initbasecmds():
             bs.traf.cre,
             "Create an aircraft",
         ],
+        "CREBULK": [
+            "CREBULK name,[start,end]",
+            "txt,[int,int]",
+            bs.traf.crebulkcmd,
+            "Create the aircraft in rows start to end of stored bulk aircraft data",
+        ],
         "CRECONFS": [
             "CRECONFS id, type, targetid, dpsi, cpa, tlos_hor, dH, tlos_ver, spd",
             "txt,txt,acid,hdg,float,time,[alt,time,spd]",
@@ -133,19 +133,19 @@ def saveic(filename: 'word' = ''):
             cmdline = "ADDWPT " + bs.traf.id[i] + " "
             wpname = route.wpname[iwp]
             if wpname[: len(bs.traf.id[i])] == bs.traf.id[i]:
-                wpname = repr(route.wplat[iwp]) + "," + repr(route.wplon[iwp])
+                wpname = repr(float(route.wplat[iwp])) + "," + repr(float(route.wplon[iwp]))
             cmdline = cmdline + wpname + ","
 
             if route.wpalt[iwp] >= 0.0:
-                cmdline = cmdline + repr(route.wpalt[iwp] / ft) + ","
+                cmdline = cmdline + repr(float(route.wpalt[iwp] / ft)) + ","
             else:
                 cmdline = cmdline + ","
 
             if route.wpspd[iwp] >= 0.0:
                 if route.wpspd[iwp] > 1.0:
-                    cmdline = cmdline + repr(route.wpspd[iwp] / kts)
+                    cmdline = cmdline + repr(float(route.wpspd[iwp] / kts))
                 else:
-                    cmdline = cmdline + repr(route.wpspd[iwp])
+                    cmdline = cmdline + repr(float(route.wpspd[iwp]))
 
             f.write(timtxt + cmdline + "\n")
 
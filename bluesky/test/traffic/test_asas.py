@@ -0,0 +1,366 @@
+"""
+Tests conflict detection implementations against the dense
+state-based reference implementation.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from bluesky import settings
+from bluesky.tools.aero import nm, ft
+from bluesky.traffic.asas import ConflictDetection, StateBased, GridStateBased, MVP
+from bluesky.traffic.asas.incrementalstatebased import CandidatePairs
+from bluesky.traffic.asas import history
+
+
+def random_traffic(ntraf, seed, lon0=5.0, size=2.0):
+    """
+    Generates random traffic in a square area of size x size degrees.
+    """
+    rng = np.random.default_rng(seed)
+    traf = SimpleNamespace(ntraf=ntraf, id=['AC%d' % i for i in range(ntraf)])
+    traf.lat = 52.0 + rng.uniform(-0.5 * size, 0.5 * size, ntraf)
+    traf.lon = lon0 + rng.uniform(-0.5 * size, 0.5 * size, ntraf)
+    traf.lon = (traf.lon + 180.0) % 360.0 - 180.0
+    traf.alt = rng.uniform(0.0, 5000.0, ntraf) * ft
+    traf.trk = rng.uniform(0.0, 360.0, ntraf)
+    traf.gs = rng.uniform(50.0, 250.0, ntraf)
+    traf.vs = rng.uniform(-10.0, 10.0, ntraf)
+    return traf
+
+
+def assert_same_detection(result, reference):
+    """
+    Checks that two sets of conflict detection outputs are equal.
+    """
+    for res, ref in zip(result[0] + result[1], reference[0] + reference[1]):
+        assert np.array_equal(res, ref)
+    for res, ref in zip(result[2:], reference[2:]):
+        assert np.allclose(res, ref)
+
+
+@pytest.mark.parametrize('seed,lon0', [(1, 5.0), (2, 179.5), (3, -179.5)])
+def test_gridstatebased(seed, lon0):
+    """
+    Test grid-based detection on random traffic, also around the dateline.
+
+    Expects exactly the same conflicts as dense state-based detection.
+    """
+    traf = random_traffic(400, seed, lon0)
+    rpz = np.ones(traf.ntraf) * 5.0 * nm
+    hpz = np.ones(traf.ntraf) * 1000.0 * ft
+    dtlook = np.ones(traf.ntraf) * 300.0
+    reference = StateBased.detect(None, traf, traf, rpz, hpz, dtlook)
+    result = GridStateBased.detect(None, traf, traf, rpz, hpz, dtlook)
+
+    assert len(reference[0][0])
+    assert_same_detection(result, reference)
+
+
+def test_pairkeys():
+    """
+    Test stable pair keys of aircraft pairs.
+
+    Expects ordered keys to differ for (a, b) and (b, a), and
+    unique keys to be equal.
+    """
+    uid1 = np.array([0, 3, 7])
+    uid2 = np.array([3, 0, 8])
+    keys = ConflictDetection.pairkey(uid1, uid2)
+    assert len(set(keys)) == 3
+    assert keys[0] >> 32 == 0 and keys[0] & 0xffffffff == 3
+
+    ukeys = ConflictDetection.uniquekey(uid1, uid2)
+    assert ukeys[0] == ukeys[1] != ukeys[2]
+
+
+def test_pairindices():
+    """
+    Test conversion of (acid, acid) conflict pairs to index arrays.
+    """
+    traf = random_traffic(3, 0)
+    traf.id2idx = lambda acids: [traf.id.index(acid) for acid in acids]
+    own, intr = ConflictDetection.pairindices(traf, [('AC2', 'AC0'), ('AC0', 'AC2')])
+    assert own.dtype == np.int32
+    assert list(own) == [2, 0] and list(intr) == [0, 2]
+
+
+@pytest.mark.parametrize('tile', [1, 7, 1000])
+def test_cdtile(monkeypatch, tile):
+    """
+    Test dense state-based detection evaluated in tiles of ownship rows.
+
+    Expects the same conflicts as untiled detection.
+    """
+    traf = random_traffic(300, 4)
+    rpz = np.ones(traf.ntraf) * 5.0 * nm
+    hpz = np.ones(traf.ntraf) * 1000.0 * ft
+    dtlook = np.ones(traf.ntraf) * 300.0
+    monkeypatch.setattr(settings, 'asas_cdtile', 0)
+    reference = StateBased.detect(None, traf, traf, rpz, hpz, dtlook)
+    monkeypatch.setattr(settings, 'asas_cdtile', tile)
+    result = StateBased.detect(None, traf, traf, rpz, hpz, dtlook)
+
+    assert len(reference[0][0])
+    assert_same_detection(result, reference)
+
+
+@pytest.mark.parametrize('nthreads', [1, 3])
+def test_cstatebasedmt(nthreads):
+    """
+    Test the multithreaded native detection, when it is compiled.
+
+    Expects the same conflicts as numpy state-based detection.
+    """
+    casas_mt = pytest.importorskip('bluesky.traffic.asas.casas_mt')
+    traf = random_traffic(400, 5, 179.5)
+    rpz = np.ones(traf.ntraf) * 5.0 * nm
+    hpz = np.ones(traf.ntraf) * 1000.0 * ft
+    dtlook = np.ones(traf.ntraf) * 300.0
+    reference = StateBased.detect(None, traf, traf, rpz, hpz, dtlook)
+    result = casas_mt.detect(traf, traf, rpz, hpz, dtlook, nthreads)
+
+    assert len(reference[0][0])
+    assert_same_detection(result, reference)
+
+
+def test_incrementalstatebased():
+    """
+    Test incremental detection over a number of timesteps, in which
+    part of the traffic moves, and part of it doesn't change state.
+
+    Expects the same conflicts as full state-based detection every timestep,
+    and only re-evaluation of the pairs with moving aircraft.
+    """
+    traf = random_traffic(300, 6)
+    moving = np.arange(traf.ntraf) < 100
+    traf.gs[~moving] = 0.0
+    traf.vs[~moving] = 0.0
+    rpz = np.ones(traf.ntraf) * 5.0 * nm
+    hpz = np.ones(traf.ntraf) * 1000.0 * ft
+    dtlook = np.ones(traf.ntraf) * 60.0
+    pairs = CandidatePairs()
+    rng = np.random.default_rng(6)
+
+    for step in range(30):
+        result = pairs.detect(traf, traf, rpz, hpz, dtlook)
+        reference = StateBased.detect(None, traf, traf, rpz, hpz, dtlook)
+        assert_same_detection(result, reference)
+        if step and pairs.age:
+            changed = moving[pairs.own] | moving[pairs.intr]
+            assert pairs.nevaluated == np.count_nonzero(changed)
+
+        # Move the traffic 5 seconds, and let some aircraft turn
+        turn = moving & (rng.random(traf.ntraf) < 0.05)
+        traf.trk[turn] = rng.uniform(0.0, 360.0, np.count_nonzero(turn))
+        trkrad = np.radians(traf.trk)
+        traf.lat += np.degrees(5.0 * traf.gs * np.cos(trkrad) / 6371000.0)
+        traf.lon += np.degrees(5.0 * traf.gs * np.sin(trkrad) /
+                               (6371000.0 * np.cos(np.radians(traf.lat))))
+        traf.alt += 5.0 * traf.vs
+
+    assert 1 < pairs.nrebuild < 30
+
+
+@pytest.mark.parametrize('priocode', ['FF1', 'FF2', 'FF3', 'LAY1', 'LAY2'])
+def test_mvp_prio(priocode):
+    """
+    Test vectorised MVP resolutions with priority rules for a head-on
+    conflict between a cruising and a climbing aircraft, in both directions.
+
+    Expects opposite horizontal resolutions, and only the aircraft without
+    priority to resolve.
+    """
+    traf = SimpleNamespace(ntraf=2, alt=np.array([1000.0, 1000.0]),
+                           gseast=np.array([0.0, 0.0]), gsnorth=np.array([100.0, -100.0]),
+                           vs=np.array([0.0, 5.0]))
+    conf = SimpleNamespace(rpz=np.ones(2) * 5.0 * nm, hpz=np.ones(2) * 1000.0 * ft,
+                           dtlookahead=np.ones(2) * 300.0)
+    idx1, idx2 = np.array([0, 1]), np.array([1, 0])
+    qdr, dist = np.array([0.0, 180.0]), np.ones(2) * 20.0 * nm
+    tcpa = tLOS = dist / 200.0
+    reso = SimpleNamespace(priocode=priocode, resofach=1.0, resofacv=1.0)
+
+    dv_mvp, _ = MVP.MVP(reso, traf, traf, conf, qdr, dist, tcpa, tLOS, idx1, idx2)
+    assert np.allclose(dv_mvp[:2, 0], -dv_mvp[:2, 1])
+    dv1, _ = MVP.applyprio(reso, dv_mvp, traf.vs[idx1], traf.vs[idx2])
+    solves = {'FF1': [True, True], 'FF2': [False, True], 'FF3': [True, False],
+              'LAY1': [False, True], 'LAY2': [True, False]}[priocode]
+    assert list(np.any(dv1 != 0.0, axis=0)) == solves
+
+
+def mvp_pair(reso, ownship, intruder, conf, qdr, dist, tcpa, tLOS, idx1, idx2):
+    """
+    Reference MVP resolution of a single conflict pair, as computed by
+    MVP.MVP before it was vectorised.
+    """
+    rpz_m = np.max(conf.rpz[[idx1, idx2]] * reso.resofach)
+    hpz_m = np.max(conf.hpz[[idx1, idx2]] * reso.resofacv)
+    dtlook = conf.dtlookahead[idx1]
+    qdr = np.radians(qdr)
+    drel = np.array([np.sin(qdr) * dist, np.cos(qdr) * dist,
+                     intruder.alt[idx2] - ownship.alt[idx1]])
+    v1 = np.array([ownship.gseast[idx1], ownship.gsnorth[idx1], ownship.vs[idx1]])
+    v2 = np.array([intruder.gseast[idx2], intruder.gsnorth[idx2], intruder.vs[idx2]])
+    vrel = v2 - v1
+
+    dcpa = drel + vrel * tcpa
+    dabsH = np.sqrt(dcpa[0] * dcpa[0] + dcpa[1] * dcpa[1])
+    iH = rpz_m - dabsH
+    if dabsH <= 10.:
+        dabsH = 10.
+        dcpa[0] = drel[1] / dist * dabsH
+        dcpa[1] = -drel[0] / dist * dabsH
+    if rpz_m < dist and dabsH < dist:
+        erratum = np.cos(np.arcsin(rpz_m / dist) - np.arcsin(dabsH / dist))
+        dv1 = ((rpz_m / erratum - dabsH) * dcpa[0]) / (abs(tcpa) * dabsH)
+        dv2 = ((rpz_m / erratum - dabsH) * dcpa[1]) / (abs(tcpa) * dabsH)
+    else:
+        dv1 = (iH * dcpa[0]) / (abs(tcpa) * dabsH)
+        dv2 = (iH * dcpa[1]) / (abs(tcpa) * dabsH)
+
+    iV = hpz_m if abs(vrel[2]) > 0.0 else hpz_m - abs(drel[2])
+    tsolV = abs(drel[2] / vrel[2]) if abs(vrel[2]) > 0.0 else tLOS
+    if tsolV > dtlook:
+        tsolV = tLOS
+        iV = hpz_m
+    dv3 = (iV / tsolV) * (-vrel[2] / abs(vrel[2])) if abs(vrel[2]) > 0.0 else iV / tsolV
+    return np.array([dv1, dv2, dv3]), tsolV
+
+
+def applyprio_pair(priocode, dv_mvp, dv1, dv2, vs1, vs2):
+    """
+    Reference priority rules for a single conflict pair, as applied by
+    MVP.applyprio before it was vectorised.
+    """
+    cruise1 = abs(vs1) < 0.1 and abs(vs2) > 0.1
+    cruise2 = abs(vs2) < 0.1 and abs(vs1) > 0.1
+    if priocode == 'FF1':
+        dv_mvp[2] = dv_mvp[2] / 2.0
+        return dv1 - dv_mvp, dv2 + dv_mvp
+    if priocode in ('FF2', 'LAY1'):
+        dv_mvp[2] = dv_mvp[2] / 2.0 if priocode == 'FF2' else 0.0
+        if cruise1:
+            return dv1, dv2 + dv_mvp
+        if cruise2:
+            return dv1 - dv_mvp, dv2
+        return dv1 - dv_mvp, dv2 + dv_mvp
+    if priocode == 'FF3' and not (cruise1 or cruise2):
+        dv_mvp[2] = dv_mvp[2] / 2.0
+        return dv1 - dv_mvp, dv2 + dv_mvp
+    # FF3 with one cruising aircraft, and LAY2
+    dv_mvp[2] = 0.0
+    if cruise1:
+        return dv1 - dv_mvp, dv2
+    if cruise2:
+        return dv1, dv2 + dv_mvp
+    return dv1 - dv_mvp, dv2 + dv_mvp
+
+
+@pytest.mark.parametrize('priocode', [None, 'FF1', 'FF2', 'FF3', 'LAY1', 'LAY2'])
+def test_mvp_reference(priocode):
+    """
+    Test vectorised MVP resolution of random traffic with many multi-aircraft
+    conflicts, including noreso and resooff aircraft, against a loop over the
+    conflict pairs with the previous per-pair implementation.
+
+    Expects the same resolution (new track, ground speed and vertical speed)
+    for each aircraft, the same vertical solve times for each pair, and no
+    vertical resolutions with the LAY1/LAY2 priority rules.
+    """
+    traf = random_traffic(200, 7, size=0.5)
+    trkrad = np.radians(traf.trk)
+    traf.gseast, traf.gsnorth = traf.gs * np.sin(trkrad), traf.gs * np.cos(trkrad)
+    # A quarter of the aircraft is cruising, to exercise the priority rules
+    traf.vs[::4] = 0.0
+    traf.selalt = traf.alt.copy()
+    traf.ap = SimpleNamespace(vs=traf.vs.copy())
+    traf.perf = SimpleNamespace(vmin=0.0, vmax=1e9, vsmin=-1e9, vsmax=1e9)
+    conf = SimpleNamespace(rpz=np.ones(traf.ntraf) * 5.0 * nm, hpz=np.ones(traf.ntraf) * 1000.0 * ft,
+                           dtlookahead=np.ones(traf.ntraf) * 300.0)
+    (conf.confown, conf.confint), _, _, _, conf.qdr, conf.dist, _, conf.tcpa, conf.tLOS = \
+        StateBased.detect(None, traf, traf, conf.rpz, conf.hpz, conf.dtlookahead)
+    assert len(conf.confown) > 2 * len(np.unique(conf.confown))
+
+    reso = SimpleNamespace(swprio=priocode is not None, priocode=priocode, resofach=1.05, resofacv=1.05,
+                           noresoac=np.arange(traf.ntraf) % 10 == 1, resooffac=np.arange(traf.ntraf) % 10 == 2,
+                           swresohoriz=False, swresospd=False, swresohdg=False, swresovert=False)
+    reso.MVP = MVP.MVP.__get__(reso)
+    reso.applyprio = MVP.applyprio.__get__(reso)
+
+    # Previous implementation: loop over the conflict pairs
+    dv = np.zeros((traf.ntraf, 3))
+    tsolref = []
+    for idx1, idx2, qdr, dist, tcpa, tLOS in zip(conf.confown, conf.confint, conf.qdr,
+                                                 conf.dist, conf.tcpa, conf.tLOS):
+        dv_mvp, tsolV = mvp_pair(reso, traf, traf, conf, qdr, dist, tcpa, tLOS, idx1, idx2)
+        tsolref.append(tsolV)
+        if reso.swprio:
+            dv[idx1], _ = applyprio_pair(priocode, dv_mvp, dv[idx1], dv[idx2], traf.vs[idx1], traf.vs[idx2])
+        else:
+            dv_mvp[2] = 0.5 * dv_mvp[2]
+            dv[idx1] = dv[idx1] - dv_mvp
+        if reso.noresoac[idx2]:
+            dv[idx1] = dv[idx1] + dv_mvp
+        if reso.resooffac[idx1]:
+            dv[idx1] = 0.0
+
+    _, tsolV = reso.MVP(traf, traf, conf, conf.qdr, conf.dist, conf.tcpa, conf.tLOS,
+                        conf.confown, conf.confint)
+    assert np.allclose(tsolV, tsolref)
+
+    newtrack, newgs, newvs, _ = MVP.resolve(reso, conf, traf, traf)
+    newe, newn = traf.gseast + dv[:, 0], traf.gsnorth + dv[:, 1]
+    assert np.allclose(newgs, np.sqrt(newe ** 2 + newn ** 2))
+    assert np.allclose(np.sin(np.radians(newtrack - np.degrees(np.arctan2(newe, newn)))), 0.0, atol=1e-9)
+    assert np.allclose(newvs, traf.vs + dv[:, 2])
+    assert np.all(dv[reso.resooffac] == 0.0) and np.any(dv[:, :2] != 0.0)
+    if priocode in ('LAY1', 'LAY2'):
+        assert np.array_equal(newvs, traf.vs)
+    else:
+        assert np.any(newvs != traf.vs)
+
+
+def test_uid2idx():
+    """
+    Test lookup of traffic indices from unique aircraft id's.
+
+    Expects -1 for aircraft that no longer exist.
+    """
+    conf = SimpleNamespace(uid=np.array([2, 5, 9, 11]))
+    idx = ConflictDetection.uid2idx(conf, np.array([9, 2, 3, 11, 12]))
+    assert list(idx) == [2, 0, -1, 3, -1]
+
+
+def test_conflicthistory(monkeypatch, tmp_path):
+    """
+    Test the conflict history with events that begin and end over a
+    number of timesteps, with a buffer of two records.
+
+    Expects one record per event with start time, end time and minimum
+    dcpa, all finished records in the log file with their full callsigns,
+    and the unique pairs of the events in memory.
+    """
+    monkeypatch.setattr(settings, 'asas_histsize', 2)
+    hist = history.ConflictHistory('CONF')
+    acid = ['AC0', 'AC1', 'KLM1234567890', 'AC3']
+    own, intr = np.array([0, 2, 0]), np.array([1, 3, 3])
+    keys = ConflictDetection.uniquekey(own, intr)
+    hist.file = open(tmp_path / 'hist.bin', 'wb')
+    for t, sel, dcpa in ((0.0, [0], [300.0]), (1.0, [0, 1], [200.0, 400.0]),
+                         (2.0, [1], [100.0]), (3.0, [1, 2], [500.0, 50.0]),
+                         (4.0, [], []), (5.0, [0], [10.0])):
+        hist.update(t, keys[sel], own[sel], intr[sel], acid, np.array(dcpa))
+
+    assert hist.ntotal == 4
+    pairs = hist.uniquepairs()
+    assert len(pairs) == 3 and set(pairs) == {frozenset(('AC0', 'AC1')), frozenset(('AC0', 'AC3')),
+                                              frozenset(('KLM1234567890', 'AC3'))}
+    hist.close()
+    rec = np.sort(np.fromfile(tmp_path / 'hist.bin', dtype=history.record), order='tstart')
+    assert list(rec['tstart']) == [0.0, 1.0, 3.0]
+    assert list(rec['tend']) == [2.0, 4.0, 4.0]
+    assert list(rec['dcpamin']) == [200.0, 100.0, 50.0]
+    assert rec['acid1'][1] == b'KLM1234567890' and rec['acid2'][1] == b'AC3'
+    assert list(hist.records()['tstart']) == [5.0]
+    assert hist.uniquepairs() == [frozenset(('AC0', 'AC1'))]
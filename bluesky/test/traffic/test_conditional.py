@@ -0,0 +1,60 @@
+"""
+Tests the conditional commands (ATALT, ATSPD, ATDIST).
+"""
+from types import SimpleNamespace
+import numpy as np
+
+import bluesky as bs
+from bluesky.tools.aero import ft
+from bluesky.traffic import conditional
+
+
+def test_conditions(monkeypatch):
+    """
+    Test conditions of a number of aircraft, while the aircraft climb,
+    accelerate and fly north, and aircraft are deleted.
+
+    Expects each command to be issued once, in the timestep in which its
+    condition becomes true, and no commands of deleted aircraft.
+    """
+    n = 6
+    traf = SimpleNamespace(ntraf=n, id=[f'AC{i}' for i in range(n)],
+                           alt=np.zeros(n), cas=np.full(n, 100.0), tas=np.full(n, 100.0),
+                           lat=np.zeros(n), lon=np.zeros(n))
+    monkeypatch.setattr(bs, 'traf', traf, raising=False)
+    issued = []
+    monkeypatch.setattr(conditional.stack, 'stack', issued.append)
+
+    cond = conditional.Condition()
+    for i in range(n):
+        cond.ataltcmd(i, (1500 + 1000 * i) * ft, f'AC{i} ALT')
+        cond.atspdcmd(i, 101.5 + 2.0 * i, f'AC{i} SPD')
+        cond.atdistcmd(i, 1.0, 0.0, 56.0 - 11.0 * i, f'AC{i} DIST')
+    assert cond.ncond == 3 * n
+
+    # Step in which each command is issued
+    expected = {2: ['AC0 ALT', 'AC0 SPD'], 1: ['AC0 DIST'],
+                3: ['AC1 ALT', 'AC1 DIST'], 4: ['AC1 SPD', 'AC2 ALT'],
+                5: ['AC2 DIST', 'AC3 ALT'], 6: ['AC2 SPD'],
+                7: ['AC3 DIST', 'AC5 ALT'], 8: ['AC3 SPD'], 10: ['AC5 DIST']}
+
+    # Climb 1000 ft, accelerate 1 m/s and fly 6 nm north per step
+    for step in range(1, 12):
+        traf.alt += 1000 * ft
+        traf.cas += 1.0
+        traf.lat += 0.1
+        if step == 5:
+            # Delete AC1 and AC4: indices of AC5 and later shift
+            keep = [0, 2, 3, 5]
+            cond.delete([1, 4])
+            traf.ntraf = len(keep)
+            for name in ('alt', 'cas', 'tas', 'lat', 'lon'):
+                setattr(traf, name, getattr(traf, name)[keep])
+            traf.id = [traf.id[i] for i in keep]
+        issued.clear()
+        cond.update()
+        assert sorted(issued) == expected.get(step, []), step
+
+    assert cond.ncond == 1
+    assert list(cond.acidx) == [3]
+    assert cond.cmd == ['AC5 SPD']
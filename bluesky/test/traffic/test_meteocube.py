@@ -0,0 +1,88 @@
+"""
+Tests the in-memory meteo cubes of the HIGHRES mode.
+"""
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+import bluesky as bs
+from bluesky.tools import Functions
+from bluesky.tools.aero import ft
+from bluesky.traffic.meteocube import MeteoCube, MeteoSlice
+
+
+def meteorows(rng, stamp):
+    """ Rows of a meteo database table on a 0.1 deg grid, with descending
+        height levels [ft] that are the same in each column. """
+    lat, lon, alt = np.meshgrid(np.round(np.arange(51.0, 51.55, 0.1), 1),
+                                np.round(np.arange(3.0, 3.75, 0.1), 1),
+                                np.arange(40000.0, -1.0, -5000.0), indexing='ij')
+    n = lat.size
+    return pd.DataFrame(dict(timestamp_data=np.full(n, stamp), timestamp_prediction=np.full(n, stamp),
+                             lon=lon.ravel(), lat=lat.ravel(), alt=alt.ravel(),
+                             uwind=rng.uniform(-30.0, 30.0, n), vwind=rng.uniform(-30.0, 30.0, n)))
+
+
+def test_meteoslice():
+    """
+    Test the vectorised interpolation of a meteo slice made of database rows.
+
+    Expects the same wind as the interpolation of the database rows for
+    each single position, and zero wind below the lowest level.
+    """
+    rng = np.random.default_rng(0)
+    df = meteorows(rng, 211001003)
+    meteo = MeteoSlice.fromrows(df['lat'].to_numpy(), df['lon'].to_numpy(), df['alt'].to_numpy() * ft,
+                                df['uwind'].to_numpy(), df['vwind'].to_numpy())
+    assert meteo.alt.shape == (6, 8, 9)
+
+    lat, lon = rng.uniform(51.0, 51.5, 20), rng.uniform(3.0, 3.7, 20)
+    alt = np.append(rng.uniform(100.0, 39000.0, 18), [-100.0, 41000.0]) * ft
+    uwind, vwind, inside = meteo.interp(lat, lon, alt)
+    assert np.all(inside)
+    for i in range(len(lat)):
+        value = Functions.find_datapoint_timeframe(df, [0, alt[i] / ft, lat[i], lon[i]])
+        assert np.isclose(uwind[i], value[4], atol=1e-3) and np.isclose(vwind[i], value[5], atol=1e-3)
+    assert uwind[-2] == 0.0 and uwind[-1] != 0.0
+
+    # Columns with different numbers of levels
+    df = df[(df['lat'] != 51.0) | (df['alt'] < 40000.0)]
+    meteo = MeteoSlice.fromrows(df['lat'].to_numpy(), df['lon'].to_numpy(), df['alt'].to_numpy() * ft,
+                                df['uwind'].to_numpy(), df['vwind'].to_numpy())
+    assert np.isnan(meteo.alt[0, 0, -1]) and not np.isnan(meteo.alt[1, 0, -1])
+    uwind, _, _ = meteo.interp(np.array([51.0]), np.array([3.0]), np.array([37000.0 * ft]))
+    assert np.isclose(uwind[0], 1.4 * meteo.uwind[0, 0, 7] - 0.4 * meteo.uwind[0, 0, 6])
+
+
+def test_meteocube(monkeypatch, tmp_path):
+    """
+    Test loading the meteo slices around the simulation time from npz files.
+
+    Expects the wind interpolated in time between the slices, no wind for
+    positions outside the meteo grid, and the next slice to be prefetched.
+    """
+    monkeypatch.setattr(bs.settings, 'meteo_path', str(tmp_path), raising=False)
+    rng = np.random.default_rng(1)
+    (tmp_path / 'demo').mkdir()
+    for stamp in ('211001003', '211001004', '211001005'):
+        df = meteorows(rng, stamp)
+        MeteoSlice.fromrows(df['lat'].to_numpy(), df['lon'].to_numpy(), df['alt'].to_numpy() * ft,
+                            df['uwind'].to_numpy(), df['vwind'].to_numpy()).save(tmp_path / 'demo' / f'{stamp}.npz')
+
+    cube = MeteoCube('demo')
+    lat, lon, alt = np.array([51.23, 52.0]), np.array([3.31, 3.31]), np.full(2, 12345.0 * ft)
+    cube.settime(datetime(2021, 10, 1, 0, 30))
+    u1, v1, inside = cube.slices[0].interp(lat, lon, alt)
+    u2, v2, _ = cube.slices[1].interp(lat, lon, alt)
+    assert list(inside) == [True, False]
+
+    vn, ve, inside = cube.getdata(datetime(2021, 10, 1, 0, 32, 30), lat, lon, alt)
+    assert cube.stamps == ('211001003', '211001004')
+    assert np.allclose(vn, 0.75 * u1 + 0.25 * u2) and np.allclose(ve, 0.75 * v1 + 0.25 * v2)
+    assert list(inside) == [True, False]
+    assert (cube.loader.hits, cube.loader.misses) == (0, 2)
+
+    cube.settime(datetime(2021, 10, 1, 0, 40))
+    assert cube.stamps == ('211001004', '211001005')
+    assert (cube.loader.hits, cube.loader.misses) == (2, 2)
+    assert np.array_equal(cube.slices[0].uwind, cube.loader.get('211001004').uwind)
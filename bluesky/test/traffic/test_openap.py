@@ -0,0 +1,79 @@
+"""
+Tests the per-type coefficient tables of the OpenAP performance model,
+and their binary cache.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+import bluesky as bs
+from bluesky.core import TrafficArrays
+from bluesky.tools import cachefile
+from bluesky.traffic.performance.openap import coeff, perfoap
+
+
+class Root(TrafficArrays):
+    def __init__(self):
+        super().__init__()
+        self.ntraf = 0
+
+
+def test_openap_mixed_create(monkeypatch, tmp_path):
+    """
+    Test creating aircraft of different types, including a synonym and an
+    unknown type, in a single create.
+
+    Expects the coefficients of each aircraft's own type, the same as
+    when the aircraft are created one by one.
+    """
+    types = ['B738', 'EC35', 'A320', 'xxxx', 'B744', 'A320']
+    monkeypatch.setattr(bs.settings, 'cache_path', str(tmp_path), raising=False)
+    monkeypatch.setattr(bs, 'scr', SimpleNamespace(echo=lambda *args: None), raising=False)
+    monkeypatch.setattr(bs, 'traf', SimpleNamespace(type=types), raising=False)
+    monkeypatch.setattr(TrafficArrays, 'root', Root())
+    perf = object.__new__(perfoap.OpenAP)
+    perf.__init__()
+    perf.create(len(types))
+
+    single = object.__new__(perfoap.OpenAP)
+    single.__init__()
+    for i, actype in enumerate(types):
+        bs.traf.type = [actype]
+        single.create(1)
+        typeid, _ = single.coeff.gettypeid(actype.upper())
+        assert perf.typeid[i] == typeid
+        for name in coeff.table_params:
+            assert np.allclose(getattr(perf, name)[i], getattr(single, name)[i], equal_nan=True)
+
+    assert list(perf.lifttype) == [1, 2, 1, 1, 1, 1]
+    assert perf.mass[0] != perf.mass[2]
+    assert perf.typeid[3] == perf.typeid[4]
+
+
+def test_openap_cache(monkeypatch, tmp_path):
+    """
+    Test loading the OpenAP coefficients from the binary cache, and
+    invalidation of the cache when a source file changes.
+
+    Expects the same coefficient tables as parsed from the data files,
+    and a cache error when the cache is out of date.
+    """
+    monkeypatch.setattr(bs.settings, 'cache_path', str(tmp_path), raising=False)
+    parsed = coeff.Coefficient()
+    cached = coeff.Coefficient()
+    # Tables are views on the memory-mapped cache file
+    assert not cached.tables['mass'].flags.owndata
+    assert cached.typeids == parsed.typeids
+    for name, table in parsed.tables.items():
+        assert np.array_equal(cached.tables[name], table, equal_nan=True)
+
+    source = tmp_path / 'source.txt'
+    source.write_text('1')
+    with cachefile.openarrays('test.npc', 'v1', [str(source)]) as cache:
+        cache.dump(dict(table=np.arange(10)))
+        assert list(cache.load()['table']) == list(range(10))
+    source.write_text('12')
+    for version, sources in (('v1', [str(source)]), ('v2', [])):
+        with cachefile.openarrays('test.npc', version, sources) as cache:
+            with pytest.raises(cachefile.CacheError):
+                cache.load()
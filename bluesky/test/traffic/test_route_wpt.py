@@ -79,38 +79,38 @@ def test_addwpt_data(route_):
     route = route_.Route()
 
     # All init values must be empty lists
-    assert route.wpname == route.wplat == route.wplon == route.wpalt == \
-        route.wpspd == route.wptype == route.wpflyby == []
+    assert route.wpname == list(route.wplat) == list(route.wplon) == list(route.wpalt) == \
+        list(route.wpspd) == list(route.wptype) == list(route.wpflyby) == []
 
     # Add new waypoint and check if added correctly
     route.addwpt_data(False, 0, 'FOO', 10., -10., 0, 1000., 100.)
     assert route.wpname == ['FOO']
-    assert route.wplat == [10.]
-    assert route.wplon == [-10.]
-    assert route.wpalt == [1000.]
-    assert route.wpspd == [100.]
-    assert route.wptype == [0]
-    assert route.wpflyby == [False]
+    assert list(route.wplat) == [10.]
+    assert list(route.wplon) == [-10.]
+    assert list(route.wpalt) == [1000.]
+    assert list(route.wpspd) == [100.]
+    assert list(route.wptype) == [0]
+    assert list(route.wpflyby) == [False]
 
     # Add another waypoint, see if both this and previous are in list
     route.addwpt_data(False, 0, 'BAZ', 20., -20., 0, 2000., 200.)
     assert route.wpname == ['BAZ', 'FOO']
-    assert route.wplat == [20., 10.]
-    assert route.wplon == [-20., -10.]
-    assert route.wpalt == [2000., 1000.]
-    assert route.wpspd == [200., 100.]
-    assert route.wptype == [0, 0]
-    assert route.wpflyby == [True, False]
+    assert list(route.wplat) == [20., 10.]
+    assert list(route.wplon) == [-20., -10.]
+    assert list(route.wpalt) == [2000., 1000.]
+    assert list(route.wpspd) == [200., 100.]
+    assert list(route.wptype) == [0, 0]
+    assert list(route.wpflyby) == [True, False]
 
     # This waypoint must overwrite FOO (which was previously at index 1)
     route.addwpt_data(True, 1, 'BAR', 30., -30., 0, 3000., 300.)
     assert route.wpname == ['BAZ', 'BAR']
-    assert route.wplat == [20., 30.]
-    assert route.wplon == [-20., -30.]
-    assert route.wpalt == [2000., 3000.]
-    assert route.wpspd == [200., 300.]
-    assert route.wptype == [0, 0]
-    assert route.wpflyby == [True, True]
+    assert list(route.wplat) == [20., 30.]
+    assert list(route.wplon) == [-20., -30.]
+    assert list(route.wpalt) == [2000., 3000.]
+    assert list(route.wpspd) == [200., 300.]
+    assert list(route.wptype) == [0, 0]
+    assert list(route.wpflyby) == [True, True]
 
 
 def test_add_wp_orig(traffic_, route_):
@@ -210,23 +210,23 @@ def test_add_wp_normal(traffic_, route_):
     assert idx == 0
     assert route.nwp == 1
 
-    assert route.wplat == [10.]
-    assert route.wplon == [-10.]
-    assert route.wpalt == [1000.]
-    assert route.wpspd == [100.]
+    assert list(route.wplat) == [10.]
+    assert list(route.wplon) == [-10.]
+    assert list(route.wpalt) == [1000.]
+    assert list(route.wpspd) == [100.]
     assert route.wpname == ['BAZ']
-    assert route.wptype == [0]
+    assert list(route.wptype) == [0]
 
     idx = route.addwpt(    # don't worry too much re numbers here
         idx, 'BAZ', route.runway, 20., -20., 2000., 200., 'BAZ', '')
     assert idx == 1
 
-    assert route.wplat == [10., 20.]
-    assert route.wplon == [-10., -20.]
-    assert route.wpalt == [1000., 2000.]
-    assert route.wpspd == [100., 200.]
+    assert list(route.wplat) == [10., 20.]
+    assert list(route.wplon) == [-10., -20.]
+    assert list(route.wpalt) == [1000., 2000.]
+    assert list(route.wpspd) == [100., 200.]
     assert route.wpname == ['BAZ', 'BAZ01']
-    assert route.wptype == [0, 5]
+    assert list(route.wptype) == [0, 5]
 
     idx = route.addwpt(  # don't worry too much re numbers here
         idx, 'FANBAN', route.wpnav, 30., -30., 3000., 300., '', 'BAZ')
@@ -238,10 +238,10 @@ def test_add_wp_normal(traffic_, route_):
 
     assert_fl(route.wplat[0], 53.48)
     assert_fl(route.wplon[0], -5.5)
-    assert route.wpalt == [3000., 1000., 2000.]
-    assert route.wpspd == [300., 100., 200.]
+    assert list(route.wpalt) == [3000., 1000., 2000.]
+    assert list(route.wpspd) == [300., 100., 200.]
     assert route.wpname == ['LIFFY', 'BAZ', 'BAZ01']
-    assert route.wptype == [1, 0, 5]
+    assert list(route.wptype) == [1, 0, 5]
 
     idx = route.addwpt(  # don't worry too much re numbers here
         idx, 'EGKK', route.wpnav, 0., 0., 50., 50., '', '')
@@ -249,10 +249,10 @@ def test_add_wp_normal(traffic_, route_):
 
     assert_fl(route.wplat[3], 51.14)
     assert_fl(route.wplon[3], -0.19)
-    assert route.wpalt == [3000., 1000., 2000., 50.]
-    assert route.wpspd == [300., 100., 200., 50.]
+    assert list(route.wpalt) == [3000., 1000., 2000., 50.]
+    assert list(route.wpspd) == [300., 100., 200., 50.]
     assert route.wpname == ['LIFFY', 'BAZ', 'BAZ01', 'EGKK']
-    assert route.wptype == [1, 0, 5, 1]
+    assert list(route.wptype) == [1, 0, 5, 1]
 
 
 def test_addwpt_stack_setflyby(traffic_, route_):
@@ -308,10 +308,10 @@ def test_addwpt_stack_takeoffwp(traffic_, route_):
 
     assert_fl(route.wplat[0], 51.15)
     assert_fl(route.wplon[0], -0.15)
-    assert route.wpalt == [-999.]
-    assert route.wpspd == [-999.]
+    assert list(route.wpalt) == [-999.]
+    assert list(route.wpspd) == [-999.]
     assert route.wpname == ['T/O-BA222']
-    assert route.wptype == [0]
+    assert list(route.wptype) == [0]
 
     traffic_.ap.route[idx] = route
 
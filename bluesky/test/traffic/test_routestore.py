@@ -0,0 +1,89 @@
+"""
+Tests the columnar route store, and the vectorised route queries.
+"""
+import numpy as np
+
+from bluesky.tools import geo
+from bluesky.traffic import routestore
+
+
+def test_routestore_segments():
+    """
+    Test inserting and deleting waypoints in a number of routes, while
+    routes are created and deleted.
+
+    Expects the same waypoints as in a list per route, also after
+    routes have moved and the store has been compacted.
+    """
+    rng = np.random.default_rng(0)
+    store = routestore.RouteStore()
+    routes = {store.alloc(): [] for _ in range(20)}
+    for step in range(2000):
+        slot = rng.choice(list(routes))
+        wps = routes[slot]
+        if wps and rng.random() < 0.3:
+            i = int(rng.integers(len(wps)))
+            store.delete(slot, i)
+            del wps[i]
+        else:
+            i = int(rng.integers(-2, len(wps) + 2))
+            lat = rng.uniform(-90.0, 90.0)
+            store.insert(slot, i, lat=lat, type=step)
+            wps.insert(i, (lat, step))
+        if rng.random() < 0.01:
+            store.free(slot)
+            del routes[slot]
+            routes[store.alloc()] = []
+
+    assert store.nunused > 0
+    for compact in (False, True):
+        if compact:
+            store.compact()
+            assert store.nunused == 0
+        for slot, wps in routes.items():
+            assert list(store.column(slot, 'lat')) == [wp[0] for wp in wps]
+            assert list(store.column(slot, 'type')) == [wp[1] for wp in wps]
+            assert np.all(store.column(slot, 'alt') == -999.)
+
+
+def test_routestore_queries():
+    """
+    Test vectorised active waypoint, next leg direction and distance
+    to go of a set of routes.
+
+    Expects the same values as per-route calculations, and default values
+    for routes without (next) active waypoint.
+    """
+    rng = np.random.default_rng(1)
+    store = routestore.RouteStore()
+    slots = np.array([store.alloc() for _ in range(50)])
+    for slot in slots:
+        nwp = int(rng.integers(0, 6))
+        store.resize(slot, nwp)
+        store.column(slot, 'lat')[:] = rng.uniform(50.0, 54.0, nwp)
+        store.column(slot, 'lon')[:] = rng.uniform(2.0, 8.0, nwp)
+        store.column(slot, 'distto')[1:] = rng.uniform(10.0, 100.0, max(0, nwp - 1))
+        store.iactwp[slot] = rng.integers(-1, nwp) if nwp else -1
+
+    lat = rng.uniform(50.0, 54.0, len(slots))
+    lon = rng.uniform(2.0, 8.0, len(slots))
+    wplat, wplon = store.getactwp(slots, 'lat', 'lon')
+    nextqdr = store.nextqdr(slots)
+    disttogo = store.disttogo(slots, lat, lon)
+
+    for i, slot in enumerate(slots):
+        iactwp, nwp = store.iactwp[slot], store.nwp[slot]
+        rtelat, rtelon = store.column(slot, 'lat'), store.column(slot, 'lon')
+        if iactwp < 0:
+            assert wplat[i] == 0.0 and disttogo[i] == 0.0 and nextqdr[i] == -999.
+            continue
+        assert wplat[i] == rtelat[iactwp] and wplon[i] == rtelon[iactwp]
+        dist = geo.qdrdist(lat[i], lon[i], rtelat[iactwp], rtelon[iactwp])[1] + \
+            np.sum(store.column(slot, 'distto')[iactwp + 1:])
+        assert np.isclose(disttogo[i], dist)
+        if iactwp < nwp - 1:
+            qdr = geo.qdrdist(rtelat[iactwp], rtelon[iactwp],
+                              rtelat[iactwp + 1], rtelon[iactwp + 1])[0]
+            assert np.isclose(nextqdr[i], qdr)
+        else:
+            assert nextqdr[i] == -999.
@@ -147,3 +147,141 @@ def test_traffic_reset(traffic_):
 
 
 # test remaining traffic functions
+
+
+def test_traffic_idmap():
+    """
+    Test the aircraft id map of traffic over a number of creates and
+    deletes, on a traffic object with only an id list and a lat array.
+
+    Expects the same indices as a linear search in the id list.
+    """
+    import numpy as np
+    from bluesky.traffic.traffic import Traffic
+
+    traf = object.__new__(Traffic)
+    traf.__dict__.update(_children=[], _ArrVars=['lat'], _LstVars=['id'], _buffers={}, _dtypes={},
+                         id=[], lat=np.array([]), ntraf=0, idmap={}, idmapvalid=0)
+
+    for i in range(20):
+        traf.create(3)
+        traf.ntraf += 3
+        traf.id[-3:] = ['AC%d' % (3 * i + j) for j in range(3)]
+        traf.idmapvalid = min(traf.idmapvalid, traf.ntraf - 3)
+        if i % 4 == 1:
+            traf.delete([0, traf.ntraf - 2])
+        elif i % 4 == 3:
+            traf.delete(traf.ntraf // 2)
+        acids = ['AC%d' % j for j in range(3 * i + 3)]
+        expected = [traf.id.index(acid) if acid in traf.id else -1 for acid in acids]
+        assert traf.id2idx(acids) == expected
+        assert traf.id2idx(acids[-1].lower()) == expected[-1]
+
+    assert list(traf.ids2idx(['AC1', 'AC59'])) == [-1, traf.ntraf - 1]
+
+
+def test_traffic_crebulk(traffic_):
+    """
+    Test bulk creation of aircraft with data feed source, SSR code, flight
+    type, WTC, arrival and SID, including a duplicate callsign, an existing
+    callsign and missing (NaN) values.
+
+    Expects the same aircraft as per-aircraft CRE, SETDATAFEED, SSRCODE,
+    FLIGHTTYPE, WTC, ARR and SID, and the duplicate and existing aircraft
+    to be skipped.
+    """
+    import numpy as np
+    nan = np.nan
+
+    traffic_.reset()
+    traffic_.cre('BLK3', 'B744', 50.0, 3.0, 0.0, 1000.0, 100.0)
+    data = dict(acid=['BLK1', 'blk2', 'BLK3', 'BLK1', 'BLK4'],
+                actype=['B738', 'A320', 'B738', 'B744', 'A320'],
+                aclat=[52.0, 52.1, 52.2, 52.3, 52.4], aclon=4.0,
+                achdg=[90.0, 180.0, 270.0, 0.0, 45.0],
+                acalt=[3000.0, 2000.0, 1000.0, 500.0, 4000.0], acspd=[150.0, 160.0, 170.0, 180.0, 190.0],
+                source=['OPENSKY', nan, 'OPENSKY', '', 'VEMMIS'],
+                ssr=[1234.0, nan, 4321.0, 0.0, 777.0],
+                flighttype=['inbound', 'outbound', nan, 'inbound', nan],
+                wtc=['M', 'M', 'H', 'H', nan],
+                arr=['ARTIP', nan, 'RIVER', 'SUGOL', 'ARTIP'],
+                sid=[nan, 'lam1a', nan, nan, 'ARNE1A'])
+
+    # Reference: per-aircraft creation with the stack command functions
+    for i in (0, 1, 4):
+        row = {key: values[i] if isinstance(values, list) else values for key, values in data.items()}
+        acid = 'REF' + row['acid'].upper()
+        traffic_.cre(acid, row['actype'], row['aclat'], row['aclon'], row['achdg'],
+                     row['acalt'], row['acspd'])
+        idx = traffic_.id2idx(acid)
+        if isinstance(row['source'], str) and row['source']:
+            traffic_.trafdatafeed.setdatafeed(idx, row['source'])
+        if not np.isnan(row['ssr']):
+            traffic_.lvnlvars.setssr(idx, row['ssr'])
+        if isinstance(row['flighttype'], str):
+            traffic_.lvnlvars.setflighttype(idx, row['flighttype'])
+        if isinstance(row['wtc'], str):
+            traffic_.lvnlvars.setwtc(idx, row['wtc'])
+        if isinstance(row['arr'], str):
+            traffic_.lvnlvars.setarr(idx, row['arr'], False)
+        if isinstance(row['sid'], str):
+            traffic_.lvnlvars.setsid(idx, row['sid'], False)
+
+    idx = traffic_.crebulk(**data)
+    assert list(idx) == traffic_.id2idx(['BLK1', 'BLK2', 'BLK4'])
+    assert traffic_.ntraf == 7
+    ref = traffic_.id2idx(['REFBLK1', 'REFBLK2', 'REFBLK4'])
+    for name in ('type', 'lat', 'lon', 'alt', 'hdg', 'tas', 'cas'):
+        assert np.array_equal(np.asarray(getattr(traffic_, name))[idx],
+                              np.asarray(getattr(traffic_, name))[ref])
+    assert np.array_equal(traffic_.trafdatafeed.datafeed[idx], traffic_.trafdatafeed.datafeed[ref])
+    assert [traffic_.trafdatafeed.source[i] for i in idx] == \
+        [traffic_.trafdatafeed.source[i] for i in ref]
+    assert [acid in traffic_.trafdatafeed.datafeedids for acid in ('BLK1', 'BLK2', 'BLK4')] == \
+        [True, False, True]
+    assert np.array_equal(traffic_.lvnlvars.ssr[idx], traffic_.lvnlvars.ssr[ref])
+    for name in ('flighttype', 'wtc', 'arr', 'sid'):
+        lst = getattr(traffic_.lvnlvars, name)
+        assert [lst[i] for i in idx] == [lst[i] for i in ref]
+
+    # All aircraft exist already
+    assert len(traffic_.crebulk(['BLK1', 'BLK1'], 'B738', 52.0, 4.0, 0.0, 1000.0, 100.0)) == 0
+    assert traffic_.ntraf == 7
+    traffic_.reset()
+
+
+def test_traffic_crebulkcmd():
+    """
+    Test the CREBULK command with rows of stored bulk data, on a traffic
+    object with only an id list and a lat array.
+
+    Expects the aircraft of each row range to be created once, skipping
+    callsigns that exist already or occur twice.
+    """
+    import numpy as np
+    from bluesky.traffic.traffic import Traffic
+
+    traf = object.__new__(Traffic)
+    traf.__dict__.update(_children=[], _ArrVars=['lat'], _LstVars=['id'], _buffers={}, _dtypes={},
+                         id=[], lat=np.array([]), ntraf=0, idmap={}, idmapvalid=0, bulkdata={})
+
+    def cre(acid, actype, aclat, aclon, achdg, acalt, acspd):
+        n = len(acid)
+        traf.create(n)
+        traf.ntraf += n
+        traf.id[-n:] = acid
+        traf.lat[-n:] = aclat
+        traf.idmapvalid = min(traf.idmapvalid, traf.ntraf - n)
+    traf.cre = cre
+
+    traf.addbulkdata('test', dict(acid=['AC0', 'AC1', 'AC1', 'AC2', 'AC3', 'AC0'],
+                                  actype='B738', aclat=np.arange(6.0), aclon=4.0,
+                                  achdg=0.0, acalt=1000.0, acspd=100.0))
+    assert traf.crebulkcmd('TEST', 0, 2)
+    assert traf.id == ['AC0', 'AC1']
+    assert traf.crebulkcmd('TEST', 2, 4)
+    assert traf.id == ['AC0', 'AC1', 'AC2']
+    assert traf.crebulkcmd('TEST', 4)
+    assert traf.id == ['AC0', 'AC1', 'AC2', 'AC3']
+    assert list(traf.lat) == [0.0, 1.0, 3.0, 4.0]
+    assert not traf.crebulkcmd('OTHER')[0]
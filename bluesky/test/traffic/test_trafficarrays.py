@@ -142,3 +142,268 @@ def test_trafficarrays_reset(t_a):
 
     assert not root.fl_list
     assert not root.children[0].np_array_bool
+
+
+def test_trafficarrays_capacity():
+    """
+    Tests capacity-backed storage of traffic arrays, with arrays that are
+    modified in place and arrays that are replaced.
+
+    Expects arrays to be views of a larger buffer, and the same contents
+    as with list operations after create and delete.
+    """
+    class TestCapacity(TrafficArrays):
+        def __init__(self):
+            super().__init__()
+            TrafficArrays.setroot(self)
+            with self.settrafarrays():
+                self.values = np.array([])
+                self.ids = []
+
+    root = TestCapacity()
+    expected = []
+    for i in range(100):
+        root.create(3)
+        root.values[-3:] = np.arange(3 * i, 3 * i + 3)
+        root.ids[-3:] = [str(v) for v in range(3 * i, 3 * i + 3)]
+        expected.extend(range(3 * i, 3 * i + 3))
+        if i % 10 == 0:
+            root.values = root.values + 0.0
+        if i % 3 == 0:
+            idx = [1, 4, 5] if i % 2 else 1
+            root.delete(idx)
+            for j in reversed(np.atleast_1d(idx)):
+                del expected[j]
+
+    assert root.values.base is not None and len(root.values.base) > len(root.values)
+    assert list(root.values) == expected
+    assert root.ids == [str(v) for v in expected]
+
+    root.delete(np.arange(0, len(expected), 2))
+    assert list(root.values) == expected[1::2]
+    assert root.ids == [str(v) for v in expected[1::2]]
+
+
+def test_trafficarrays_checkpoint(tmp_path):
+    """
+    Tests saving a tree of traffic arrays to a checkpoint file, and
+    restoring it.
+
+    Expects the same arrays, lists and checkpointvars after restoring, and
+    restored arrays that can grow again.
+    """
+    from bluesky.simulation import checkpoint
+
+    class TestCheckpoint(TrafficArrays):
+        checkpointvars = ('pairs',)
+
+        def __init__(self, isroot=False):
+            super().__init__()
+            if isroot:
+                TrafficArrays.setroot(self)
+            self.pairs = np.array([], dtype=np.int64)
+            with self.settrafarrays():
+                self.values = np.array([])
+                self.ids = []
+
+    root = TestCheckpoint(isroot=True)
+    child = TestCheckpoint()
+    root.create(5)
+    child.create(5)
+    root.values[:] = np.arange(5.0)
+    root.ids[:] = list('ABCDE')
+    child.values[:] = -np.arange(5.0)
+    child.pairs = np.array([3, 1, 4], dtype=np.int64)
+
+    fname = str(tmp_path / 'test.ckpt')
+    checkpoint.write(fname, {name: node.getcheckpoint() for name, node in
+                             checkpoint.trafnodes(root)})
+    root.reset()
+    child.pairs = np.array([], dtype=np.int64)
+
+    state = checkpoint.read(fname)
+    for name, node in checkpoint.trafnodes(root):
+        node.setcheckpoint(state[name], 5)
+    assert list(root.values) == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert root.ids == list('ABCDE')
+    assert list(child.values) == [0.0, -1.0, -2.0, -3.0, -4.0]
+    assert list(child.pairs) == [3, 1, 4]
+
+    root.create(1)
+    child.create(1)
+    assert len(root.values) == len(root.ids) == len(child.values) == 6
+
+
+
+def test_trafficarrays_strings(tmp_path):
+    """
+    Tests string arrays declared without a length, through create, delete
+    and a checkpoint.
+
+    Expects strings longer than one character to be stored in full.
+    """
+    from bluesky.simulation import checkpoint
+
+    class TestStrings(TrafficArrays):
+        def __init__(self):
+            super().__init__()
+            TrafficArrays.setroot(self)
+            with self.settrafarrays():
+                self.actype = np.array([], dtype=str)
+                self.uco = np.array([], dtype='S')
+
+    root = TestStrings()
+    root.create(2)
+    root.actype[:] = ['B738', 'A320']
+    root.uco[1] = b'192.168.0.1'
+    root.create(40)
+    root.actype[-1] = '192.168.100.101'
+    root.delete([0, 5])
+    assert list(root.actype[[0, -1]]) == ['A320', '192.168.100.101']
+    assert root.uco[0] == b'192.168.0.1'
+
+    fname = str(tmp_path / 'test.ckpt')
+    checkpoint.write(fname, {name: node.getcheckpoint() for name, node in
+                             checkpoint.trafnodes(root)})
+    root.reset()
+    state = checkpoint.read(fname)
+    for name, node in checkpoint.trafnodes(root):
+        node.setcheckpoint(state[name], 40)
+    root.create(1)
+    root.actype[-1] = 'B77W'
+    assert list(root.actype[[0, -2, -1]]) == ['A320', '192.168.100.101', 'B77W']
+    assert root.uco[0] == b'192.168.0.1'
+
+
+def test_trafficarrays_alias():
+    """
+    Tests deleting elements from arrays of which two names refer to the
+    same array, with the first registered name owning the buffer.
+
+    Expects each element to be deleted once, and both names to refer to
+    the same compacted array.
+    """
+    class TestAlias(TrafficArrays):
+        def __init__(self):
+            super().__init__()
+            TrafficArrays.setroot(self)
+            with self.settrafarrays():
+                self.hdg = np.array([])
+            with self.settrafarrays():
+                self.trk = np.array([])
+
+    root = TestAlias()
+    root.create(6)
+    root.hdg[:] = np.arange(6.0)
+    root.trk = root.hdg
+    root.delete([1, 4])
+    assert list(root.hdg) == [0.0, 2.0, 3.0, 5.0]
+    assert root.trk is root.hdg
+    root.create(1)
+    root.delete(0)
+    assert list(root.trk) == [2.0, 3.0, 5.0, 0.0]
+
+def test_trafficarrays_float32(monkeypatch):
+    """
+    Tests float32 mode with a one-hour scenario of accelerating, turning
+    and climbing aircraft, integrated with the kinematics of Traffic.
+
+    Expects single precision speeds, double precision positions, and
+    final positions close to those of the float64 baseline.
+    """
+    from bluesky import settings
+    from bluesky.traffic import Traffic
+
+    class Kinematics(TrafficArrays):
+        float64vars = Traffic.float64vars
+
+        def __init__(self):
+            super().__init__()
+            TrafficArrays.setroot(self)
+            self.ntraf = 0
+            with self.settrafarrays():
+                self.lat = np.array([])
+                self.lon = np.array([])
+                self.alt = np.array([])
+                self.distflown = np.array([])
+                self.tas = np.array([])
+                self.trk = np.array([])
+                self.vs = np.array([])
+                self.gsnorth = np.array([])
+                self.gseast = np.array([])
+                self.coslat = np.array([])
+
+        def update(self, dt, seltas, turnrate):
+            self.tas = self.tas + np.clip(seltas - self.tas, -0.5 * dt, 0.5 * dt)
+            self.trk = (self.trk + turnrate * dt) % 360.0
+            self.gsnorth = self.tas * np.cos(np.radians(self.trk))
+            self.gseast = self.tas * np.sin(np.radians(self.trk))
+            self.alt = np.round(self.alt + self.vs * dt, 6)
+            self.lat = self.lat + np.degrees(dt * self.gsnorth / 6371000.0)
+            self.coslat = np.cos(np.deg2rad(self.lat))
+            self.lon = self.lon + np.degrees(dt * self.gseast / self.coslat / 6371000.0)
+            self.distflown += self.tas * dt
+            self.castarrays()
+
+    def run(float32):
+        monkeypatch.setattr(settings, 'traf_float32', float32)
+        traf = Kinematics()
+        monkeypatch.setattr(settings, 'traf_float32', False)
+        rng = np.random.default_rng(7)
+        traf.create(50)
+        traf.lat[:] = rng.uniform(50.0, 54.0, 50)
+        traf.lon[:] = rng.uniform(2.0, 8.0, 50)
+        traf.alt[:] = rng.uniform(1000.0, 10000.0, 50)
+        traf.tas[:] = rng.uniform(100.0, 200.0, 50)
+        traf.trk[:] = rng.uniform(0.0, 360.0, 50)
+        for t in range(3600):
+            seltas = 150.0 + 50.0 * np.sin(t / 600.0 + np.arange(50))
+            turnrate = 3.0 * (np.arange(50) % 3 - 1) * (t % 900 < 60)
+            traf.vs[:] = 5.0 * np.cos(t / 300.0 + np.arange(50))
+            traf.update(1.0, seltas, turnrate)
+        return traf
+
+    ref = run(False)
+    traf = run(True)
+    assert traf.tas.dtype == traf.trk.dtype == np.float32
+    assert traf.lat.dtype == traf.lon.dtype == traf.alt.dtype == np.float64
+    assert traf.tas.base is not None
+    dist = 6371000.0 * np.hypot(np.radians(traf.lat - ref.lat),
+                                np.radians(traf.lon - ref.lon) * ref.coslat)
+    assert np.all(dist < 1.0)
+    assert np.allclose(traf.alt, ref.alt, atol=0.01)
+
+
+def test_trafficarrays_reset_lists(monkeypatch):
+    """
+    Tests reset and castarrays of traffic arrays with list variables, in
+    float32 mode.
+
+    Expects reset to empty the lists, and castarrays to cast the arrays
+    while leaving the lists intact.
+    """
+    from bluesky import settings
+
+    class TestLists(TrafficArrays):
+        def __init__(self):
+            super().__init__()
+            TrafficArrays.setroot(self)
+            with self.settrafarrays():
+                self.values = np.array([])
+                self.ids = []
+
+    monkeypatch.setattr(settings, 'traf_float32', True)
+    root = TestLists()
+    root.create(3)
+    root.ids[:] = list('ABC')
+    root.values = root.values + np.arange(3.0)
+    assert root.values.dtype == np.float64
+
+    root.castarrays()
+    assert root.values.dtype == np.float32
+    assert root.ids == list('ABC')
+
+    root.reset()
+    assert root.ids == [] and len(root.values) == 0
+    root.create(1)
+    assert len(root.ids) == len(root.values) == 1
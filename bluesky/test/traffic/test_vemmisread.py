@@ -0,0 +1,58 @@
+"""
+Tests the cache of the prepared VEMMIS replay data.
+"""
+import os
+import pandas as pd
+
+from bluesky.tools import vemmisread
+
+
+def write_vemmis(folder, nflights=3, npoints=6):
+    """ Write a small set of vemmis csv files. """
+    folder.mkdir()
+    flights = pd.DataFrame(dict(FLIGHT_ID=range(nflights), CALLSIGN=[f'KLM{i}' for i in range(nflights)],
+                                SSR=range(1000, 1000 + nflights), ICAO_ACTYPE='B738', ADEP='EGLL',
+                                DEST='EHAM', STATUS=['ACTIVE'] * (nflights - 1) + ['CANCELLED'],
+                                T_UPDATE='01-10-2021 00:00:00', T0='01-10-2021 00:00:00',
+                                FLIGHT_TYPE='INBOUND'))
+    tracks = pd.DataFrame(dict(TIME=[100 * (10 * i + j) for i in range(nflights) for j in range(npoints)],
+                               X=[f'{1000 * i + 50 * j},5' for i in range(nflights) for j in range(npoints)],
+                               Y='-2000,25', MODE_C='100,5', SPEED=250, HEADING=90,
+                               FLIGHT_ID=[i for i in range(nflights) for j in range(npoints)],
+                               T_START='01-10-2021 00:30:00', T_END='01-10-2021 01:30:00',
+                               TRK_ROCD='0,0', T_UPDATE='01-10-2021 00:30:00'))
+    flighttimes = pd.DataFrame(dict(FLIGHT_ID=range(nflights), LOCATION_TYPE='TMA', LOCATION_NAME='EHAM',
+                                    TIME_TYPE='ACTUAL', TIME='01-10-2021 00:45', EVENT='ENTRY'))
+    takeoffs = pd.DataFrame(dict(FLIGHT_ID=[0], SID=['LAM1A'], RUNWAY=['09']))
+    landings = pd.DataFrame(dict(FLIGHT_ID=range(nflights), RUNWAY='18C', STACK='ARTIP'))
+    for name, df in (('FLIGHTS', flights), ('TRACKS', tracks), ('FLIGHTTIMES', flighttimes),
+                     ('TAKEOFFS', takeoffs), ('LANDINGS', landings)):
+        df.to_csv(folder / f'{name}.csv', sep=';', index=False)
+
+
+def test_vemmis_cache(tmp_path):
+    """
+    Test preparing VEMMIS data, loading it again from the cache, and
+    invalidating the cache when a csv file changes.
+
+    Expects the same prepared data from the cache as from the csv files,
+    and the data to be prepared again after a change.
+    """
+    folder = tmp_path / 'vemmis'
+    write_vemmis(folder)
+    prepared = vemmisread.VEMMISRead(str(folder), '01-10-2021', '00:30:00', deltat=0.5)
+    assert os.path.isfile(prepared.cache.fname)
+    assert os.path.dirname(prepared.cache.fname) == str(tmp_path)
+
+    cached = vemmisread.VEMMISRead(str(folder), '01-10-2021', '00:30:00', deltat=0.5)
+    assert cached.flights is None and cached.datetime0 == prepared.datetime0
+    for name in ('flightdata', 'trackdata', 'routedata'):
+        pd.testing.assert_frame_equal(getattr(cached, name), getattr(prepared, name))
+    assert cached.flightdata['SID'].isna().tolist() == [False, True]
+
+    write_vemmis(tmp_path / 'other', nflights=4)
+    os.replace(tmp_path / 'other' / 'FLIGHTS.csv', folder / 'FLIGHTS.csv')
+    os.replace(tmp_path / 'other' / 'TRACKS.csv', folder / 'TRACKS.csv')
+    changed = vemmisread.VEMMISRead(str(folder), '01-10-2021', '00:30:00', deltat=0.5)
+    assert changed.flights is not None
+    assert len(changed.flightdata) == len(prepared.flightdata) + 1
@@ -0,0 +1,147 @@
+"""
+Tests the vectorised VNAV and RTA speed calculations of the autopilot.
+"""
+from types import SimpleNamespace
+import numpy as np
+
+import bluesky as bs
+from bluesky.tools.aero import ft, nm, vtas2cas
+from bluesky.traffic import autopilot
+
+
+def make_traffic(rng, n):
+    """ Traffic state with the arrays used by ComputeVNAV and setspeedforRTA. """
+    tas = rng.uniform(60.0, 250.0, n)
+    trk = np.radians(rng.uniform(0.0, 360.0, n))
+    windnorth, windeast = rng.uniform(-20.0, 20.0, (2, n))
+    gsnorth = tas * np.cos(trk) + windnorth
+    gseast = tas * np.sin(trk) + windeast
+    lat = rng.uniform(50.0, 54.0, n)
+    actwp = SimpleNamespace(
+        lat=lat + rng.uniform(-0.5, 0.5, n), lon=rng.uniform(2.0, 8.0, n),
+        spd=np.full(n, -999.), spdcon=rng.choice([-999., 120.0], n),
+        nextaltco=np.zeros(n), xtoalt=np.zeros(n), vs=np.zeros(n),
+        turndist=rng.uniform(0.0, 5000.0, n))
+    return SimpleNamespace(
+        lat=lat, lon=actwp.lon + rng.uniform(-0.5, 0.5, n), coslat=np.cos(np.radians(lat)),
+        alt=rng.uniform(0.0, 12000.0, n), tas=tas, gs=np.hypot(gsnorth, gseast),
+        gsnorth=gsnorth, gseast=gseast, windnorth=windnorth, windeast=windeast,
+        swvnav=rng.random(n) < 0.9, swvnavspd=rng.random(n) < 0.9,
+        perf=SimpleNamespace(axmax=rng.uniform(0.0, 2.0, n)), actwp=actwp)
+
+
+def make_autopilot(n):
+    ap = object.__new__(autopilot.Autopilot)
+    ap.steepness = 3000. * ft / (10. * nm)
+    ap.dist2vs = np.zeros(n)
+    ap.alt = np.zeros(n)
+    return ap
+
+
+def test_vcalcvrta():
+    """
+    Test the vectorised RTA ground speed solver.
+
+    Expects the same speeds as the scalar solver, for accelerating and
+    decelerating aircraft, and for RTA's that cannot be met.
+    """
+    rng = np.random.default_rng(0)
+    v0 = rng.uniform(0.0, 250.0, 1000)
+    dx = rng.uniform(0.0, 200.0 * nm, 1000)
+    deltime = rng.uniform(1.0, 3600.0, 1000)
+    trafax = rng.uniform(-2.0, 2.0, 1000)
+
+    v1 = autopilot.vcalcvrta(v0, dx, deltime, trafax)
+    for i in range(1000):
+        assert np.isclose(v1[i], autopilot.calcvrta(v0[i], dx[i], deltime[i], trafax[i]))
+
+
+def test_setspeedforrta(monkeypatch):
+    """
+    Test the RTA speeds of a set of aircraft.
+
+    Expects the CAS of the scalar solver, corrected for tail wind, as
+    waypoint speed of aircraft without speed constraint, and no speed
+    for missed or undefined RTA's.
+    """
+    rng = np.random.default_rng(1)
+    n = 200
+    traf = make_traffic(rng, n)
+    monkeypatch.setattr(bs, 'traf', traf, raising=False)
+    monkeypatch.setattr(bs, 'sim', SimpleNamespace(simt=1000.0), raising=False)
+    ap = make_autopilot(n)
+
+    idx = rng.permutation(n)[:150]
+    torta = rng.choice([-999., 500.0, 1500.0, 4000.0], len(idx))
+    xtorta = rng.uniform(1.0, 100.0 * nm, len(idx))
+    rtacas = ap.setspeedforRTA(idx, torta, xtorta)
+
+    for i, iac in enumerate(idx):
+        if torta[i] <= bs.sim.simt:
+            assert rtacas[i] == -999.
+            assert traf.actwp.spd[iac] == -999.
+            continue
+        gsrta = autopilot.calcvrta(traf.gs[iac], xtorta[i], torta[i] - bs.sim.simt,
+                                   traf.perf.axmax[iac])
+        tailwind = (traf.windnorth[iac] * traf.gsnorth[iac] +
+                    traf.windeast[iac] * traf.gseast[iac]) / traf.gs[iac]
+        cas = vtas2cas(gsrta - tailwind, traf.alt[iac])
+        assert np.isclose(rtacas[i], cas)
+        if traf.actwp.spdcon[iac] < 0 and traf.swvnavspd[iac]:
+            assert traf.actwp.spd[iac] == rtacas[i]
+        else:
+            assert traf.actwp.spd[iac] == -999.
+
+
+def test_computevnav(monkeypatch):
+    """
+    Test VNAV guidance of a set of aircraft, which descend, climb, or fly
+    level to the next altitude constraint, or have no constraint.
+
+    Expects the same altitude constraint, distance to start of descent,
+    selected altitude and vertical speed as calculated per aircraft.
+    """
+    rng = np.random.default_rng(2)
+    n = 300
+    traf = make_traffic(rng, n)
+    monkeypatch.setattr(bs, 'traf', traf, raising=False)
+    monkeypatch.setattr(bs, 'sim', SimpleNamespace(simt=0.0), raising=False)
+    ap = make_autopilot(n)
+
+    idx = np.arange(n)
+    toalt = np.where(rng.random(n) < 0.1, traf.alt, rng.uniform(0.0, 12000.0, n))
+    toalt[rng.random(n) < 0.1] = -999.
+    xtoalt = rng.uniform(0.0, 50.0 * nm, n)
+    ap.ComputeVNAV(idx, toalt, xtoalt, -999., 1.0)
+
+    for i in idx:
+        alt, gs, tas = traf.alt[i], traf.gs[i], traf.tas[i]
+        if toalt[i] < 0 or not traf.swvnav[i]:
+            assert ap.dist2vs[i] == -999.
+            continue
+        dy = traf.actwp.lat[i] - traf.lat[i]
+        dx = (traf.actwp.lon[i] - traf.lon[i]) * traf.coslat[i]
+        legdist = 60. * nm * np.sqrt(dx * dx + dy * dy)
+        t2go = max(0.1, legdist + xtoalt[i]) / max(0.01, gs)
+        if alt > toalt[i] + 10. * ft:
+            nextaltco = min(alt, toalt[i] + xtoalt[i] * ap.steepness)
+            dist2vs = traf.actwp.turndist[i] + abs(alt - nextaltco) / ap.steepness
+            if legdist < dist2vs:
+                assert ap.alt[i] == nextaltco
+                vs = (nextaltco - alt) / t2go
+            else:
+                assert ap.alt[i] == 0.0
+                vs = -ap.steepness * (gs + (gs < 0.2 * tas) * tas)
+        elif alt < toalt[i] - 10. * ft:
+            nextaltco = toalt[i]
+            dist2vs = 99999. * nm
+            assert ap.alt[i] == nextaltco
+            vs = max(ap.steepness * gs, (nextaltco - alt) / t2go)
+        else:
+            assert ap.dist2vs[i] == -999.
+            assert traf.actwp.vs[i] == 0.0
+            continue
+        assert np.isclose(ap.dist2vs[i], dist2vs)
+        assert traf.actwp.nextaltco[i] == nextaltco
+        assert traf.actwp.xtoalt[i] == xtoalt[i]
+        assert np.isclose(traf.actwp.vs[i], vs)
@@ -0,0 +1,112 @@
+"""
+Tests the gridded wind field with trilinear interpolation.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+import bluesky as bs
+from bluesky.tools.aero import ft
+from bluesky.traffic.windfield import Windfield
+
+
+@pytest.fixture(autouse=True)
+def traf(monkeypatch):
+    monkeypatch.setattr(bs, 'traf', SimpleNamespace(HighRes=False), raising=False)
+
+
+def test_windfield_regular_grid():
+    """
+    Test a 3D wind field of which the vectors lie on a regular grid.
+
+    Expects the wind vectors at the grid points, linear interpolation
+    between grid points, and the wind at the edge outside the grid.
+    """
+    rng = np.random.default_rng(0)
+    wind = Windfield()
+    lats, lons = np.arange(50.0, 54.1, 0.5), np.arange(2.0, 7.1, 0.5)
+    alts = np.array([0.0, 10000.0, 20000.0, 30000.0, 45000.0]) * ft
+    for lat in lats:
+        for lon in rng.permutation(lons):
+            wind.addpoint(lat, lon, rng.uniform(0.0, 360.0, len(alts)),
+                          rng.uniform(0.0, 50.0, len(alts)), alts)
+    ipoint = rng.integers(wind.nvec, size=50)
+    ialt = rng.integers(wind.nalt, size=50)
+    lat, lon, alt = wind.lat[ipoint], wind.lon[ipoint], wind.altaxis[ialt]
+    vn_idw, ve_idw = wind.getdata(lat, lon, alt)
+
+    wind.gridded = True
+    vn, ve = wind.getdata(lat, lon, alt)
+    assert wind.gridvn.shape == (wind.nalt, len(lats), len(lons))
+    assert np.allclose(vn, vn_idw) and np.allclose(ve, ve_idw)
+    assert np.allclose(vn, wind.vnorth[ialt, ipoint])
+
+    # Halfway between grid points (horizontally and vertically)
+    vn, ve = wind.getdata(np.array([50.25]), np.array([2.25]), np.array([50.0 * ft]))
+    corners = [(k, i, j) for k in (0, 1) for i in (0, 1) for j in (0, 1)]
+    assert np.isclose(vn[0], np.mean([wind.gridvn[c] for c in corners]))
+    assert np.isclose(ve[0], np.mean([wind.gridve[c] for c in corners]))
+
+    # Outside the grid
+    vn, ve = wind.getdata(np.array([60.0]), np.array([0.0]), np.array([50000.0 * ft]))
+    assert np.isclose(vn[0], wind.gridvn[-1, -1, 0])
+
+
+def test_windfield_scattered():
+    """
+    Test a 2D wind field of scattered vectors, which is gridded again when
+    a vector is added.
+
+    Expects the inverse-distance weighted wind at the grid points, and the
+    wind of the new vector after adding it.
+    """
+    rng = np.random.default_rng(1)
+    wind = Windfield()
+    wind.gridded = True
+    wind.gridres = 0.1
+    for _ in range(20):
+        wind.addpoint(rng.uniform(50.0, 54.0), rng.uniform(2.0, 7.0),
+                      rng.uniform(0.0, 360.0), rng.uniform(0.0, 50.0))
+    vn, _ = wind.getdata(np.array([52.0]), np.array([4.0]), np.array([1000.0]))
+    assert wind.gridvn.shape[0] == 1
+    assert np.all(np.diff(wind.gridlat) <= 0.1 + 1e-9)
+    glat, glon = np.meshgrid(wind.gridlat, wind.gridlon, indexing='ij')
+    wind.gridded = False
+    vn_idw, ve_idw = wind.getdata(glat.ravel(), glon.ravel())
+    assert np.allclose(wind.gridvn[0].ravel(), vn_idw)
+    assert np.allclose(wind.gridve[0].ravel(), ve_idw)
+
+    wind.gridded = True
+    wind.addpoint(wind.gridlat[3], wind.gridlon[5], 90.0, 20.0)
+    assert wind.gridvn is None
+    vn, ve = wind.getdata(np.array([wind.lat[-1]]), np.array([wind.lon[-1]]))
+    assert np.isclose(vn[0], 0.0) and np.isclose(ve[0], -20.0)
+
+
+def test_windfield_addpoints():
+    """
+    Test adding the wind components of a grid of positions at once, at the
+    same altitudes for all positions (like a GFS field).
+
+    Expects the same wind field as when the vectors are added one by one.
+    """
+    rng = np.random.default_rng(2)
+    lat, lon = np.meshgrid(np.arange(50.0, 52.1, 0.5), np.arange(2.0, 5.1, 0.5), indexing='ij')
+    lat, lon = lat.ravel(), lon.ravel()
+    alts = np.array([35000.0, 0.0, 10000.0, 20000.0]) * ft
+    vn = rng.uniform(-30.0, 30.0, (len(alts), len(lat)))
+    ve = rng.uniform(-30.0, 30.0, (len(alts), len(lat)))
+
+    wind = Windfield()
+    idx = wind.addpoints(lat, lon, vn, ve, alts)
+    single = Windfield()
+    for i in range(len(lat)):
+        single.addpoint(lat[i], lon[i], np.degrees(np.arctan2(-ve[:, i], -vn[:, i]))[np.argsort(alts)],
+                        np.hypot(vn[:, i], ve[:, i])[np.argsort(alts)], np.sort(alts))
+    assert list(idx) == list(range(len(lat)))
+    assert wind.winddim == 3 and wind.nvec == single.nvec
+    assert np.allclose(wind.vnorth, single.vnorth) and np.allclose(wind.veast, single.veast)
+
+    wind.addpoints([53.0], [6.0], [1.0], [2.0])
+    assert wind.nvec == len(lat) + 1
+    assert np.allclose(wind.vnorth[:, -1], 1.0) and np.allclose(wind.veast[:, -1], 2.0)
@@ -1,4 +1,8 @@
-import psycopg2
+try:
+    import psycopg2
+except ImportError:
+    # The meteo database is optional: HIGHRES can also use npz meteo files
+    psycopg2 = None
 import pandas as pd
 from math import floor, ceil
 
@@ -14,6 +18,8 @@ def Connect_SQL_DB(dbname):
         Created by: Stijn Brunia
         Date: 1-11-2021
     """
+    if psycopg2 is None:
+        raise ImportError('Connecting to meteo database ' + dbname + ' requires psycopg2')
     conn = psycopg2.connect(
         host="localhost",
         database=dbname,
@@ -1,16 +1,25 @@
+import os
 from os import path
 import pickle
+import numpy as np
 
 from bluesky import settings
 
 ## Default settings
 settings.set_variable_defaults(cache_path='data/cache')
 
+# Alignment of the numpy sections in array files [bytes]
+alignment = 64
+
 
 def openfile(*args):
     return CacheFile(*args)
 
 
+def openarrays(*args):
+    return ArrayCacheFile(*args)
+
+
 class CacheError(Exception):
     ''' Exception class for CacheFile errors. '''
     pass
@@ -59,3 +68,103 @@ class CacheFile():
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.file:
             self.file.close()
+
+
+class ArrayCacheFile():
+    ''' Cache file for data with (large) numpy tables, which are
+        memory-mapped when the cache is loaded (see dumparrays).
+
+        The cache is out of date when its version differs from version_ref,
+        or when one of the source files it was built from has changed, has
+        been added, or has been removed. '''
+    def __init__(self, fname, version_ref='1', sources=()):
+        self.fname = path.join(settings.cache_path, fname)
+        self.version_ref = version_ref
+        self.sources = sorted(path.abspath(src) for src in sources)
+
+    def stamp(self):
+        ''' Version, and modification time and size of each source file. '''
+        files = []
+        for src in self.sources:
+            try:
+                stat = os.stat(src)
+                files.append((src, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                files.append((src, None, None))
+        return self.version_ref, files
+
+    def load(self):
+        ''' Load the data from the cache file. '''
+        if not path.isfile(self.fname):
+            raise CacheError('Cachefile not found: ' + self.fname)
+        try:
+            stamp, data = loadarrays(self.fname)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError) as e:
+            raise CacheError(f'Error reading cache file {self.fname}: {e}')
+        if stamp != self.stamp():
+            raise CacheError('Cache file out of date: ' + self.fname)
+        print('Reading cache: ' + self.fname)
+        return data
+
+    def dump(self, data):
+        ''' Store the data in the cache file. '''
+        print("Writing cache: " + self.fname)
+        try:
+            dumparrays(self.fname, (self.stamp(), data))
+        except (OSError, pickle.PicklingError) as e:
+            print(f'Error writing cache file {self.fname}: {e}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+def dumparrays(fname, data, magic=b'BSARRAY1'):
+    ''' Write data to file fname: a header starting with magic, and a
+        pickle of data, with all numpy arrays stored out-of-band after the
+        pickle as aligned raw sections. '''
+    buffers = []
+    pickled = pickle.dumps(data, protocol=5, buffer_callback=buffers.append)
+    sections = [buf.raw() for buf in buffers]
+
+    # Header: magic, pickle size, number of sections, and (offset, size) of each section
+    offset = len(magic) + 16 * (1 + len(sections)) + len(pickled)
+    table = np.zeros((len(sections), 2), dtype='<u8')
+    for i, section in enumerate(sections):
+        offset += -offset % alignment
+        table[i] = offset, section.nbytes
+        offset += section.nbytes
+
+    # Write to a temporary file first, so that a file that is memory-mapped
+    # (possibly by another process) is never overwritten in place
+    os.makedirs(path.dirname(fname) or '.', exist_ok=True)
+    tmpname = f'{fname}.{os.getpid()}.tmp'
+    with open(tmpname, 'wb') as f:
+        f.write(magic)
+        f.write(np.array([len(pickled), len(sections)], dtype='<u8').tobytes())
+        f.write(table.tobytes())
+        f.write(pickled)
+        for (offset, _), section in zip(table, sections):
+            f.seek(int(offset))
+            f.write(section)
+    os.replace(tmpname, fname)
+
+
+def loadarrays(fname, magic=b'BSARRAY1'):
+    ''' Read the data from a file written with dumparrays. The numpy
+        arrays in the data are copy-on-write memory-mapped sections of
+        the file. '''
+    with open(fname, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError('wrong file type or version')
+        ndata, nsections = np.frombuffer(f.read(16), dtype='<u8').astype(int)
+        table = np.frombuffer(f.read(16 * nsections), dtype='<u8').reshape(-1, 2).astype(int)
+        pickled = f.read(ndata)
+    if nsections:
+        mm = np.memmap(fname, dtype=np.uint8, mode='c')
+        buffers = [mm[offset:offset + size] for offset, size in table]
+    else:
+        buffers = []
+    return pickle.loads(pickled, buffers=buffers)
@@ -11,7 +11,7 @@ import pickle
 import numpy as np
 import datetime
 import bluesky as bs
-from bluesky.tools import aero, cachefile, misc
+from bluesky.tools import aero, cachefile
 
 bs.settings.set_variable_defaults(data_path='data')
 
@@ -164,36 +164,11 @@ class OpenSkySource:
             data.drop(data[data['on_ground'] == True].index, inplace=True)
             data.drop(data[(data['baro_altitude'] <= 50.) | (data['baro_altitude'] >= 7467.6)].index, inplace=True)
 
-            # Get aircraft data
-            acid           = data['callsign'].str.strip()
-            data['actype'] = [self.actypes.get(str(icao24), 'B738') for icao24 in data['icao24']]
-            actype         = data['actype']
-            aclat          = data['lat'].astype(str)
-            aclon          = data['lon'].astype(str)
-            achdg          = data['true_track'].astype(str)
-            acalt          = (data['baro_altitude']/aero.ft).astype(str)
-            data['cas']    = aero.vtas2cas(data['velocity'], data['baro_altitude'])/aero.kts  # Assume GS = TAS
-            acspd          = data['cas'].astype(str)
-
             # Get commands
-            # Create
-            cmds  += list("CRE "+acid+", "+actype+", "+aclat+" "+aclon+" "+achdg+" "+acalt+" "+acspd)
-            cmdst += [0.]*len(data)
-
-            # Data feed
-            cmds  += list("SETDATAFEED "+acid+", OPENSKY")
-            cmdst += [0.01]*len(data)
-
-            # SSR Code
-            ssrdata = data.dropna(subset=['squawk'])
-            cmds   += list("SSRCODE "+ssrdata['callsign']+", "+ssrdata['squawk'])
-            cmdst  += [0.01]*len(ssrdata)
-
-            # Sort
-            cmds_df = pd.DataFrame({'COMMAND': cmds, 'TIME': cmdst})
-            cmds_df = cmds_df.sort_values(by=['TIME'])
-            cmds    = list(cmds_df['COMMAND'])
-            cmdst   = list(cmds_df['TIME'])
+            # Create, with data feed and SSR code
+            self.add_bulkdata(data, data['callsign'].str.strip(), pd.to_numeric(data['squawk'], errors='coerce'))
+            cmds.append("CREBULK OPENSKY")
+            cmdst.append(0.)
 
         else:
             bs.scr.echo("LIVE: Initializing live traffic failed. Reset and try again.")
@@ -275,44 +250,45 @@ class OpenSkySource:
         Date: 17-1-2022
         """
 
-        ids = list(data['callsign'])
-
-        new_ids = np.setdiff1d(ids, bs.traf.id)
-        inew    = misc.get_indices(ids, new_ids)
+        isnew = bs.traf.ids2idx(data['callsign']) < 0
 
         # No new aircraft
-        if len(inew) == 0:
+        if not np.any(isnew):
             return cmds, data
 
-        # Aircraft data
-        icao24 = list(data['icao24'])
-        lat    = np.array(data['lat'])
-        lon    = np.array(data['lon'])
-        hdg    = np.array(data['true_track'])
-        alt    = np.array(data['baro_altitude'])
-        gs     = np.array(data['velocity'])
-
-        # Loop over new aircraft
-        for i in inew:
-            # Aircraft data
-            acid   = ids[i]
-            actype = self.actypes.get(icao24[i], 'B738')
-            aclat  = str(lat[i])
-            aclon  = str(lon[i])
-            achdg  = str(hdg[i])
-            acalt  = str(alt[i]/aero.ft)
-            acspd  = str(aero.tas2cas(gs[i], alt[i])/aero.kts)  # Assume GS = TAS
-
-            # Create commands
-            cmds.append("CRE "+acid+", "+actype+", "+aclat+", "+aclon+", "+achdg+", "+acalt+", "+acspd)
-            cmds.append("SETDATAFEED "+acid+" OPENSKY")
-
-            # Remove aircraft from track data
-            idrop = data.index[data['callsign'] == acid]
-            data.drop(idrop, inplace=True)
+        # Create commands
+        newdata = data.loc[isnew]
+        self.add_bulkdata(newdata, newdata['callsign'])
+        cmds.append("CREBULK OPENSKY")
+
+        # Remove aircraft from track data
+        data = data.loc[~isnew]
 
         return cmds, data
 
+    def add_bulkdata(self, data, acid, ssr=None):
+        """
+        Function: Store aircraft data for bulk creation with CREBULK OPENSKY
+        Args:
+            data:   aircraft data [DataFrame]
+            acid:   callsigns [Series]
+            ssr:    SSR codes [Series]
+        Returns: -
+        """
+
+        bulkdata = {'acid':   acid,
+                    'actype': [self.actypes.get(str(icao24), 'B738') for icao24 in data['icao24']],
+                    'aclat':  data['lat'],
+                    'aclon':  data['lon'],
+                    'achdg':  data['true_track'],
+                    'acalt':  data['baro_altitude'],
+                    'acspd':  aero.vtas2cas(data['velocity'], data['baro_altitude']),  # Assume GS = TAS
+                    'source': 'OPENSKY'}
+        if ssr is not None:
+            bulkdata['ssr'] = ssr
+        bs.traf.addbulkdata('OPENSKY', {key: np.broadcast_to(values, (len(data),))
+                                        for key, values in bulkdata.items()})
+
     @staticmethod
     def delete_old(cmds):
         """
@@ -454,6 +454,19 @@ def get_indices(arr, items):
         i = np.array([]).astype(int)
     elif isinstance(items, (str, int, float)):
         i = np.nonzero(np.array([items])[:, None] == arr)[1].astype(int)
+    elif bs.traf is not None and arr is bs.traf.id:
+        # Use the id map of the traffic object
+        i = bs.traf.ids2idx(items)
+        i = i[i >= 0]
     else:
-        i = np.nonzero(np.array(items)[:, None] == arr)[1].astype(int)
+        # Find the range of each item in the sorted array, and return all
+        # indices of each item in order of the items
+        arr = np.asarray(arr)
+        order = np.argsort(arr, kind='stable')
+        sortarr = arr[order]
+        items = np.asarray(items)
+        start = np.searchsorted(sortarr, items, side='left')
+        count = np.searchsorted(sortarr, items, side='right') - start
+        offset = np.arange(np.sum(count)) - np.repeat(np.cumsum(count) - count, count)
+        i = order[np.repeat(start, count) + offset].astype(int)
     return i
@@ -0,0 +1,92 @@
+''' Background loading of data slices (e.g., meteo data of a forecast time),
+    with a small cache of the most recently used slices. '''
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+
+class Prefetcher:
+    ''' Loads slices of data with load(key), and keeps the size most recently
+        used slices. Slices that will be needed next can be prefetched on a
+        background thread, so that loading does not block the simulation.
+
+        hits counts the slices that were cached or prefetched when they were
+        needed, misses the slices that had to be loaded on the spot. '''
+    def __init__(self, load, size=4):
+        self.load = load
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.slices = OrderedDict()
+        self.pending = dict()
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def get(self, key):
+        ''' Get the slice of key: from the cache, by waiting for the
+            prefetch of the slice, or by loading it. '''
+        with self.lock:
+            if key in self.slices:
+                self.hits += 1
+                self.slices.move_to_end(key)
+                return self.slices[key]
+            future = self.pending.get(key)
+
+        if future is not None:
+            try:
+                data = future.result()
+                self.hits += 1
+                return data
+            except Exception:
+                # Try again here, to report the error to the caller
+                pass
+
+        self.misses += 1
+        data = self.load(key)
+        with self.lock:
+            self.store(key, data)
+        return data
+
+    def prefetch(self, key):
+        ''' Load the slice of key on the background thread, if it is not
+            cached or being loaded already. '''
+        with self.lock:
+            if key in self.slices or key in self.pending:
+                return
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch')
+            self.pending[key] = self.executor.submit(self.fetch, key)
+
+    def fetch(self, key):
+        ''' Load a slice on the background thread. '''
+        try:
+            data = self.load(key)
+        except Exception as e:
+            print(f'Prefetching {key} failed: {e}')
+            with self.lock:
+                self.pending.pop(key, None)
+            raise
+        with self.lock:
+            self.store(key, data)
+            self.pending.pop(key, None)
+        return data
+
+    def store(self, key, data):
+        ''' Add a slice to the cache, dropping the least recently used
+            slices. Call with the lock held. '''
+        if data is None:
+            return
+        self.slices[key] = data
+        self.slices.move_to_end(key)
+        while len(self.slices) > self.size:
+            self.slices.popitem(last=False)
+
+    def clear(self):
+        ''' Remove all cached slices. '''
+        with self.lock:
+            self.slices.clear()
+            self.pending.clear()
+
+    def info(self):
+        ''' Summary of the cache hits and misses. '''
+        return f'{self.hits} hits, {self.misses} misses, {len(self.slices)} cached'
@@ -6,15 +6,22 @@ Date: 22-11-2021
 """
 
 import datetime
+import hashlib
 import pandas as pd
 import numpy as np
 import os
 import bluesky as bs
-from bluesky.tools import aero
+from bluesky.tools import aero, cachefile
 from bluesky.tools.geo import qdrpos
 from bluesky.tools.aero import kts, ft
 
 
+# Version of the prepared data cache, change when the preparation changes
+cache_version = 'v20261018'
+
+# Prefixes of the vemmis csv files
+file_prefixes = ('FLIGHTS', 'FLIGHTTIMES', 'TRACK', 'TAKEOFFS', 'LANDINGS')
+
 """
 Classes
 """
@@ -38,6 +45,8 @@ class VEMMISRead:
             get_datetime():     Get the date and time for the simulation
             get_initial():      Get the initial commands
             get_trackdata():    Get the track data for the simulation
+            load_cache():       Load the prepared data from the cache
+            save_cache():       Save the prepared data in the cache
 
     Created by: Bob van Dillen
     Date: 22-11-2021
@@ -65,17 +74,69 @@ class VEMMISRead:
 
         self.datetime0 = None
 
-        self.read_data()
-        self.delete_nan()
-        self.convert_data()
-        self.get_credeltime()
-        self.relevant_data()
-        self.get_coordinates()
-        self.get_altitude()
-        self.get_cas()
-        self.merge_data()
-        self.sort_data()
-        self.get_simtime()
+        # Prepared data is cached next to the data folder, for each start time and update rate
+        key = hashlib.md5(repr((date0, time0, deltat)).encode()).hexdigest()[:8]
+        self.cache = cachefile.openarrays(os.path.normpath(os.path.abspath(data_path)) + '_' + key + '.npc',
+                                          cache_version, self.get_sources())
+
+        if not self.load_cache():
+            self.read_data()
+            self.delete_nan()
+            self.convert_data()
+            self.get_credeltime()
+            self.relevant_data()
+            self.get_coordinates()
+            self.get_altitude()
+            self.get_cas()
+            self.merge_data()
+            self.sort_data()
+            self.get_simtime()
+            self.save_cache()
+
+    def get_sources(self):
+        """
+        Function: Get the vemmis csv files in the data folder
+        Args: -
+        Returns:
+            sources:    paths of the csv files [list]
+        """
+
+        sources = []
+        for root, dirs, files in os.walk(self.data_path):
+            sources += [os.path.join(root, file) for file in files if file.upper().startswith(file_prefixes)]
+        return sources
+
+    def load_cache(self):
+        """
+        Function: Load the prepared data from the cache, when it is up to date with the csv files
+        Args: -
+        Returns:
+            success:    the data was loaded from the cache [bool]
+        """
+
+        try:
+            data = self.cache.load()
+        except cachefile.CacheError as e:
+            print(e)
+            return False
+
+        self.flightdata = columns2df(data['flightdata'])
+        self.trackdata = columns2df(data['trackdata'])
+        self.routedata = columns2df(data['routedata'])
+        self.datetime0 = pd.Timestamp(data['datetime0'][0])
+        return True
+
+    def save_cache(self):
+        """
+        Function: Save the prepared data in the cache, column by column
+        Args: -
+        Returns: -
+        """
+
+        self.cache.dump(dict(flightdata=df2columns(self.flightdata),
+                             trackdata=df2columns(self.trackdata),
+                             routedata=df2columns(self.routedata),
+                             datetime0=np.array([self.datetime0], dtype='datetime64[ns]')))
 
     def read_data(self):
         """
@@ -92,19 +153,19 @@ class VEMMISRead:
             for file in files:
                 if file.upper().startswith('FLIGHTS'):
                     # Read flight data
-                    self.flights = pd.read_csv(self.data_path+'\\'+file, sep=';')
+                    self.flights = pd.read_csv(os.path.join(root, file), sep=';')
                 elif file.upper().startswith('FLIGHTTIMES'):
                     # Read flight times data
-                    self.flighttimes = pd.read_csv(self.data_path+'\\'+file, sep=';')
+                    self.flighttimes = pd.read_csv(os.path.join(root, file), sep=';')
                 elif file.upper().startswith('TRACK'):
                     # Read track data
-                    self.tracks = pd.read_csv(self.data_path+'\\'+file, sep=';')
+                    self.tracks = pd.read_csv(os.path.join(root, file), sep=';')
                 elif file.upper().startswith('TAKEOFFS'):
                     # Read take-off data
-                    self.takeoffs = pd.read_csv(self.data_path+'\\'+file, sep=';')
+                    self.takeoffs = pd.read_csv(os.path.join(root, file), sep=';')
                 elif file.upper().startswith('LANDINGS'):
                     # Read landing data
-                    self.landings = pd.read_csv(self.data_path+'\\'+file, sep=';')
+                    self.landings = pd.read_csv(os.path.join(root, file), sep=';')
 
     def delete_nan(self):
         """
@@ -424,22 +485,28 @@ class VEMMISRead:
 
         # Flight data
         acid         = self.flightdata['CALLSIGN']
-        actype       = self.flightdata['ICAO_ACTYPE']
-        aclat        = self.flightdata['LATITUDE'].astype(str)
-        aclon        = self.flightdata['LONGITUDE'].astype(str)
-        achdg        = self.flightdata['HEADING'].astype(str)
-        acalt        = self.flightdata['ALTITUDE'].astype(str)
-        acspd        = self.flightdata['CAS'].astype(str)
         acorig       = self.flightdata['ADEP']
         acdest       = self.flightdata['DEST']
-        acflighttype = self.flightdata['FLIGHT_TYPE']
-        acwtc        = self.flightdata['WTC']
-        acssr        = self.flightdata['SSR'].astype(str)
+
+        # Data feed flights, take out flights that need to be simulated
+        datafeed = self.flightdata[['CALLSIGN', 'FLIGHT_TYPE', 'SIM_START', 'SIM_END']]
+        if swdatafeed:
+            if 'INBOUND' in typesim:
+                datafeed = datafeed.loc[datafeed['FLIGHT_TYPE'] != 'INBOUND']
+            if 'OUTBOUND' in typesim:
+                datafeed = datafeed.loc[datafeed['FLIGHT_TYPE'] != 'OUTBOUND']
+            if 'REGIONAL' in typesim:
+                datafeed = datafeed.loc[datafeed['FLIGHT_TYPE'] != 'REGIONAL']
+        else:
+            datafeed = datafeed.iloc[:0]
 
         # Commands
-        # Create
-        cmds  += list("CRE "+acid+", "+actype+", " + aclat+", "+aclon+", "+achdg+", "+acalt+", "+acspd)
-        cmdst += list(self.flightdata['SIM_START'])
+        # Create, with flight type, WTC, SSR code, SID, ARR and data feed
+        source = np.where(self.flightdata.index.isin(datafeed.index), 'VEMMIS', '')
+        crecmds, crecmdst = self.get_crebulk(self.flightdata, source=source,
+                                             sid=self.flightdata['SID'], arr=self.flightdata['STACK'])
+        cmds  += crecmds
+        cmdst += crecmdst
 
         # Origin
         cmds  += list("ORIG "+acid+", "+acorig)
@@ -449,49 +516,12 @@ class VEMMISRead:
         cmds  += list("DEST "+acid+", "+acdest)
         cmdst += list(self.flightdata['SIM_START'] + 0.01)
 
-        # Flight type
-        cmds  += list("FLIGHTTYPE "+acid+", "+acflighttype)
-        cmdst += list(self.flightdata['SIM_START'] + 0.01)
-
-        # WTC
-        cmds  += list("WTC "+acid+", "+acwtc)
-        cmdst += list(self.flightdata['SIM_START'] + 0.01)
-
-        # SSR Code
-        cmds  += list("SSRCODE "+acid+", "+acssr)
-        cmdst += list(self.flightdata['SIM_START'] + 0.01)
-
-        # SID
-        outbound = self.flightdata.dropna(subset=['SID'])
-        cmds    += list("SID "+outbound['CALLSIGN']+", "+outbound['SID']+", OFF")
-        cmdst   += list(outbound['SIM_START'] + 0.01)
-
-        # ARR
-        inbound = self.flightdata.dropna(subset=['STACK'])
-        cmds   += list("ARR "+inbound['CALLSIGN']+", "+inbound['STACK']+", OFF")
-        cmdst  += list(inbound['SIM_START'] + 0.01)
-
         # Delete route
         cmds  += list("DELRTE "+acid)
         cmdst += list(self.flightdata['SIM_START'] + 0.02)
 
         # Data feed dependent commands
         if swdatafeed:
-            datafeed = self.flightdata[['CALLSIGN', 'FLIGHT_TYPE', 'SIM_START', 'SIM_END']]
-
-            # Take out flights that need to be simulated
-            if 'INBOUND' in typesim:
-                datafeed = datafeed.loc[datafeed['FLIGHT_TYPE'] != 'INBOUND']
-            if 'OUTBOUND' in typesim:
-                datafeed = datafeed.loc[datafeed['FLIGHT_TYPE'] != 'OUTBOUND']
-            if 'REGIONAL' in typesim:
-                datafeed = datafeed.loc[datafeed['FLIGHT_TYPE'] != 'REGIONAL']
-
-            # Create commands for data feed flights
-            # Set data feed
-            cmds        += list("SETDATAFEED "+datafeed['CALLSIGN']+", VEMMIS")
-            cmdst       += list(datafeed['SIM_START'] + 0.01)
-
             # Delete
             cmds   += list("DEL "+datafeed['CALLSIGN'])
             cmdst  += list(datafeed['SIM_END'])
@@ -525,22 +555,22 @@ class VEMMISRead:
         # Flight data
         self.flightdata = self.flightdata.loc[self.flightdata['RUNWAY_OUT'] != '36L']  # No 36L departure
         acid         = self.flightdata['CALLSIGN']
-        actype       = self.flightdata['ICAO_ACTYPE']
-        aclat        = self.flightdata['LATITUDE'].astype(str)
-        aclon        = self.flightdata['LONGITUDE'].astype(str)
-        achdg        = self.flightdata['HEADING'].astype(str)
-        acalt        = self.flightdata['ALTITUDE'].astype(str)
-        acspd        = self.flightdata['CAS'].astype(str)
         acorig       = self.flightdata['ADEP']
         acdest       = self.flightdata['DEST']
-        acflighttype = self.flightdata['FLIGHT_TYPE']
-        acwtc        = self.flightdata['WTC']
-        acssr        = self.flightdata['SSR'].astype(str)
+
+        # Split into inbound and other traffic
+        isinbound = self.flightdata['FLIGHT_TYPE'] == 'INBOUND'
+        inbound = self.flightdata.loc[isinbound]
+        other = self.flightdata.loc[~isinbound]
 
         # Commands
-        # Create
-        cmds  += list("CRE "+acid+", "+actype+", "+aclat+", "+aclon+", "+achdg+", "+acalt+", "+acspd)
-        cmdst += list(self.flightdata['SIM_START'])
+        # Create, with flight type, WTC, SSR code, SID, and ARR and data feed
+        # for other traffic (inbound traffic gets an arrival with waypoints)
+        crecmds, crecmdst = self.get_crebulk(self.flightdata, source=np.where(isinbound, '', 'VEMMIS'),
+                                             sid=self.flightdata['SID'],
+                                             arr=self.flightdata['STACK'].where(~isinbound))
+        cmds  += crecmds
+        cmdst += crecmdst
 
         # Origin
         cmds  += list("ORIG "+acid+", "+acorig)
@@ -550,27 +580,6 @@ class VEMMISRead:
         cmds  += list("DEST "+acid+", "+acdest)
         cmdst += list(self.flightdata['SIM_START'] + 0.01)
 
-        # Flight type
-        cmds  += list("FLIGHTTYPE "+acid+", "+acflighttype)
-        cmdst += list(self.flightdata['SIM_START'] + 0.01)
-
-        # WTC
-        cmds  += list("WTC "+acid+", "+acwtc)
-        cmdst += list(self.flightdata['SIM_START'] + 0.01)
-
-        # SSR Code
-        cmds  += list("SSRCODE "+acid+", "+acssr)
-        cmdst += list(self.flightdata['SIM_START'] + 0.01)
-
-        # SID
-        outbound = self.flightdata.dropna(subset=['SID'])
-        cmds    += list("SID "+outbound['CALLSIGN']+", "+outbound['SID']+", OFF")
-        cmdst   += list(outbound['SIM_START'] + 0.01)
-
-        # Split into inbound and other traffic
-        inbound = self.flightdata.loc[self.flightdata['FLIGHT_TYPE'] == 'INBOUND']
-        other = self.flightdata.loc[self.flightdata['FLIGHT_TYPE'] != 'INBOUND']
-
         # Split into entry sectors
         # Sector 1
         sector1 = inbound.loc[inbound['LATITUDE'] >= 52.51121388888889]
@@ -598,14 +607,6 @@ class VEMMISRead:
         cmds  += list("ARR "+sector5['CALLSIGN']+", NIRSI_GAL02")
         cmdst += list(sector5['SIM_START'] + 0.01)
 
-        inother = other.dropna(subset=['STACK'])
-        cmds   += list("ARR "+inother['CALLSIGN']+", "+inother['STACK']+", OFF")
-        cmdst  += list(inother['SIM_START'] + 0.01)
-
-        # Data feed dependent commands
-        cmds  += list("SETDATAFEED "+other['CALLSIGN']+", VEMMIS")
-        cmdst += list(other['SIM_START'] + 0.01)
-
         # Track label
         cmds  += list("TRACKLABEL "+other['CALLSIGN']+", OFF")
         cmdst += list(other['SIM_START'] + 0.01)
@@ -663,22 +664,15 @@ class VEMMISRead:
         self.flightdata.drop(self.flightdata[self.flightdata['TMA_ENTRY_SIMTIME'] < 0.].index, inplace=True)
 
         acid         = self.flightdata['CALLSIGN']
-        actype       = self.flightdata['ICAO_ACTYPE']
-        aclat        = self.flightdata['LATITUDE'].astype(str)
-        aclon        = self.flightdata['LONGITUDE'].astype(str)
-        achdg        = self.flightdata['HEADING'].astype(str)
-        acalt        = self.flightdata['ALTITUDE'].astype(str)
-        acspd        = self.flightdata['CAS'].astype(str)
         acorig       = self.flightdata['ADEP']
         acdest       = self.flightdata['DEST']
-        acflighttype = self.flightdata['FLIGHT_TYPE']
-        acwtc        = self.flightdata['WTC']
-        acssr        = self.flightdata['SSR'].astype(str)
 
         # Commands
-        # Create
-        cmds  += list("CRE "+acid+", "+actype+", "+aclat+", "+aclon+", "+achdg+", "+acalt+", "+acspd)
-        cmdst += list(self.flightdata['SIM_START'])
+        # Create, with flight type, WTC, SSR code, ARR and data feed
+        crecmds, crecmdst = self.get_crebulk(self.flightdata, source='VEMMIS',
+                                             arr=self.flightdata['STACK'])
+        cmds  += crecmds
+        cmdst += crecmdst
 
         # Origin
         cmds  += list("ORIG "+acid+", "+acorig)
@@ -688,25 +682,6 @@ class VEMMISRead:
         cmds  += list("DEST "+acid+", "+acdest)
         cmdst += list(self.flightdata['SIM_START'] + 0.01)
 
-        # Flight type
-        cmds  += list("FLIGHTTYPE "+acid+", "+acflighttype)
-        cmdst += list(self.flightdata['SIM_START'] + 0.01)
-
-        # WTC
-        cmds  += list("WTC "+acid+", "+acwtc)
-        cmdst += list(self.flightdata['SIM_START'] + 0.01)
-
-        # SSR Code
-        cmds  += list("SSRCODE "+acid+", "+acssr)
-        cmdst += list(self.flightdata['SIM_START'] + 0.01)
-
-        # STACK
-        cmds    += list("ARR "+acid+", "+self.flightdata['STACK']+", OFF")
-        cmdst   += list(self.flightdata['SIM_START'] + 0.01)
-
-        cmds    += list("SETDATAFEED " + acid + ", VEMMIS")
-        cmdst   += list(self.flightdata['SIM_START'] + 0.01)
-
         # Simulation TMA
         if runway == 'R':
             setsim = self.flightdata.loc[self.flightdata['RUNWAY_IN'] == '18R']
@@ -764,6 +739,46 @@ class VEMMISRead:
 
         return cmds, cmdst
 
+    @staticmethod
+    def get_crebulk(flightdata, **columns):
+        """
+        Function: Store the flight data for bulk creation and get the CREBULK commands, one for
+                  each start time
+        Args:
+            flightdata: flights to create [DataFrame]
+            columns:    additional columns for Traffic.crebulk(), e.g. source, arr, sid [dict]
+        Returns:
+            cmds:       CREBULK commands [list]
+            cmdst:      simulation time of the commands [list]
+        """
+
+        data = {'acid':       flightdata['CALLSIGN'],
+                'actype':     flightdata['ICAO_ACTYPE'],
+                'aclat':      flightdata['LATITUDE'],
+                'aclon':      flightdata['LONGITUDE'],
+                'achdg':      flightdata['HEADING'],
+                'acalt':      flightdata['ALTITUDE']*ft,
+                'acspd':      flightdata['CAS']*kts,
+                'ssr':        flightdata['SSR'],
+                'flighttype': flightdata['FLIGHT_TYPE'],
+                'wtc':        flightdata['WTC']}
+        data.update(columns)
+
+        # Sort by start time
+        simstart = np.asarray(flightdata['SIM_START'])
+        order = np.argsort(simstart, kind='stable')
+        simstart = simstart[order]
+        data = {key: np.broadcast_to(np.asarray(values), simstart.shape)[order] for key, values in data.items()}
+        bs.traf.addbulkdata('VEMMIS', data)
+
+        # Create the aircraft with the same start time together
+        start = np.flatnonzero(np.r_[True, simstart[1:] != simstart[:-1]])
+        end = np.r_[start[1:], len(simstart)]
+        cmds = ['CREBULK VEMMIS ' + str(i) + ' ' + str(j) for i, j in zip(start, end)]
+        cmdst = list(simstart[start])
+
+        return cmds, cmdst
+
     def get_trackdata(self):
         """
         Function: Get the track data for the simulation
@@ -992,6 +1007,49 @@ class VEMMISSource:
         return running, cmds, ids, lat, lon, hdg, alt, gs
 
 
+"""
+Functions
+"""
+
+
+def df2columns(df):
+    """
+    Function: Convert a dataframe to numpy arrays, with text columns stored as codes and unique values
+    Args:
+        df:         dataframe [DataFrame]
+    Returns:
+        columns:    index and arrays of the columns [dict]
+    """
+
+    columns = {}
+    for name in df.columns:
+        values = df[name].to_numpy()
+        if values.dtype == object:
+            codes, uniques = pd.factorize(values)
+            values = (codes, np.asarray(uniques, dtype=object))
+        columns[name] = values
+    return dict(index=df.index.to_numpy(), columns=columns)
+
+
+def columns2df(data):
+    """
+    Function: Convert the numpy arrays of df2columns back to a dataframe
+    Args:
+        data:       index and arrays of the columns [dict]
+    Returns:
+        df:         dataframe [DataFrame]
+    """
+
+    columns = {}
+    for name, values in data['columns'].items():
+        if isinstance(values, tuple):
+            codes, uniques = values
+            values = np.where(codes < 0, np.nan, uniques.take(codes)) if len(uniques) else \
+                np.full(len(codes), np.nan, dtype=object)
+        columns[name] = values
+    return pd.DataFrame(columns, index=data['index'])
+
+
 """
 Run
 """
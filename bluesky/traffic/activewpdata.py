@@ -5,6 +5,8 @@ from bluesky.tools.misc import degto180
 from bluesky.core import Entity
 
 class ActiveWaypoint(Entity, replaceable=True):
+    float64vars = ('lat', 'lon', 'torta')
+
     def __init__(self):
         super().__init__()
         with self.settrafarrays():
@@ -7,6 +7,7 @@ from bluesky.core import Entity
 
 class ADSB(Entity, replaceable=True):
     """ ADS-B model. Implements real-life limitations of ADS-B communication."""
+    float64vars = ('lastupdate', 'lat', 'lon', 'alt')
 
     def __init__(self):
         super().__init__()
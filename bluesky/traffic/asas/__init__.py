@@ -1,4 +1,6 @@
 from .detection import ConflictDetection
 from .resolution import ConflictResolution
 from .statebased import StateBased
+from .gridstatebased import GridStateBased
+from .incrementalstatebased import IncrementalStateBased
 from .mvp import MVP
\ No newline at end of file
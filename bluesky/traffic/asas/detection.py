@@ -1,10 +1,13 @@
 ''' This module provides the Conflict Detection base class. '''
+import os
 import numpy as np
 
 import bluesky as bs
+from bluesky.tools import datalog
 from bluesky.tools.aero import ft, nm
 from bluesky.core import Entity
 from bluesky.stack import command
+from bluesky.traffic.asas.history import ConflictHistory
 
 
 bs.settings.set_variable_defaults(asas_pzr=5.0, asas_pzh=1000.0,
@@ -13,6 +16,10 @@ bs.settings.set_variable_defaults(asas_pzr=5.0, asas_pzh=1000.0,
 
 class ConflictDetection(Entity, replaceable=True):
     ''' Base class for Conflict Detection implementations. '''
+    checkpointvars = ('confown', 'confint', 'confkey', 'losown', 'losint', 'loskey',
+                      'qdr', 'dist', 'dcpa', 'tcpa', 'tLOS', 'confunique', 'losunique',
+                      'confhist', 'loshist', 'nextuid')
+
     def __init__(self):
         super().__init__()
         ## Default values
@@ -28,21 +35,33 @@ class ConflictDetection(Entity, replaceable=True):
         self.dtnolook_def = 0.0
         self.global_dtnolook = True
 
-        # Conflicts and LoS detected in the current timestep (used for resolving)
-        self.confpairs = list()
-        self.lospairs = list()
+        # Conflicts and LoS detected in the current timestep (used for resolving),
+        # stored as parallel arrays of ownship and intruder indices, and a
+        # stable pair key based on the unique id of both aircraft
+        self.confown = np.array([], dtype=np.int32)
+        self.confint = np.array([], dtype=np.int32)
+        self.confkey = np.array([], dtype=np.int64)
+        self.losown = np.array([], dtype=np.int32)
+        self.losint = np.array([], dtype=np.int32)
+        self.loskey = np.array([], dtype=np.int64)
         self.qdr = np.array([])
         self.dist = np.array([])
         self.dcpa = np.array([])
         self.tcpa = np.array([])
         self.tLOS = np.array([])
-        # Unique conflicts and LoS in the current timestep (a, b) = (b, a)
-        self.confpairs_unique = set()
-        self.lospairs_unique = set()
+        # Unique conflict and LoS keys in the current timestep (a, b) = (b, a)
+        self.confunique = np.array([], dtype=np.int64)
+        self.losunique = np.array([], dtype=np.int64)
+
+        # History of conflict and LoS events since simt=0
+        self.confhist = ConflictHistory('CONF')
+        self.loshist = ConflictHistory('LOS')
+
+        # Lazily constructed (acid, acid) views of the conflict pairs
+        self._pairviews = dict()
 
-        # All conflicts and LoS since simt=0
-        self.confpairs_all = list()
-        self.lospairs_all = list()
+        # Unique id's of aircraft, used for stable pair keys
+        self.nextuid = 0
 
         # Per-aircraft conflict data
         with self.settrafarrays():
@@ -55,20 +74,103 @@ class ConflictDetection(Entity, replaceable=True):
             # [s] lookahead time
             self.dtlookahead = np.array([])
             self.dtnolook = np.array([])
+            # Unique id of each aircraft
+            self.uid = np.array([], dtype=np.int64)
 
     def clearconfdb(self):
         ''' Clear conflict database. '''
-        self.confpairs_unique.clear()
-        self.lospairs_unique.clear()
-        self.confpairs.clear()
-        self.lospairs.clear()
+        self.confown = np.array([], dtype=np.int32)
+        self.confint = np.array([], dtype=np.int32)
+        self.confkey = np.array([], dtype=np.int64)
+        self.losown = np.array([], dtype=np.int32)
+        self.losint = np.array([], dtype=np.int32)
+        self.loskey = np.array([], dtype=np.int64)
+        self.confunique = np.array([], dtype=np.int64)
+        self.losunique = np.array([], dtype=np.int64)
         self.qdr = np.array([])
         self.dist = np.array([])
         self.dcpa = np.array([])
         self.tcpa = np.array([])
         self.tLOS = np.array([])
-        self.inconf = np.zeros(bs.traf.ntraf)
+        self.inconf = np.zeros(bs.traf.ntraf, dtype=bool)
         self.tcpamax = np.zeros(bs.traf.ntraf)
+        self._pairviews.clear()
+
+    @property
+    def confpairs(self):
+        ''' Conflict pairs in the current timestep as (acid, acid) tuples.
+            Both (a, b) and (b, a) are listed. '''
+        return self._pairview('confpairs', self.confown, self.confint)
+
+    @property
+    def lospairs(self):
+        ''' LoS pairs in the current timestep as (acid, acid) tuples. '''
+        return self._pairview('lospairs', self.losown, self.losint)
+
+    @property
+    def confpairs_unique(self):
+        ''' Unique conflict pairs in the current timestep as frozensets of acids. '''
+        views = self._pairviews
+        if 'confpairs_unique' not in views:
+            views['confpairs_unique'] = {frozenset(pair) for pair in self.confpairs}
+        return views['confpairs_unique']
+
+    @property
+    def lospairs_unique(self):
+        ''' Unique LoS pairs in the current timestep as frozensets of acids. '''
+        views = self._pairviews
+        if 'lospairs_unique' not in views:
+            views['lospairs_unique'] = {frozenset(pair) for pair in self.lospairs}
+        return views['lospairs_unique']
+
+    @property
+    def nconf_tot(self):
+        ''' Total number of conflicts since simt=0. '''
+        return self.confhist.ntotal
+
+    @property
+    def nlos_tot(self):
+        ''' Total number of LoS since simt=0. '''
+        return self.loshist.ntotal
+
+    @property
+    def confpairs_all(self):
+        ''' Unique conflict pairs in the history as frozensets of acids. Only
+            the events that are still in memory are included. '''
+        return self.confhist.uniquepairs()
+
+    @property
+    def lospairs_all(self):
+        ''' Unique LoS pairs in the history as frozensets of acids. Only
+            the events that are still in memory are included. '''
+        return self.loshist.uniquepairs()
+
+    def _pairview(self, name, own, intr):
+        ''' Construct (and cache) a list of (acid, acid) tuples from pair indices. '''
+        views = self._pairviews
+        if name not in views:
+            acid = bs.traf.id
+            views[name] = [(acid[i], acid[j]) for i, j in zip(own.tolist(), intr.tolist())]
+        return views[name]
+
+    @staticmethod
+    def pairkey(uid1, uid2):
+        ''' Stable key of the ordered aircraft pair(s) with unique id's uid1, uid2. '''
+        return (np.asarray(uid1, dtype=np.int64) << 32) | np.asarray(uid2, dtype=np.int64)
+
+    @staticmethod
+    def uniquekey(uid1, uid2):
+        ''' Stable key of the unordered aircraft pair(s) with unique id's uid1, uid2. '''
+        return ConflictDetection.pairkey(np.minimum(uid1, uid2), np.maximum(uid1, uid2))
+
+    def uid2idx(self, uid):
+        ''' Current traffic indices of the aircraft with unique id's uid,
+            or -1 for aircraft that no longer exist. '''
+        if not len(self.uid):
+            return np.full(np.shape(uid), -1)
+        order = np.argsort(self.uid)
+        idx = order[np.minimum(np.searchsorted(self.uid, uid, sorter=order), len(order) - 1)]
+        return np.where(self.uid[idx] == uid, idx, -1)
 
     def create(self, n):
         super().create(n)
@@ -77,16 +179,42 @@ class ConflictDetection(Entity, replaceable=True):
         self.hpz[-n:] = self.hpz_def
         self.dtlookahead[-n:] = self.dtlookahead_def
         self.dtnolook[-n:] = self.dtnolook_def
+        self.uid[-n:] = np.arange(self.nextuid, self.nextuid + n)
+        self.nextuid += n
+
+    def delete(self, idx):
+        keep = np.ones(len(self.uid), dtype=bool)
+        keep[idx] = False
+        super().delete(idx)
+        # Remove pairs with deleted aircraft, and shift the indices of the
+        # remaining pairs to the new traffic arrays
+        if len(self.confown) or len(self.losown):
+            newidx = np.cumsum(keep, dtype=np.int32) - 1
+            confmask = keep[self.confown] & keep[self.confint]
+            self.confown = newidx[self.confown[confmask]]
+            self.confint = newidx[self.confint[confmask]]
+            self.confkey = self.confkey[confmask]
+            self.qdr = self.qdr[confmask]
+            self.dist = self.dist[confmask]
+            self.dcpa = self.dcpa[confmask]
+            self.tcpa = self.tcpa[confmask]
+            self.tLOS = self.tLOS[confmask]
+            losmask = keep[self.losown] & keep[self.losint]
+            self.losown = newidx[self.losown[losmask]]
+            self.losint = newidx[self.losint[losmask]]
+            self.loskey = self.loskey[losmask]
+            self._pairviews.clear()
 
     def reset(self):
         super().reset()
         self.clearconfdb()
-        self.confpairs_all.clear()
-        self.lospairs_all.clear()
+        self.confhist.reset()
+        self.loshist.reset()
         self.rpz_def = bs.settings.asas_pzr * nm
         self.hpz_def = bs.settings.asas_pzh * ft
         self.dtlookahead_def = bs.settings.asas_dtlookahead
         self.dtnolook_def = 0.0
+        self.nextuid = 0
         self.global_rpz = self.global_hpz = True
         self.global_dtlook = self.global_dtnolook = True
 
@@ -121,6 +249,24 @@ class ConflictDetection(Entity, replaceable=True):
         ConflictDetection.instance().clearconfdb()
         return True, f'Selected {method.__name__} as CD method.'
 
+    @command(name='CDLOG')
+    def setlog(self, flag: 'onoff' = None):
+        ''' Log the conflict and LoS history to binary files in the
+            output directory. The files are written every
+            settings.asas_histdt seconds, and when the history buffer is full. '''
+        if flag is None:
+            files = [h.fname for h in (self.confhist, self.loshist) if h.file]
+            return True, 'CDLOG ON/OFF\n' + ('Logging to ' + ', '.join(files)
+                                             if files else 'Conflict logging is off')
+        if not flag:
+            self.confhist.close()
+            self.loshist.close()
+            return True, 'Conflict logging is off'
+        os.makedirs(bs.settings.log_path, exist_ok=True)
+        for hist in (self.confhist, self.loshist):
+            hist.open(os.path.splitext(datalog.makeLogfileName(hist.name + 'HIST'))[0] + '.bin')
+        return True, f'Logging conflicts to {self.confhist.fname} and LoS to {self.loshist.fname}'
+
     @command(name='ZONER', aliases=('PZR', 'RPZ', 'PZRADIUS'))
     def setrpz(self, radius: float = -1.0, *acidx: 'acid'):
         ''' Set the horizontal separation distance (i.e., the radius of the
@@ -208,31 +354,68 @@ class ConflictDetection(Entity, replaceable=True):
 
     def update(self, ownship, intruder):
         ''' Perform an update step of the Conflict Detection implementation. '''
-        self.confpairs, self.lospairs, self.inconf, self.tcpamax, self.qdr, \
-            self.dist, self.dcpa, self.tcpa, self.tLOS = \
-                self.detect(ownship, intruder, self.rpz, self.hpz, self.dtlookahead)
+        confpairs, lospairs, self.inconf, self.tcpamax, qdr, dist, dcpa, tcpa, tLOS = \
+            self.detect(ownship, intruder, self.rpz, self.hpz, self.dtlookahead)
+        self.qdr, self.dist, self.dcpa, self.tcpa, self.tLOS = (np.asarray(v, dtype=float)
+            for v in (qdr, dist, dcpa, tcpa, tLOS))
+
+        # Detection methods from plugins can still provide lists of (acid, acid)
+        # tuples instead of index arrays
+        self.confown, self.confint = self.pairindices(ownship, confpairs)
+        self.losown, self.losint = self.pairindices(ownship, lospairs)
+        self.confkey = self.pairkey(self.uid[self.confown], self.uid[self.confint])
+        self.loskey = self.pairkey(self.uid[self.losown], self.uid[self.losint])
+        self._pairviews.clear()
 
         # confpairs has conflicts observed from both sides (a, b) and (b, a)
-        # confpairs_unique keeps only one of these
-        confpairs_unique = {frozenset(pair) for pair in self.confpairs}
-        lospairs_unique = {frozenset(pair) for pair in self.lospairs}
+        # confunique keeps only one of these
+        confunique, iconf = np.unique(self.uniquekey(
+            self.uid[self.confown], self.uid[self.confint]), return_index=True)
+        losunique, ilos = np.unique(self.uniquekey(
+            self.uid[self.losown], self.uid[self.losint]), return_index=True)
 
-        self.confpairs_all.extend(confpairs_unique - self.confpairs_unique)
-        self.lospairs_all.extend(lospairs_unique - self.lospairs_unique)
+        # Update the conflict and LoS history. For LoS the distance at CPA
+        # is taken from the corresponding conflict, when there is one
+        dcpa = self.dcpa[iconf]
+        losdcpa = np.full(len(losunique), np.nan)
+        if len(confunique):
+            icf = np.minimum(np.searchsorted(confunique, losunique), len(confunique) - 1)
+            match = confunique[icf] == losunique
+            losdcpa[match] = dcpa[icf[match]]
+        self.confhist.update(bs.sim.simt, confunique, self.confown[iconf],
+                             self.confint[iconf], ownship.id, dcpa)
+        self.loshist.update(bs.sim.simt, losunique, self.losown[ilos],
+                            self.losint[ilos], ownship.id, losdcpa)
 
-        # Update confpairs_unique and lospairs_unique
-        self.confpairs_unique = confpairs_unique
-        self.lospairs_unique = lospairs_unique
+        # Update confunique and losunique
+        self.confunique = confunique
+        self.losunique = losunique
+
+    @staticmethod
+    def pairindices(traf, pairs):
+        ''' Return pairs as a tuple of int32 ownship and intruder index arrays.
+            pairs can already be a tuple of index arrays, or a list of
+            (acid, acid) tuples. '''
+        if isinstance(pairs, tuple):
+            return tuple(np.asarray(p, dtype=np.int32) for p in pairs)
+        if not pairs:
+            return np.array([], dtype=np.int32), np.array([], dtype=np.int32)
+        own, intr = zip(*pairs)
+        return np.array(traf.id2idx(own), dtype=np.int32), \
+            np.array(traf.id2idx(intr), dtype=np.int32)
 
     def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
         ''' Detect any conflicts between ownship and intruder.
             This function should be reimplemented in a subclass for actual
             detection of conflicts. See for instance
             bluesky.traffic.asas.statebased.
+
+            Conflict and LoS pairs are returned as tuples of ownship and
+            intruder index arrays.
         '''
-        confpairs = []
-        lospairs = []
-        inconf = np.zeros(ownship.ntraf)
+        confpairs = (np.array([], dtype=np.int32), np.array([], dtype=np.int32))
+        lospairs = (np.array([], dtype=np.int32), np.array([], dtype=np.int32))
+        inconf = np.zeros(ownship.ntraf, dtype=bool)
         tcpamax = np.zeros(ownship.ntraf)
         qdr = np.array([])
         dist = np.array([])
@@ -0,0 +1,190 @@
+''' State-based conflict detection with a spatial grid broadphase. '''
+import numpy as np
+from bluesky.tools import geo
+from bluesky.tools.aero import nm, Rearth
+from bluesky.traffic.asas import StateBased
+
+
+class GridStateBased(StateBased):
+    ''' State-based conflict detection that only evaluates aircraft pairs
+        that are close enough to possibly get in conflict within the lookahead
+        time.
+
+        Aircraft are binned into a lat/lon/altitude grid with a cell size
+        that is larger than the largest distance that any pair can close
+        within the lookahead time (rpz + 2 * gsmax * dtlookahead horizontally,
+        hpz + 2 * vsmax * dtlookahead vertically). Only pairs in neighbouring
+        cells are passed to the (exact) CPA calculation, which gives the same
+        results as StateBased, without building ntraf x ntraf matrices. '''
+    def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Conflict detection between ownship (traf) and intruder (traf/adsb).'''
+        own, intr = gridpairs(ownship, intruder, rpz, hpz, dtlookahead)
+        return detect_pairs(ownship, intruder, rpz, hpz, dtlookahead, own, intr)
+
+
+def gridpairs(ownship, intruder, rpz, hpz, dtlookahead):
+    ''' Return ordered candidate pairs (i, j), i != j, of aircraft in
+        neighbouring grid cells, sorted in row-major order. '''
+    ntraf = ownship.ntraf
+    if ntraf < 2:
+        return np.array([], dtype=int), np.array([], dtype=int)
+
+    # Worst-case distances that can be closed within the lookahead time
+    dtlook = np.max(dtlookahead)
+    gsmax = max(np.max(ownship.gs), np.max(intruder.gs))
+    vsmax = max(np.max(np.abs(ownship.vs)), np.max(np.abs(intruder.vs)))
+    hcell = max(1.0, np.max(rpz) + 2.0 * gsmax * dtlook)
+    vcell = max(1.0, np.max(hpz) + 2.0 * vsmax * dtlook)
+
+    # Latitude rows. kwikdist never underestimates the latitude difference.
+    latcell = np.degrees(hcell / Rearth)
+    row = np.floor((ownship.lat + 90.0) / latcell).astype(np.int64)
+    row -= row.min()
+    nrows = row.max() + 1
+
+    # Longitude columns, which wrap around the dateline. Cell width is based
+    # on the highest latitude in the traffic to remain conservative.
+    coslat = np.cos(np.radians(min(89.9, np.max(np.abs(ownship.lat)))))
+    loncell = np.degrees(hcell / (Rearth * coslat))
+    ncols = int(360.0 // loncell)
+    if ncols < 3:
+        ncols = 1
+        col = np.zeros(ntraf, dtype=np.int64)
+    else:
+        col = np.minimum(ncols - 1, np.floor(((ownship.lon + 180.0) % 360.0) / loncell)).astype(np.int64)
+
+    # Altitude levels
+    lev = np.floor((ownship.alt - np.min(ownship.alt)) / vcell).astype(np.int64)
+    nlevs = lev.max() + 1
+
+    key = (row * ncols + col) * nlevs + lev
+    order = np.argsort(key, kind='stable')
+    skey = key[order]
+
+    own = []
+    intr = []
+    dcols = (0,) if ncols == 1 else (-1, 0, 1)
+    for drow in (-1, 0, 1):
+        nrow = row + drow
+        rowok = (nrow >= 0) & (nrow < nrows)
+        for dcol in dcols:
+            ncol = (col + dcol) % ncols
+            for dlev in (-1, 0, 1):
+                nlev = lev + dlev
+                valid = rowok & (nlev >= 0) & (nlev < nlevs)
+                nkey = (nrow * ncols + ncol) * nlevs + nlev
+                lo = np.searchsorted(skey, nkey, side='left')
+                cnt = np.where(valid, np.searchsorted(skey, nkey, side='right') - lo, 0)
+                total = cnt.sum()
+                if not total:
+                    continue
+                # Expand the per-aircraft ranges [lo, lo + cnt) in the sorted
+                # keys to individual candidate pairs
+                start = np.cumsum(cnt) - cnt
+                pos = np.arange(total) - np.repeat(start - lo, cnt)
+                own.append(np.repeat(np.arange(ntraf), cnt))
+                intr.append(order[pos])
+
+    if not own:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    own = np.concatenate(own)
+    intr = np.concatenate(intr)
+    notself = own != intr
+    own, intr = own[notself], intr[notself]
+
+    # Sort in the same (row-major) order as the dense implementation
+    srt = np.argsort(own * ntraf + intr, kind='stable')
+    return own[srt], intr[srt]
+
+
+def detect_pairs(ownship, intruder, rpz, hpz, dtlookahead, own, intr):
+    ''' Exact state-based conflict detection for a list of aircraft pairs.
+        Returns the same outputs as StateBased.detect. '''
+    return select_pairs(ownship.ntraf, own, intr,
+                        *pairstate(ownship, intruder, rpz, hpz, dtlookahead, own, intr))
+
+
+def pairstate(ownship, intruder, rpz, hpz, dtlookahead, own, intr):
+    ''' Exact state-based CPA calculation for a list of aircraft pairs.
+        Returns per pair the conflict and LoS flags, and qdr, dist, dcpa,
+        tcpa and tinconf. '''
+    # Horizontal conflict ------------------------------------------------------
+    qdr, dist = geo.kwikqdrdist(ownship.lat[own], ownship.lon[own],
+                                intruder.lat[intr], intruder.lon[intr])
+    dist = dist * nm
+
+    # Calculate horizontal closest point of approach (CPA)
+    qdrrad = np.radians(qdr)
+    dx = dist * np.sin(qdrrad)  # is pos j rel to i
+    dy = dist * np.cos(qdrrad)  # is pos j rel to i
+
+    # Relative velocity of intruder j w.r.t. ownship i
+    owntrkrad = np.radians(ownship.trk[own])
+    inttrkrad = np.radians(intruder.trk[intr])
+    du = intruder.gs[intr] * np.sin(inttrkrad) - ownship.gs[own] * np.sin(owntrkrad)
+    dv = intruder.gs[intr] * np.cos(inttrkrad) - ownship.gs[own] * np.cos(owntrkrad)
+
+    dv2 = du * du + dv * dv
+    dv2 = np.where(np.abs(dv2) < 1e-6, 1e-6, dv2)  # limit lower absolute value
+    vrel = np.sqrt(dv2)
+
+    tcpa = -(du * dx + dv * dy) / dv2
+
+    # Calculate distance^2 at CPA (minimum distance^2)
+    dcpa2 = np.abs(dist * dist - tcpa * tcpa * dv2)
+
+    # Check for horizontal conflict
+    # RPZ can differ per aircraft, get the largest value per aircraft pair
+    pairrpz = np.maximum(rpz[own], rpz[intr])
+    R2 = pairrpz * pairrpz
+    swhorconf = dcpa2 < R2  # conflict or not
+
+    # Calculate times of entering and leaving horizontal conflict
+    dxinhor = np.sqrt(np.maximum(0., R2 - dcpa2))  # half the distance travelled inzide zone
+    dtinhor = dxinhor / vrel
+
+    tinhor = np.where(swhorconf, tcpa - dtinhor, 1e8)  # Set very large if no conf
+    touthor = np.where(swhorconf, tcpa + dtinhor, -1e8)  # set very large if no conf
+
+    # Vertical conflict --------------------------------------------------------
+
+    # Vertical crossing of disk (-dh,+dh)
+    dalt = intruder.alt[intr] - ownship.alt[own]
+    dvs = intruder.vs[intr] - ownship.vs[own]
+    dvs = np.where(np.abs(dvs) < 1e-6, 1e-6, dvs)  # prevent division by zero
+
+    # Check for passing through each others zone
+    # hPZ can differ per aircraft, get the largest value per aircraft pair
+    pairhpz = np.maximum(hpz[own], hpz[intr])
+    tcrosshi = (dalt + pairhpz) / -dvs
+    tcrosslo = (dalt - pairhpz) / -dvs
+    tinver = np.minimum(tcrosshi, tcrosslo)
+    toutver = np.maximum(tcrosshi, tcrosslo)
+
+    # Combine vertical and horizontal conflict----------------------------------
+    tinconf = np.maximum(tinver, tinhor)
+    toutconf = np.minimum(toutver, touthor)
+
+    swconfl = swhorconf & (tinconf <= toutconf) & (toutconf > 0.0) & \
+        (tinconf < dtlookahead[own])
+    swlos = (dist < pairrpz) & (np.abs(dalt) < pairhpz)
+
+    return swconfl, swlos, qdr, dist, np.sqrt(dcpa2), tcpa, tinconf
+
+
+def select_pairs(ntraf, own, intr, swconfl, swlos, qdr, dist, dcpa, tcpa, tinconf):
+    ''' Select the conflicts and LoS from the per-pair outputs of pairstate,
+        in the output format of StateBased.detect. '''
+    # Ownship conflict flag and max tCPA
+    inconf = np.zeros(ntraf, dtype=bool)
+    inconf[own[swconfl]] = True
+    tcpamax = np.zeros(ntraf)
+    np.maximum.at(tcpamax, own[swconfl], tcpa[swconfl])
+
+    # Select conflicting pairs: each a/c gets their own record
+    confpairs = (own[swconfl].astype(np.int32), intr[swconfl].astype(np.int32))
+    lospairs = (own[swlos].astype(np.int32), intr[swlos].astype(np.int32))
+
+    return confpairs, lospairs, inconf, tcpamax, \
+        qdr[swconfl], dist[swconfl], dcpa[swconfl], \
+        tcpa[swconfl], tinconf[swconfl]
@@ -0,0 +1,139 @@
+''' Bounded, event-based history of conflicts and losses of separation. '''
+import numpy as np
+import bluesky as bs
+
+
+bs.settings.set_variable_defaults(asas_histsize=10000, asas_histdt=60.0)
+
+# One record per conflict or LoS event: unique pair key, aircraft id's (up
+# to 16 characters, e.g. for the long callsigns of VEMMIS and live traffic),
+# start and end time, and the smallest distance at CPA during the event
+record = np.dtype([('key', '<i8'), ('acid1', 'S16'), ('acid2', 'S16'),
+                   ('tstart', '<f8'), ('tend', '<f8'), ('dcpamin', '<f8')])
+
+
+class ConflictHistory:
+    ''' Columnar record of conflict (or LoS) events.
+
+        Events begin and end by comparing the unique pair keys of successive
+        timesteps. Finished events are kept in a fixed-size buffer of
+        settings.asas_histsize records. When logging to file, the buffer is
+        written to a binary file every settings.asas_histdt seconds and when
+        it is full. Otherwise, the oldest records are dropped. '''
+    def __init__(self, name):
+        self.name = name
+        # Total number of events since simt=0
+        self.ntotal = 0
+        # Number of finished events that were dropped from the buffer
+        self.ndropped = 0
+        # Ongoing events, sorted by key
+        self.active = np.zeros(0, dtype=record)
+        # Buffer with finished events
+        self.done = np.zeros(bs.settings.asas_histsize, dtype=record)
+        self.ndone = 0
+        self.file = None
+        self.fname = ''
+        self.tflush = 0.0
+
+    def __getstate__(self):
+        ''' The log file is not included when the history is pickled for a
+            checkpoint. '''
+        state = self.__dict__.copy()
+        state['file'] = None
+        return state
+
+    def reset(self):
+        ''' Close the log file and clear the history. '''
+        self.close()
+        self.__init__(self.name)
+
+    def records(self):
+        ''' All events in memory: finished events, followed by ongoing
+            events (with tend = nan). '''
+        return np.concatenate((self.done[:self.ndone], self.active))
+
+    def uniquepairs(self):
+        ''' Unique aircraft pairs of the events in memory, as frozensets of
+            aircraft id's. '''
+        records = self.records()
+        _, first = np.unique(records['key'], return_index=True)
+        return [frozenset((a.decode(), b.decode())) for a, b in
+                zip(records['acid1'][first], records['acid2'][first])]
+
+    def update(self, simt, keys, own, intr, acid, dcpa):
+        ''' Update the history with the sorted unique pair keys of the
+            current timestep, and the ownship and intruder indices and
+            distance at CPA of each key. '''
+        active = self.active
+        isold = np.isin(keys, active['key'], assume_unique=True)
+        ended = np.isin(active['key'], keys, assume_unique=True, invert=True)
+
+        # Both arrays are sorted, so continuing events line up with keys[isold]
+        cont = active[~ended]
+        cont['dcpamin'] = np.fmin(cont['dcpamin'], dcpa[isold])
+        if np.any(ended):
+            finished = active[ended]
+            finished['tend'] = simt
+            self.store(finished)
+
+        # Only look up the aircraft id's of new events
+        isnew = np.flatnonzero(~isold)
+        new = np.zeros(len(isnew), dtype=record)
+        new['key'] = keys[isnew]
+        new['acid1'] = [acid[i] for i in own[isnew]]
+        new['acid2'] = [acid[i] for i in intr[isnew]]
+        new['tstart'] = simt
+        new['tend'] = np.nan
+        new['dcpamin'] = dcpa[isnew]
+        self.ntotal += len(new)
+
+        if len(new):
+            active = np.concatenate((cont, new))
+            self.active = active[np.argsort(active['key'])]
+        else:
+            self.active = cont
+
+        if self.file and simt - self.tflush >= bs.settings.asas_histdt:
+            self.flush(simt)
+
+    def store(self, finished):
+        ''' Add finished events to the buffer. '''
+        size = len(self.done)
+        if self.ndone + len(finished) > size:
+            if self.file:
+                self.flush()
+                if len(finished) > size:
+                    finished.tofile(self.file)
+                    return
+            else:
+                finished = finished[-size:]
+                ndrop = self.ndone + len(finished) - size
+                self.done[:self.ndone - ndrop] = self.done[ndrop:self.ndone]
+                self.ndone -= ndrop
+                self.ndropped += ndrop
+        self.done[self.ndone:self.ndone + len(finished)] = finished
+        self.ndone += len(finished)
+
+    def open(self, fname):
+        ''' Start logging finished events to binary file fname. The file can
+            be read with numpy.fromfile(fname, dtype=history.record). '''
+        self.close()
+        self.fname = fname
+        self.file = open(fname, 'wb')
+        self.tflush = bs.sim.simt
+
+    def close(self):
+        ''' Write remaining finished events, and close the log file. '''
+        if self.file:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def flush(self, simt=None):
+        ''' Write the finished events in the buffer to the log file. '''
+        if simt is not None:
+            self.tflush = simt
+        if self.file and self.ndone:
+            self.done[:self.ndone].tofile(self.file)
+            self.file.flush()
+            self.ndone = 0
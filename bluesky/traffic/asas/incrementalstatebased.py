@@ -0,0 +1,156 @@
+''' State-based conflict detection that exploits temporal coherence. '''
+import numpy as np
+import bluesky as bs
+from bluesky.tools import geo
+from bluesky.tools.aero import nm, ft
+from bluesky.traffic.asas import StateBased
+from bluesky.traffic.asas.gridstatebased import gridpairs, pairstate, select_pairs
+
+
+bs.settings.set_variable_defaults(asas_cdmargin=5.0, asas_cdvmargin=1000.0,
+                                  asas_cdrebuild=20, asas_cdcheck=False)
+
+
+class IncrementalStateBased(StateBased):
+    ''' State-based conflict detection with a persistent set of candidate
+        pairs.
+
+        The candidate pairs are all pairs that could get in conflict within
+        the lookahead time, with an additional safety margin of
+        settings.asas_cdmargin [nm] horizontally and settings.asas_cdvmargin
+        [ft] vertically. Every timestep only the candidate pairs of which
+        (one of) the aircraft changed state are re-evaluated. The candidate
+        set is rebuilt every settings.asas_cdrebuild timesteps, when the
+        traffic changes, or when aircraft have moved so far that the safety
+        margin is used up.
+
+        With settings.asas_cdcheck the results are compared against a full
+        StateBased detection every timestep. '''
+    def __init__(self):
+        super().__init__()
+        self.pairs = CandidatePairs()
+
+    def create(self, n=1):
+        super().create(n)
+        self.pairs.invalidate()
+
+    def delete(self, idx):
+        super().delete(idx)
+        self.pairs.invalidate()
+
+    def reset(self):
+        super().reset()
+        self.pairs.invalidate()
+
+    def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Conflict detection between ownship (traf) and intruder (traf/adsb).'''
+        result = self.pairs.detect(ownship, intruder, rpz, hpz, dtlookahead)
+        if bs.settings.asas_cdcheck:
+            reference = StateBased.detect(self, ownship, intruder, rpz, hpz, dtlookahead)
+            if not same_detection(result, reference):
+                bs.scr.echo(f'IncrementalStateBased: result differs from full '
+                            f'detection at t={bs.sim.simt:.1f}')
+        return result
+
+
+class CandidatePairs:
+    ''' Persistent candidate pairs for state-based conflict detection,
+        including the cached CPA results of each pair. '''
+    def __init__(self):
+        self.own = self.intr = np.array([], dtype=np.int64)
+        # Per-pair outputs of pairstate for all candidate pairs
+        self.values = None
+        # Aircraft states in the previous and the rebuild timestep
+        self.state = None
+        self.ref = None
+        # Horizontal and vertical reach when the candidates were built
+        self.reach = self.vreach = 0.0
+        self.ntraf = 0
+        self.age = 0
+        self.valid = False
+        # Statistics: number of rebuilds and pairs evaluated in the last step
+        self.nrebuild = 0
+        self.nevaluated = 0
+
+    def invalidate(self):
+        ''' Force a rebuild in the next timestep. '''
+        self.valid = False
+
+    def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Conflict detection between ownship and intruder, with the same
+            output as StateBased.detect. '''
+        state = np.vstack((ownship.lat, ownship.lon, ownship.alt,
+                           ownship.trk, ownship.gs, ownship.vs,
+                           intruder.lat, intruder.lon, intruder.alt,
+                           intruder.trk, intruder.gs, intruder.vs,
+                           rpz, hpz, dtlookahead))
+        reach, vreach = maxreach(ownship, intruder, rpz, hpz, dtlookahead)
+
+        if not self.valid or ownship.ntraf != self.ntraf or \
+                self.age >= bs.settings.asas_cdrebuild or \
+                not self.margin_ok(state, reach, vreach):
+            self.rebuild(ownship, intruder, rpz, hpz, dtlookahead, state, reach, vreach)
+        else:
+            # Only re-evaluate pairs of which one of the aircraft changed state
+            changed = np.any(state != self.state, axis=0)
+            sel = np.flatnonzero(changed[self.own] | changed[self.intr])
+            self.nevaluated = len(sel)
+            if len(sel):
+                for cache, value in zip(self.values, pairstate(
+                        ownship, intruder, rpz, hpz, dtlookahead, self.own[sel], self.intr[sel])):
+                    cache[sel] = value
+            self.age += 1
+        self.state = state
+
+        return select_pairs(ownship.ntraf, self.own, self.intr, *self.values)
+
+    def margin_ok(self, state, reach, vreach):
+        ''' True when no pair outside the candidate set can be in conflict. '''
+        # Largest displacement of any aircraft since the last rebuild
+        _, dist = geo.kwikqdrdist(self.ref[0], self.ref[1], state[0], state[1])
+        _, idist = geo.kwikqdrdist(self.ref[6], self.ref[7], state[6], state[7])
+        dmax = max(np.max(dist, initial=0.0), np.max(idist, initial=0.0)) * nm
+        dalt = max(np.max(np.abs(state[2] - self.ref[2]), initial=0.0),
+                   np.max(np.abs(state[8] - self.ref[8]), initial=0.0))
+        return reach + 2.0 * dmax <= self.reach + bs.settings.asas_cdmargin * nm and \
+            vreach + 2.0 * dalt <= self.vreach + bs.settings.asas_cdvmargin * ft
+
+    def rebuild(self, ownship, intruder, rpz, hpz, dtlookahead, state, reach, vreach):
+        ''' Rebuild the candidate set, and evaluate all candidate pairs. '''
+        margin = bs.settings.asas_cdmargin * nm
+        vmargin = bs.settings.asas_cdvmargin * ft
+        own, intr = gridpairs(ownship, intruder, rpz + margin, hpz + vmargin, dtlookahead)
+        values = pairstate(ownship, intruder, rpz, hpz, dtlookahead, own, intr)
+
+        # Keep the pairs that are within reach, including the safety margin
+        dist = values[3]
+        dalt = np.abs(intruder.alt[intr] - ownship.alt[own])
+        keep = (dist < reach + margin) & (dalt < vreach + vmargin)
+        self.own, self.intr = own[keep], intr[keep]
+        self.values = [v[keep] for v in values]
+
+        self.ref = state
+        self.reach, self.vreach = reach, vreach
+        self.ntraf = ownship.ntraf
+        self.age = 0
+        self.valid = True
+        self.nrebuild += 1
+        self.nevaluated = len(own)
+
+
+def maxreach(ownship, intruder, rpz, hpz, dtlookahead):
+    ''' Largest horizontal and vertical distance over which any pair can get
+        in conflict within the lookahead time. '''
+    if ownship.ntraf == 0:
+        return 0.0, 0.0
+    dtlook = np.max(dtlookahead)
+    gsmax = max(np.max(ownship.gs), np.max(intruder.gs))
+    vsmax = max(np.max(np.abs(ownship.vs)), np.max(np.abs(intruder.vs)))
+    return np.max(rpz) + 2.0 * gsmax * dtlook, np.max(hpz) + 2.0 * vsmax * dtlook
+
+
+def same_detection(result, reference):
+    ''' Check whether two conflict detection outputs are the same. '''
+    return all(np.array_equal(res, ref) for res, ref in
+               zip(result[0] + result[1], reference[0] + reference[1])) and \
+        all(np.allclose(res, ref) for res, ref in zip(result[2:], reference[2:]))
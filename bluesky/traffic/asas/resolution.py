@@ -12,12 +12,16 @@ bs.settings.set_variable_defaults(asas_marh=1.01, asas_marv=1.01)
 
 class ConflictResolution(Entity, replaceable=True):
     ''' Base class for Conflict Resolution implementations. '''
+    checkpointvars = ('resokeys',)
+
     def __init__(self):
         super().__init__()
         # [-] switch to activate priority rules for conflict resolution
         self.swprio = False  # switch priority on/off
         self.priocode = ''  # select priority mode
-        self.resopairs = set()  # Resolved conflicts that are still before CPA
+        # Resolved conflicts that are still before CPA, as ordered pair keys
+        # of ConflictDetection (based on the unique id's of both aircraft)
+        self.resokeys = np.array([], dtype=np.int64)
 
         # Resolution factors:
         # set < 1 to maneuver only a fraction of the resolution
@@ -91,90 +95,91 @@ class ConflictResolution(Entity, replaceable=True):
         ''' Perform an update step of the Conflict Resolution implementation. '''
         if ConflictResolution.selected() is not ConflictResolution:
             # Only perform CR when an actual method is selected
-            if conf.confpairs:
+            if len(conf.confown):
                 self.trk, self.tas, self.vs, self.alt = self.resolve(conf, ownship, intruder)
             self.resumenav(conf, ownship, intruder)
 
+    @property
+    def resopairs(self):
+        ''' Resolved conflicts that are still before CPA as (acid, acid) tuples. '''
+        conf = bs.traf.cd
+        idx1 = conf.uid2idx(self.resokeys >> 32)
+        idx2 = conf.uid2idx(self.resokeys & 0xffffffff)
+        return {(bs.traf.id[i], bs.traf.id[j]) for i, j in zip(idx1, idx2) if i >= 0 and j >= 0}
+
+    def reset(self):
+        super().reset()
+        self.resokeys = np.array([], dtype=np.int64)
+
     def resumenav(self, conf, ownship, intruder):
         '''
             Decide for each aircraft in the conflict list whether the ASAS
             should be followed or not, based on if the aircraft pairs passed
             their CPA.
         '''
-        # Add new conflicts to resopairs and confpairs_all and new losses to lospairs_all
-        self.resopairs.update(conf.confpairs)
-
-        # Conflict pairs to be deleted
-        delpairs = set()
-        changeactive = dict()
+        # Add new conflicts to resopairs
+        resokeys = np.union1d(self.resokeys, conf.confkey)
 
         # Look at all conflicts, also the ones that are solved but CPA is yet to come
-        for conflict in self.resopairs:
-            idx1, idx2 = bs.traf.id2idx(conflict)
-            # If the ownship aircraft is deleted remove its conflict from the list
-            if idx1 < 0:
-                delpairs.add(conflict)
-                continue
-
-            if idx2 >= 0:
-                # Distance vector using flat earth approximation
-                re = 6371000.
-                dist = re * np.array([np.radians(intruder.lon[idx2] - ownship.lon[idx1]) *
-                                      np.cos(0.5 * np.radians(intruder.lat[idx2] +
-                                                              ownship.lat[idx1])),
-                                      np.radians(intruder.lat[idx2] - ownship.lat[idx1])])
-
-                # Relative velocity vector
-                vrel = np.array([intruder.gseast[idx2] - ownship.gseast[idx1],
-                                 intruder.gsnorth[idx2] - ownship.gsnorth[idx1]])
-
-                # Check if conflict is past CPA
-                past_cpa = np.dot(dist, vrel) > 0.0
-
-                rpz = np.max(conf.rpz[[idx1, idx2]])
-                # hor_los:
-                # Aircraft should continue to resolve until there is no horizontal
-                # LOS. This is particularly relevant when vertical resolutions
-                # are used.
-                hdist = np.linalg.norm(dist)
-                hor_los = hdist < rpz
-
-                # Bouncing conflicts:
-                # If two aircraft are getting in and out of conflict continously,
-                # then they it is a bouncing conflict. ASAS should stay active until
-                # the bouncing stops.
-                is_bouncing = \
-                    abs(ownship.trk[idx1] - intruder.trk[idx2]) < 30.0 and \
-                    hdist < rpz * self.resofach
-
-            # Start recovery for ownship if intruder is deleted, or if past CPA
-            # and not in horizontal LOS or a bouncing conflict
-            if idx2 >= 0 and (not past_cpa or hor_los or is_bouncing):
-                # Enable ASAS for this aircraft
-                changeactive[idx1] = True
-            else:
-                # Switch ASAS off for ownship if there are no other conflicts
-                # that this aircraft is involved in.
-                changeactive[idx1] = changeactive.get(idx1, False)
-                # If conflict is solved, remove it from the resopairs list
-                delpairs.add(conflict)
-
-        for idx, active in changeactive.items():
-            # Loop a second time: this is to avoid that ASAS resolution is
-            # turned off for an aircraft that is involved simultaneously in
-            # multiple conflicts, where the first, but not all conflicts are
-            # resolved.
-            self.active[idx] = active
-            if not active:
-                # Waypoint recovery after conflict: Find the next active waypoint
-                # and send the aircraft to that waypoint.
-                iwpid = bs.traf.ap.route[idx].findact(idx)
-                if iwpid != -1:  # To avoid problems if there are no waypoints
-                    bs.traf.ap.route[idx].direct(
-                        idx, bs.traf.ap.route[idx].wpname[iwpid])
+        idx1 = conf.uid2idx(resokeys >> 32)
+        idx2 = conf.uid2idx(resokeys & 0xffffffff)
+
+        # If the ownship aircraft is deleted remove its conflict from the list
+        ownexists = idx1 >= 0
+        resokeys, idx1, idx2 = resokeys[ownexists], idx1[ownexists], idx2[ownexists]
+        intexists = idx2 >= 0
+        idx2 = np.where(intexists, idx2, idx1)
+
+        # Distance vector using flat earth approximation
+        re = 6371000.
+        dx = re * np.radians(intruder.lon[idx2] - ownship.lon[idx1]) * \
+            np.cos(0.5 * np.radians(intruder.lat[idx2] + ownship.lat[idx1]))
+        dy = re * np.radians(intruder.lat[idx2] - ownship.lat[idx1])
+
+        # Relative velocity vector
+        du = intruder.gseast[idx2] - ownship.gseast[idx1]
+        dv = intruder.gsnorth[idx2] - ownship.gsnorth[idx1]
+
+        # Check if conflict is past CPA
+        past_cpa = dx * du + dy * dv > 0.0
+
+        rpz = np.maximum(conf.rpz[idx1], conf.rpz[idx2])
+        # hor_los:
+        # Aircraft should continue to resolve until there is no horizontal
+        # LOS. This is particularly relevant when vertical resolutions
+        # are used.
+        hdist = np.sqrt(dx * dx + dy * dy)
+        hor_los = hdist < rpz
+
+        # Bouncing conflicts:
+        # If two aircraft are getting in and out of conflict continously,
+        # then they it is a bouncing conflict. ASAS should stay active until
+        # the bouncing stops.
+        is_bouncing = (np.abs(ownship.trk[idx1] - intruder.trk[idx2]) < 30.0) & \
+            (hdist < rpz * self.resofach)
+
+        # Start recovery for ownship if intruder is deleted, or if past CPA
+        # and not in horizontal LOS or a bouncing conflict. ASAS stays
+        # enabled for aircraft that have at least one conflict that is not
+        # resolved yet.
+        keep = intexists & (~past_cpa | hor_los | is_bouncing)
+        own = np.unique(idx1)
+        active = np.zeros(ownship.ntraf, dtype=bool)
+        active[idx1[keep]] = True
+
+        # Waypoint recovery after conflict for aircraft of which ASAS is
+        # switched off: Find the next active waypoint and send the aircraft
+        # to that waypoint.
+        turnoff = own[self.active[own] & ~active[own]]
+        self.active[own] = active[own]
+        for idx in turnoff:
+            iwpid = bs.traf.ap.route[idx].findact(idx)
+            if iwpid != -1:  # To avoid problems if there are no waypoints
+                bs.traf.ap.route[idx].direct(
+                    idx, bs.traf.ap.route[idx].wpname[iwpid])
 
         # Remove pairs from the list that are past CPA or have deleted aircraft
-        self.resopairs -= delpairs
+        self.resokeys = resokeys[keep]
 
     @command(name='PRIORULES')
     def setprio(self, flag : bool = None, priocode=''):
@@ -0,0 +1,206 @@
+// Multithreaded state-based conflict detection.
+// Gives the same results as the numpy StateBased implementation. The rows of
+// the ownship x intruder matrix are divided in blocks, which are processed in
+// parallel by a pool of threads without holding the GIL. Python objects are
+// only created after all threads are finished and the GIL is reacquired.
+#include <vector>
+#include <thread>
+#include <atomic>
+#include <algorithm>
+#include <cmath>
+#include "pyhelpers.hpp"
+#define DEG2RAD 0.017453292519943295
+#define RAD2DEG 57.29577951308232
+#define REARTH 6371000.0
+
+// Number of ownship rows processed as one unit of work
+static const npy_intp BLOCKSIZE = 32;
+
+struct cd_input {
+    const double *lat1, *lon1, *trk1, *gs1, *alt1, *vs1,
+                 *lat2, *lon2, *trk2, *gs2, *alt2, *vs2,
+                 *rpz, *hpz, *tlook;
+    npy_intp nown, nint;
+};
+
+// Conflicts and losses of separation found in one block of rows
+struct cd_block {
+    std::vector<npy_int32> confown, confint, losown, losint;
+    std::vector<double> qdr, dist, dcpa, tcpa, tinconf;
+};
+
+static void detect_rows(const cd_input& in, npy_intp i0, npy_intp i1, cd_block& out,
+                        npy_bool* inconf, double* tcpamax)
+{
+    for (npy_intp i = i0; i < i1; ++i) {
+        const double owntrk = in.trk1[i] * DEG2RAD,
+                     ownu   = in.gs1[i] * sin(owntrk),
+                     ownv   = in.gs1[i] * cos(owntrk);
+        npy_bool acinconf = NPY_FALSE;
+        double tcpamax_ac = 0.0;
+
+        for (npy_intp j = 0; j < in.nint; ++j) {
+            if (i == j) continue;
+
+            // Horizontal conflict, relative position with the kwikqdrdist
+            // approximation, longitude difference wrapped to [-180, 180)
+            double dlon = in.lon2[j] - in.lon1[i];
+            if (dlon >= 180.0) dlon -= 360.0;
+            else if (dlon < -180.0) dlon += 360.0;
+            const double cavelat = cos((in.lat1[i] + in.lat2[j]) * 0.5 * DEG2RAD),
+                         dx      = REARTH * dlon * DEG2RAD * cavelat,  // is pos j rel to i
+                         dy      = REARTH * (in.lat2[j] - in.lat1[i]) * DEG2RAD,
+                         dist    = sqrt(dx * dx + dy * dy);
+
+            const double inttrk = in.trk2[j] * DEG2RAD,
+                         du     = in.gs2[j] * sin(inttrk) - ownu,
+                         dv     = in.gs2[j] * cos(inttrk) - ownv;
+            double dv2 = du * du + dv * dv;
+            if (fabs(dv2) < 1e-6) dv2 = 1e-6;
+            const double tcpa  = -(du * dx + dv * dy) / dv2,
+                         dcpa2 = fabs(dist * dist - tcpa * tcpa * dv2),
+                         rpz   = std::max(in.rpz[i], in.rpz[j]),
+                         R2    = rpz * rpz;
+            const double dalt = in.alt2[j] - in.alt1[i],
+                         hpz  = std::max(in.hpz[i], in.hpz[j]);
+
+            if (dist < rpz && fabs(dalt) < hpz) {
+                out.losown.push_back(npy_int32(i));
+                out.losint.push_back(npy_int32(j));
+            }
+            if (dcpa2 >= R2) continue;
+
+            const double dtinhor = sqrt(std::max(0.0, R2 - dcpa2)) / sqrt(dv2),
+                         tinhor  = tcpa - dtinhor,
+                         touthor = tcpa + dtinhor;
+
+            // Vertical conflict
+            double dvs = in.vs2[j] - in.vs1[i];
+            if (fabs(dvs) < 1e-6) dvs = 1e-6;
+            const double tcrosshi = (dalt + hpz) / -dvs,
+                         tcrosslo = (dalt - hpz) / -dvs,
+                         tinconf  = std::max(std::min(tcrosshi, tcrosslo), tinhor),
+                         toutconf = std::min(std::max(tcrosshi, tcrosslo), touthor);
+
+            // Combined conflict
+            if (tinconf <= toutconf && toutconf > 0.0 && tinconf < in.tlook[i]) {
+                acinconf = NPY_TRUE;
+                tcpamax_ac = std::max(tcpamax_ac, tcpa);
+                out.confown.push_back(npy_int32(i));
+                out.confint.push_back(npy_int32(j));
+                double qdr = atan2(dx, dy) * RAD2DEG;
+                out.qdr.push_back(qdr < 0.0 ? qdr + 360.0 : qdr);
+                out.dist.push_back(dist);
+                out.dcpa.push_back(sqrt(dcpa2));
+                out.tcpa.push_back(tcpa);
+                out.tinconf.push_back(tinconf);
+            }
+        }
+        inconf[i] = acinconf;
+        tcpamax[i] = tcpamax_ac;
+    }
+}
+
+template<typename T>
+static PyObject* concat(const std::vector<cd_block>& blocks, std::vector<T> cd_block::*member, int typenum)
+{
+    npy_intp size = 0;
+    for (const cd_block& b : blocks) size += (b.*member).size();
+    PyArrayObject* arr = (PyArrayObject*)PyArray_SimpleNew(1, &size, typenum);
+    if (arr == NULL) return NULL;
+    T* ptr = (T*)PyArray_DATA(arr);
+    for (const cd_block& b : blocks) ptr = std::copy((b.*member).begin(), (b.*member).end(), ptr);
+    return (PyObject*)arr;
+}
+
+static PyObject* casas_mt_detect(PyObject* self, PyObject* args)
+{
+    PyObject *ownship = NULL,
+             *intruder = NULL,
+             *pRPZ = NULL,
+             *pHPZ = NULL,
+             *ptlookahead = NULL;
+    int nthreads = 0;
+
+    if (!PyArg_ParseTuple(args, "OOOOO|i", &ownship, &intruder, &pRPZ, &pHPZ, &ptlookahead, &nthreads))
+        return NULL;
+
+    PyDoubleArrayAttr lat1(ownship, "lat"),  lon1(ownship, "lon"),  trk1(ownship, "trk"),
+                      gs1 (ownship, "gs"),   alt1(ownship, "alt"),  vs1 (ownship, "vs"),
+                      lat2(intruder, "lat"), lon2(intruder, "lon"), trk2(intruder, "trk"),
+                      gs2 (intruder, "gs"),  alt2(intruder, "alt"), vs2 (intruder, "vs");
+    PyDoubleArrayAttr rpz(pRPZ), hpz(pHPZ), tlook(ptlookahead);
+
+    // Only continue if all arrays exist
+    if (!(lat1 && lon1 && trk1 && gs1  && alt1 && vs1  && lat2 && lon2 && trk2 && gs2  && alt2 && vs2 && rpz && hpz && tlook))
+        Py_RETURN_NONE;
+
+    cd_input in = {lat1.ptr_start, lon1.ptr_start, trk1.ptr_start, gs1.ptr_start, alt1.ptr_start, vs1.ptr_start,
+                   lat2.ptr_start, lon2.ptr_start, trk2.ptr_start, gs2.ptr_start, alt2.ptr_start, vs2.ptr_start,
+                   rpz.ptr_start, hpz.ptr_start, tlook.ptr_start, lat1.size(), lat2.size()};
+
+    // Preallocated per-aircraft outputs, written directly by the threads
+    PyBoolArrayAttr inconf(in.nown);
+    PyDoubleArrayAttr tcpamax(in.nown);
+    if (!inconf || !tcpamax) return NULL;
+
+    const npy_intp nblocks = (in.nown + BLOCKSIZE - 1) / BLOCKSIZE;
+    std::vector<cd_block> blocks(nblocks);
+    if (nthreads <= 0) nthreads = std::max(1u, std::thread::hardware_concurrency());
+    nthreads = int(std::min(npy_intp(nthreads), std::max(npy_intp(1), nblocks)));
+
+    Py_BEGIN_ALLOW_THREADS
+    // Each worker takes the next unprocessed block of rows until all are done
+    std::atomic<npy_intp> next(0);
+    auto worker = [&]() {
+        for (npy_intp b = next++; b < nblocks; b = next++) {
+            detect_rows(in, b * BLOCKSIZE, std::min(in.nown, (b + 1) * BLOCKSIZE),
+                        blocks[b], inconf.ptr_start, tcpamax.ptr_start);
+        }
+    };
+    std::vector<std::thread> pool;
+    for (int t = 1; t < nthreads; ++t) pool.emplace_back(worker);
+    worker();
+    for (std::thread& t : pool) t.join();
+    Py_END_ALLOW_THREADS
+
+    // Concatenate the blocks in order, which gives the pairs in row-major order
+    PyObject *confown = concat(blocks, &cd_block::confown, NPY_INT32),
+             *confint = concat(blocks, &cd_block::confint, NPY_INT32),
+             *losown  = concat(blocks, &cd_block::losown, NPY_INT32),
+             *losint  = concat(blocks, &cd_block::losint, NPY_INT32),
+             *qdr     = concat(blocks, &cd_block::qdr, NPY_DOUBLE),
+             *dist    = concat(blocks, &cd_block::dist, NPY_DOUBLE),
+             *dcpa    = concat(blocks, &cd_block::dcpa, NPY_DOUBLE),
+             *tcpa    = concat(blocks, &cd_block::tcpa, NPY_DOUBLE),
+             *tinconf = concat(blocks, &cd_block::tinconf, NPY_DOUBLE);
+
+    PyObject* result = NULL;
+    if (confown && confint && losown && losint && qdr && dist && dcpa && tcpa && tinconf) {
+        result = Py_BuildValue("(OO)(OO)OOOOOOO", confown, confint, losown, losint,
+                               inconf.arr, tcpamax.arr, qdr, dist, dcpa, tcpa, tinconf);
+    }
+    Py_XDECREF(confown); Py_XDECREF(confint); Py_XDECREF(losown); Py_XDECREF(losint);
+    Py_XDECREF(qdr); Py_XDECREF(dist); Py_XDECREF(dcpa); Py_XDECREF(tcpa); Py_XDECREF(tinconf);
+    return result;
+};
+
+static PyMethodDef methods[] = {
+    {"detect", casas_mt_detect, METH_VARARGS, "Detect conflicts for traffic using multiple threads"},
+    {NULL}  /* Sentinel */
+};
+
+static struct PyModuleDef casas_mtdef =
+{
+    PyModuleDef_HEAD_INIT,
+    "casas_mt",  /* name of module */
+    "",          /* module documentation, may be NULL */
+    -1,          /* size of per-interpreter state of the module, or -1 if the module keeps state in global variables. */
+    methods
+};
+
+PyMODINIT_FUNC PyInit_casas_mt(void)
+{
+    import_array();
+    return PyModule_Create(&casas_mtdef);
+};
@@ -2,9 +2,14 @@
 # -*- coding: UTF-8 -*-
 
 from distutils.core import setup, Extension
+import os
 import numpy as np
 
-ext_modules = [Extension('casas', sources=['casas.cpp'])]
+# std::thread needs pthreads on posix systems
+threadflags = [] if os.name == 'nt' else ['-pthread']
+ext_modules = [Extension('casas', sources=['casas.cpp']),
+               Extension('casas_mt', sources=['casas_mt.cpp'],
+                         extra_compile_args=threadflags, extra_link_args=threadflags)]
 
 setup(name='casas', version='1.0', include_dirs=[np.get_include(), '../../../tools/src_cpp'],
       ext_modules=ext_modules)
@@ -1,118 +1,170 @@
 ''' State-based conflict detection. '''
 import numpy as np
+import bluesky as bs
 from bluesky import stack
 from bluesky.tools import geo
 from bluesky.tools.aero import nm
 from bluesky.traffic.asas import ConflictDetection
 
 
-class StateBased(ConflictDetection):
-    def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
-        ''' Conflict detection between ownship (traf) and intruder (traf/adsb).'''
-        # Identity matrix of order ntraf: avoid ownship-ownship detected conflicts
-        I = np.eye(ownship.ntraf)
-
-        # Horizontal conflict ------------------------------------------------------
-
-        # qdrlst is for [i,j] qdr from i to j, from perception of ADSB and own coordinates
-        qdr, dist = geo.kwikqdrdist_matrix(np.asmatrix(ownship.lat), np.asmatrix(ownship.lon),
-                                    np.asmatrix(intruder.lat), np.asmatrix(intruder.lon))
-
-        # Convert back to array to allow element-wise array multiplications later on
-        # Convert to meters and add large value to own/own pairs
-        qdr = np.asarray(qdr)
-        dist = np.asarray(dist) * nm + 1e9 * I
-
-        # Calculate horizontal closest point of approach (CPA)
-        qdrrad = np.radians(qdr)
-        dx = dist * np.sin(qdrrad)  # is pos j rel to i
-        dy = dist * np.cos(qdrrad)  # is pos j rel to i
-
-        # Ownship track angle and speed
-        owntrkrad = np.radians(ownship.trk)
-        ownu = ownship.gs * np.sin(owntrkrad).reshape((1, ownship.ntraf))  # m/s
-        ownv = ownship.gs * np.cos(owntrkrad).reshape((1, ownship.ntraf))  # m/s
-
-        # Intruder track angle and speed
-        inttrkrad = np.radians(intruder.trk)
-        intu = intruder.gs * np.sin(inttrkrad).reshape((1, ownship.ntraf))  # m/s
-        intv = intruder.gs * np.cos(inttrkrad).reshape((1, ownship.ntraf))  # m/s
-
-        du = ownu - intu.T  # Speed du[i,j] is perceived eastern speed of i to j
-        dv = ownv - intv.T  # Speed dv[i,j] is perceived northern speed of i to j
-
-        dv2 = du * du + dv * dv
-        dv2 = np.where(np.abs(dv2) < 1e-6, 1e-6, dv2)  # limit lower absolute value
-        vrel = np.sqrt(dv2)
-
-        tcpa = -(du * dx + dv * dy) / dv2 + 1e9 * I
-
-        # Calculate distance^2 at CPA (minimum distance^2)
-        dcpa2 = np.abs(dist * dist - tcpa * tcpa * dv2)
-
-        # Check for horizontal conflict
-        # RPZ can differ per aircraft, get the largest value per aircraft pair
-        rpz = np.asarray(np.maximum(np.asmatrix(rpz), np.asmatrix(rpz).transpose()))
-        R2 = rpz * rpz
-        swhorconf = dcpa2 < R2  # conflict or not
+# Maximum number of ownship rows evaluated at once. Limits the size of the
+# ownship x intruder matrices to asas_cdtile x ntraf. 0 means no tiling.
+bs.settings.set_variable_defaults(asas_cdtile=1024)
+# Number of threads used by the multithreaded native conflict detection.
+# 0 means one thread per available processor core.
+bs.settings.set_variable_defaults(asas_cdthreads=0)
 
-        # Calculate times of entering and leaving horizontal conflict
-        dxinhor = np.sqrt(np.maximum(0., R2 - dcpa2))  # half the distance travelled inzide zone
-        dtinhor = dxinhor / vrel
 
-        tinhor = np.where(swhorconf, tcpa - dtinhor, 1e8)  # Set very large if no conf
-        touthor = np.where(swhorconf, tcpa + dtinhor, -1e8)  # set very large if no conf
-
-        # Vertical conflict --------------------------------------------------------
-
-        # Vertical crossing of disk (-dh,+dh)
-        dalt = ownship.alt.reshape((1, ownship.ntraf)) - \
-            intruder.alt.reshape((1, ownship.ntraf)).T  + 1e9 * I
-
-        dvs = ownship.vs.reshape(1, ownship.ntraf) - \
-            intruder.vs.reshape(1, ownship.ntraf).T
-        dvs = np.where(np.abs(dvs) < 1e-6, 1e-6, dvs)  # prevent division by zero
+class StateBased(ConflictDetection):
+    def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
+        ''' Conflict detection between ownship (traf) and intruder (traf/adsb).
+
+            The ownship x intruder matrices are evaluated in tiles of at most
+            settings.asas_cdtile ownship rows, so that peak memory use is
+            O(tile * ntraf) instead of O(ntraf^2). '''
+        ntraf = ownship.ntraf
+        tile = bs.settings.asas_cdtile if bs.settings.asas_cdtile > 0 else ntraf
+        tiles = [detect_tile(ownship, intruder, rpz, hpz, dtlookahead, i0, min(ntraf, i0 + tile))
+                 for i0 in range(0, ntraf, max(1, tile))]
+        if not tiles:
+            return ConflictDetection.detect(self, ownship, intruder, rpz, hpz, dtlookahead)
+        if len(tiles) == 1:
+            return tiles[0]
+
+        # Accumulate the results of all tiles
+        confpairs, lospairs, inconf, tcpamax, qdr, dist, dcpa, tcpa, tLOS = zip(*tiles)
+        return (tuple(np.concatenate(idx) for idx in zip(*confpairs)),
+                tuple(np.concatenate(idx) for idx in zip(*lospairs)),
+                *(np.concatenate(v) for v in (inconf, tcpamax, qdr, dist, dcpa, tcpa, tLOS)))
+
+
+def detect_tile(ownship, intruder, rpz, hpz, dtlookahead, i0, i1):
+    ''' State-based conflict detection for ownship rows i0 <= i < i1
+        against all intruders. '''
+    own = slice(i0, i1)
+    nown = i1 - i0
+    # Matrix of order nown x ntraf which is one for the ownship-ownship pairs
+    I = np.eye(nown, intruder.ntraf, k=i0)
+
+    # Horizontal conflict ------------------------------------------------------
+
+    # qdrlst is for [i,j] qdr from i to j, from perception of ADSB and own coordinates
+    qdr, dist = geo.kwikqdrdist_matrix(np.asmatrix(ownship.lat[own]), np.asmatrix(ownship.lon[own]),
+                                np.asmatrix(intruder.lat), np.asmatrix(intruder.lon))
+
+    # Convert back to array to allow element-wise array multiplications later on
+    # Convert to meters and add large value to own/own pairs
+    qdr = np.asarray(qdr)
+    dist = np.asarray(dist) * nm + 1e9 * I
+
+    # Calculate horizontal closest point of approach (CPA)
+    qdrrad = np.radians(qdr)
+    dx = dist * np.sin(qdrrad)  # is pos j rel to i
+    dy = dist * np.cos(qdrrad)  # is pos j rel to i
+
+    # Ownship track angle and speed
+    owntrkrad = np.radians(ownship.trk[own])
+    ownu = (ownship.gs[own] * np.sin(owntrkrad)).reshape((nown, 1))  # m/s
+    ownv = (ownship.gs[own] * np.cos(owntrkrad)).reshape((nown, 1))  # m/s
+
+    # Intruder track angle and speed
+    inttrkrad = np.radians(intruder.trk)
+    intu = (intruder.gs * np.sin(inttrkrad)).reshape((1, intruder.ntraf))  # m/s
+    intv = (intruder.gs * np.cos(inttrkrad)).reshape((1, intruder.ntraf))  # m/s
+
+    du = intu - ownu  # Speed du[i,j] is perceived eastern speed of j relative to i
+    dv = intv - ownv  # Speed dv[i,j] is perceived northern speed of j relative to i
+
+    dv2 = du * du + dv * dv
+    dv2 = np.where(np.abs(dv2) < 1e-6, 1e-6, dv2)  # limit lower absolute value
+    vrel = np.sqrt(dv2)
+
+    tcpa = -(du * dx + dv * dy) / dv2 + 1e9 * I
+
+    # Calculate distance^2 at CPA (minimum distance^2)
+    dcpa2 = np.abs(dist * dist - tcpa * tcpa * dv2)
+
+    # Check for horizontal conflict
+    # RPZ can differ per aircraft, get the largest value per aircraft pair
+    rpz = np.maximum(rpz[own].reshape((nown, 1)), rpz.reshape((1, intruder.ntraf)))
+    R2 = rpz * rpz
+    swhorconf = dcpa2 < R2  # conflict or not
+
+    # Calculate times of entering and leaving horizontal conflict
+    dxinhor = np.sqrt(np.maximum(0., R2 - dcpa2))  # half the distance travelled inzide zone
+    dtinhor = dxinhor / vrel
+
+    tinhor = np.where(swhorconf, tcpa - dtinhor, 1e8)  # Set very large if no conf
+    touthor = np.where(swhorconf, tcpa + dtinhor, -1e8)  # set very large if no conf
+
+    # Vertical conflict --------------------------------------------------------
+
+    # Vertical crossing of disk (-dh,+dh)
+    dalt = intruder.alt.reshape((1, intruder.ntraf)) - \
+        ownship.alt[own].reshape((nown, 1)) + 1e9 * I
+
+    dvs = intruder.vs.reshape((1, intruder.ntraf)) - \
+        ownship.vs[own].reshape((nown, 1))
+    dvs = np.where(np.abs(dvs) < 1e-6, 1e-6, dvs)  # prevent division by zero
+
+    # Check for passing through each others zone
+    # hPZ can differ per aircraft, get the largest value per aircraft pair
+    hpz = np.maximum(hpz[own].reshape((nown, 1)), hpz.reshape((1, intruder.ntraf)))
+    tcrosshi = (dalt + hpz) / -dvs
+    tcrosslo = (dalt - hpz) / -dvs
+    tinver = np.minimum(tcrosshi, tcrosslo)
+    toutver = np.maximum(tcrosshi, tcrosslo)
+
+    # Combine vertical and horizontal conflict----------------------------------
+    tinconf = np.maximum(tinver, tinhor)
+    toutconf = np.minimum(toutver, touthor)
+
+    swconfl = swhorconf * (tinconf <= toutconf) * (toutconf > 0.0) * \
+        (tinconf < dtlookahead[own].reshape((nown, 1))) * (I == 0)
+
+    # --------------------------------------------------------------------------
+    # Update conflict lists
+    # --------------------------------------------------------------------------
+    # Ownship conflict flag and max tCPA
+    inconf = np.any(swconfl, 1)
+    tcpamax = np.max(tcpa * swconfl, 1)
+
+    # Select conflicting pairs: each a/c gets their own record
+    iown, iint = np.where(swconfl)
+    confpairs = ((iown + i0).astype(np.int32), iint.astype(np.int32))
+    swlos = (dist < rpz) * (np.abs(dalt) < hpz)
+    iown, iint = np.where(swlos)
+    lospairs = ((iown + i0).astype(np.int32), iint.astype(np.int32))
 
-        # Check for passing through each others zone
-        # hPZ can differ per aircraft, get the largest value per aircraft pair
-        hpz = np.asarray(np.maximum(np.asmatrix(hpz), np.asmatrix(hpz).transpose()))
-        tcrosshi = (dalt + hpz) / -dvs
-        tcrosslo = (dalt - hpz) / -dvs
-        tinver = np.minimum(tcrosshi, tcrosslo)
-        toutver = np.maximum(tcrosshi, tcrosslo)
+    return confpairs, lospairs, inconf, tcpamax, \
+        qdr[swconfl], dist[swconfl], np.sqrt(dcpa2[swconfl]), \
+            tcpa[swconfl], tinconf[swconfl]
 
-        # Combine vertical and horizontal conflict----------------------------------
-        tinconf = np.maximum(tinver, tinhor)
-        toutconf = np.minimum(toutver, touthor)
 
-        swconfl = np.array(swhorconf * (tinconf <= toutconf) * (toutconf > 0.0) *
-                           np.asarray(tinconf < np.asmatrix(dtlookahead).T) * (1.0 - I), dtype=np.bool)
+try:
+    from bluesky.traffic.asas import casas
 
-        # --------------------------------------------------------------------------
-        # Update conflict lists
-        # --------------------------------------------------------------------------
-        # Ownship conflict flag and max tCPA
-        inconf = np.any(swconfl, 1)
-        tcpamax = np.max(tcpa * swconfl, 1)
 
-        # Select conflicting pairs: each a/c gets their own record
-        confpairs = [(ownship.id[i], ownship.id[j]) for i, j in zip(*np.where(swconfl))]
-        swlos = (dist < rpz) * (np.abs(dalt) < hpz)
-        lospairs = [(ownship.id[i], ownship.id[j]) for i, j in zip(*np.where(swlos))]
+    class CStateBased(StateBased):
+        def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
+            confpairs, lospairs, *cdvalues = casas.detect(ownship, intruder, rpz, hpz, dtlookahead)
+            return (self.pairindices(ownship, confpairs),
+                    self.pairindices(ownship, lospairs), *cdvalues)
 
-        return confpairs, lospairs, inconf, tcpamax, \
-            qdr[swconfl], dist[swconfl], np.sqrt(dcpa2[swconfl]), \
-                tcpa[swconfl], tinconf[swconfl]
+except ImportError:
+    pass
 
 
 try:
-    from bluesky.traffic.asas import casas
+    from bluesky.traffic.asas import casas_mt
 
 
-    class CStateBased(StateBased):
-        def __init__(self):
-            super().__init__()
-            self.detect = casas.detect
+    class CStateBasedMT(StateBased):
+        ''' Multithreaded native implementation of StateBased, using
+            settings.asas_cdthreads threads. '''
+        def detect(self, ownship, intruder, rpz, hpz, dtlookahead):
+            return casas_mt.detect(ownship, intruder, rpz, hpz, dtlookahead,
+                                   bs.settings.asas_cdthreads)
 
 except ImportError:
     pass
@@ -1,5 +1,5 @@
 """ Autopilot Implementation."""
-from math import sin, cos, radians, sqrt, atan
+from math import sin, cos, radians, sqrt
 import numpy as np
 try:
     from collections.abc import Collection
@@ -11,7 +11,7 @@ from bluesky import stack
 from bluesky.tools import geo
 from bluesky.tools.misc import degto180, angleFromCoordinate
 from bluesky.tools.position import txt2pos
-from bluesky.tools.aero import ft, nm, fpm, vcasormach2tas, vcas2tas, tas2cas, cas2tas, g0
+from bluesky.tools.aero import ft, nm, fpm, vcasormach2tas, vcas2tas, vtas2cas, g0
 from bluesky.core import Entity, timed_function
 from .route import Route
 
@@ -60,8 +60,9 @@ class Autopilot(Entity, replaceable=True):
             # Currently used roll/bank angle [rad]
             self.turnphi = np.array([])  # [rad] bank angle setting of autopilot
 
-            # Route objects
+            # Route objects, and their slots in the route store
             self.route = []
+            self.rteslot = np.array([], dtype=int)
 
     def create(self, n=1):
         super().create(n)
@@ -89,157 +90,158 @@ class Autopilot(Entity, replaceable=True):
         # Route objects
         for ridx, acid in enumerate(bs.traf.id[-n:]):
             self.route[ridx - n] = Route(acid)
+        self.rteslot[-n:] = [route.slot for route in self.route[-n:]]
+
+    def setcheckpoint(self, state, n):
+        super().setcheckpoint(state, n)
+        # Restored routes get a new slot in the route store
+        self.rteslot[:] = [route.slot for route in self.route]
 
     #no longer timed @timed_function(name='fms', dt=bs.settings.fms_dt, manual=True)
     def update_fms(self, qdr, dist):
-        # Check which aircraft i have reached their active waypoint
-        # Shift waypoints for aircraft i where necessary
-        # Reached function return list of indices where reached logic is True
-        for i in bs.traf.actwp.Reached(qdr, dist, bs.traf.actwp.flyby,
-                                       bs.traf.actwp.flyturn,bs.traf.actwp.turnrad,bs.traf.actwp.swlastwp):
+        # Check which aircraft have reached their active waypoint
+        # Shift waypoints for these aircraft where necessary
+        # Reached function return array of indices where reached logic is True
+        actwp = bs.traf.actwp
+        iac = actwp.Reached(qdr, dist, actwp.flyby, actwp.flyturn, actwp.turnrad, actwp.swlastwp)
 
+        if len(iac) > 0:
             # Save current wp speed for use on next leg when we pass this waypoint
             # VNAV speeds are always FROM-speeds, so we accelerate/decellerate at the waypoint
             # where this speed is specified, so we need to save it for use now
             # before getting the new data for the next waypoint
 
             # Get speed for next leg from the waypoint we pass now
-            bs.traf.actwp.spd[i]    = bs.traf.actwp.nextspd[i]
-            bs.traf.actwp.spdcon[i] = bs.traf.actwp.nextspd[i]
-
-            # Execute stack commands for the still active waypoint, which we pass
-            self.route[i].runactwpstack()
+            actwp.spd[iac]    = actwp.nextspd[iac]
+            actwp.spdcon[iac] = actwp.nextspd[iac]
 
             # If specified, use the given turn radius of passing wp for bank angle
-            if bs.traf.actwp.flyturn[i]:
-                if bs.traf.actwp.turnspd[i]>=0.:
-                    turnspd = bs.traf.actwp.turnspd[i]
-                else:
-                    turnspd = bs.traf.tas[i]
-
-                if bs.traf.actwp.turnrad[i] > 0.:
-                    self.turnphi[i] = atan(turnspd*turnspd/(bs.traf.actwp.turnrad[i]*nm*g0)) # [rad]
-                else:
-                    self.turnphi[i] = 0.0  # [rad] or leave untouched???
-
-            else:
-                self.turnphi[i] = 0.0  #[rad] or leave untouched???
+            self.turnphi[iac] = 0.0  # [rad] or leave untouched???
+            iturn = iac[(actwp.flyturn[iac] != 0.) & (actwp.turnrad[iac] > 0.)]
+            turnspd = np.where(actwp.turnspd[iturn] >= 0., actwp.turnspd[iturn], bs.traf.tas[iturn])
+            self.turnphi[iturn] = np.arctan(turnspd * turnspd / (actwp.turnrad[iturn] * nm * g0)) # [rad]
 
-            # Get next wp, if there still is one
-            if not bs.traf.actwp.swlastwp[i]:
-                lat, lon, alt, bs.traf.actwp.nextspd[i], bs.traf.actwp.xtoalt[i], toalt, \
-                    bs.traf.actwp.xtorta[i], bs.traf.actwp.torta[i], \
-                    lnavon, flyby, flyturn, turnrad, turnspd,\
-                    bs.traf.actwp.next_qdr[i], bs.traf.actwp.swlastwp[i] =      \
-                    self.route[i].getnextwp()  # note: xtoalt,toalt in [m]
+            # Execute stack commands for the still active waypoint, which we pass,
+            # and get next wp, if there still is one
+            swlastwp = actwp.swlastwp[iac].copy()
+            wpdata = self.getnextwps(iac, swlastwp)
 
             # Prevent trying to activate the next waypoint when it was already the last waypoint
-            else:
-                bs.traf.swlnav[i] = False
-                bs.traf.swvnav[i] = False
-                bs.traf.swvnavspd[i] = False
-                continue # Go to next a/c which reached its active waypoint
-
-            # End of route/no more waypoints: switch off LNAV using the lnavon
-            # switch returned by getnextwp
-            if not lnavon and bs.traf.swlnav[i]:
-                bs.traf.swlnav[i] = False
+            ilast = iac[swlastwp]
+            bs.traf.swlnav[ilast] = False
+            bs.traf.swvnav[ilast] = False
+            bs.traf.swvnavspd[ilast] = False
+
+            # Remaining aircraft switch to their next waypoint
+            inext = iac[~swlastwp]
+            if len(inext) > 0:
+                lat, lon, alt, actwp.nextspd[inext], actwp.xtoalt[inext], toalt, \
+                    actwp.xtorta[inext], actwp.torta[inext], \
+                    lnavon, flyby, flyturn, turnrad, turnspd, \
+                    actwp.next_qdr[inext], actwp.swlastwp[inext] = wpdata  # note: xtoalt,toalt in [m]
+
+                # End of route/no more waypoints: switch off LNAV using the lnavon
+                # switch returned by getnextwp
+                ioff = inext[~lnavon & bs.traf.swlnav[inext]]
+                bs.traf.swlnav[ioff] = False
                 # Last wp: copy last wp values for alt and speed in autopilot
-                if bs.traf.swvnavspd[i] and bs.traf.actwp.nextspd[i]>= 0.0:
-                    bs.traf.selspd[i] = bs.traf.actwp.nextspd[i]
-
-            # In case of no LNAV, do not allow VNAV mode on its own
-            bs.traf.swvnav[i] = bs.traf.swvnav[i] and bs.traf.swlnav[i]
-
-            bs.traf.actwp.lat[i] = lat  # [deg]
-            bs.traf.actwp.lon[i] = lon  # [deg]
-            # 1.0 in case of fly by, else fly over
-            bs.traf.actwp.flyby[i] = int(flyby)
-
-            # User has entered an altitude for this waypoint
-            if alt >= -0.01:
-                bs.traf.actwp.nextaltco[i] = alt  # [m]
-
-            #if not bs.traf.swlnav[i]:
-            #    bs.traf.actwp.spd[i] = -997.
-
-            # VNAV spd mode: use speed of this waypoint as commanded speed
-            # while passing waypoint and save next speed for passing next wp
-            # Speed is now from speed! Next speed is ready in wpdata
-            if bs.traf.swvnavspd[i] and bs.traf.actwp.spd[i]>= 0.0:
-                    bs.traf.selspd[i] = bs.traf.actwp.spd[i]
-
-            # Update qdr and turndist for this new waypoint for ComputeVNAV
-            qdr[i], distnmi = geo.qdrdist(bs.traf.lat[i], bs.traf.lon[i],
-                                        bs.traf.actwp.lat[i], bs.traf.actwp.lon[i])
-
-            dist[i] = distnmi*nm
-            self.dist2wp[i] = distnmi
-
-            bs.traf.actwp.curlegdir[i] = qdr[i]
-            bs.traf.actwp.curleglen[i] = distnmi
-
-            # Update turndist so ComputeVNAV works, is there a next leg direction or not?
-            if bs.traf.actwp.next_qdr[i] < -900.:
-                local_next_qdr = qdr[i]
-            else:
-                local_next_qdr = bs.traf.actwp.next_qdr[i]
-
-            # Get flyturn switches and data
-            bs.traf.actwp.flyturn[i]     = flyturn
-            bs.traf.actwp.turnrad[i]     = turnrad
-
-            # Pass on whether currently flyturn mode:
-            # at beginning of leg,c copy tonextwp to lastwp
-            # set next turn False
-            bs.traf.actwp.turnfromlastwp[i] = bs.traf.actwp.turntonextwp[i]
-            bs.traf.actwp.turntonextwp[i]   = False
-
-            # Keep both turning speeds: turn to leg and turn from leg
-            bs.traf.actwp.oldturnspd[i]  = bs.traf.actwp.turnspd[i] # old turnspd, turning by this waypoint
-            if bs.traf.actwp.flyturn[i]:
-                bs.traf.actwp.turnspd[i] = turnspd                  # new turnspd, turning by next waypoint
-            else:
-                bs.traf.actwp.turnspd[i] = -990.
-
-            # Calculate turn dist (and radius which we do not use) now for scalar variable [i]
-            bs.traf.actwp.turndist[i], dummy = \
-                bs.traf.actwp.calcturn(bs.traf.tas[i], self.bankdef[i],
-                                        qdr[i], local_next_qdr,turnrad)  # update turn distance for VNAV
-
-            # Reduce turn dist for reduced turnspd
-            if bs.traf.actwp.flyturn[i] and bs.traf.actwp.turnrad[i]<0.0 and bs.traf.actwp.turnspd[i]>=0.:
-                turntas = cas2tas(bs.traf.actwp.turnspd[i], bs.traf.alt[i])
-                bs.traf.actwp.turndist[i] = bs.traf.actwp.turndist[i]*turntas*turntas/(bs.traf.tas[i]*bs.traf.tas[i])
-
-            # VNAV = FMS ALT/SPD mode incl. RTA
-            self.ComputeVNAV(i, toalt, bs.traf.actwp.xtoalt[i], bs.traf.actwp.torta[i],
-                             bs.traf.actwp.xtorta[i])
-
-        
-
-        # End of per waypoint i switching loop
+                ioff = ioff[bs.traf.swvnavspd[ioff] & (actwp.nextspd[ioff] >= 0.0)]
+                bs.traf.selspd[ioff] = actwp.nextspd[ioff]
+
+                # In case of no LNAV, do not allow VNAV mode on its own
+                bs.traf.swvnav[inext] = bs.traf.swvnav[inext] & bs.traf.swlnav[inext]
+
+                actwp.lat[inext] = lat  # [deg]
+                actwp.lon[inext] = lon  # [deg]
+                # 1.0 in case of fly by, else fly over
+                actwp.flyby[inext] = flyby
+
+                # User has entered an altitude for this waypoint
+                altco = alt >= -0.01
+                actwp.nextaltco[inext[altco]] = alt[altco]  # [m]
+
+                # VNAV spd mode: use speed of this waypoint as commanded speed
+                # while passing waypoint and save next speed for passing next wp
+                # Speed is now from speed! Next speed is ready in wpdata
+                ispd = inext[bs.traf.swvnavspd[inext] & (actwp.spd[inext] >= 0.0)]
+                bs.traf.selspd[ispd] = actwp.spd[ispd]
+
+                # Update qdr and turndist for this new waypoint for ComputeVNAV
+                qdr[inext], distnmi = geo.qdrdist(bs.traf.lat[inext], bs.traf.lon[inext],
+                                                  actwp.lat[inext], actwp.lon[inext])
+
+                dist[inext] = distnmi*nm
+                self.dist2wp[inext] = distnmi
+
+                actwp.curlegdir[inext] = qdr[inext]
+                actwp.curleglen[inext] = distnmi
+
+                # Update turndist so ComputeVNAV works, is there a next leg direction or not?
+                local_next_qdr = np.where(actwp.next_qdr[inext] < -900., qdr[inext], actwp.next_qdr[inext])
+
+                # Get flyturn switches and data
+                actwp.flyturn[inext] = flyturn
+                actwp.turnrad[inext] = turnrad
+
+                # Pass on whether currently flyturn mode:
+                # at beginning of leg,c copy tonextwp to lastwp
+                # set next turn False
+                actwp.turnfromlastwp[inext] = actwp.turntonextwp[inext]
+                actwp.turntonextwp[inext]   = False
+
+                # Keep both turning speeds: turn to leg and turn from leg
+                actwp.oldturnspd[inext] = actwp.turnspd[inext]  # old turnspd, turning by this waypoint
+                actwp.turnspd[inext]    = np.where(flyturn, turnspd, -990.)  # new turnspd, turning by next waypoint
+
+                # Calculate turn dist (and radius which we do not use) for the switched aircraft
+                actwp.turndist[inext], _ = \
+                    actwp.calcturn(bs.traf.tas[inext], self.bankdef[inext],
+                                   qdr[inext], local_next_qdr, turnrad)  # update turn distance for VNAV
+
+                # Reduce turn dist for reduced turnspd
+                iturn = inext[(actwp.flyturn[inext] != 0.) & (actwp.turnrad[inext] < 0.0) &
+                              (actwp.turnspd[inext] >= 0.)]
+                turntas = vcas2tas(actwp.turnspd[iturn], bs.traf.alt[iturn])
+                actwp.turndist[iturn] *= turntas*turntas/(bs.traf.tas[iturn]*bs.traf.tas[iturn])
+
+                # VNAV = FMS ALT/SPD mode incl. RTA
+                self.ComputeVNAV(inext, toalt, actwp.xtoalt[inext], actwp.torta[inext],
+                                 actwp.xtorta[inext])
+
+        # End of waypoint switching
         # Update qdr2wp with up-to-date qdr, now that we have checked passing wp
         self.qdr2wp = qdr%360.
 
         # Continuous guidance when speed constraint on active leg is in update-method
 
         # If still an RTA in the route and currently no speed constraint
-        for iac in np.where((bs.traf.actwp.torta > -99.)*(bs.traf.actwp.spdcon<0.0))[0]:
-            iwp = bs.traf.ap.route[iac].iactwp
-            if bs.traf.ap.route[iac].wprta[iwp]>-99.:
-
-                 # For all a/c flying to an RTA waypoint, recalculate speed more often
-                dist2go4rta = geo.kwikdist(bs.traf.lat[iac],bs.traf.lon[iac], \
-                                           bs.traf.actwp.lat[iac],bs.traf.actwp.lon[iac])*nm \
-                               + bs.traf.ap.route[iac].wpxtorta[iwp] # last term zero for active wp rta
-
-                # Set bs.traf.actwp.spd to rta speed, if necessary
-                self.setspeedforRTA(iac,bs.traf.actwp.torta[iac],dist2go4rta)
-
-                # If VNAV speed is on (by default coupled to VNAV), use it for speed guidance
-                if bs.traf.swvnavspd[iac] and bs.traf.actwp.spd[iac]>=0.0:
-                     bs.traf.selspd[iac] = bs.traf.actwp.spd[iac]
+        irta = np.flatnonzero((bs.traf.actwp.torta > -99.)*(bs.traf.actwp.spdcon<0.0))
+        wprta, wpxtorta = Route.store.getactwp(self.rteslot[irta], 'rta', 'xtorta')
+        irta, wpxtorta = irta[wprta > -99.], wpxtorta[wprta > -99.]
+
+        # For all a/c flying to an RTA waypoint, recalculate speed more often
+        dist2go4rta = geo.kwikdist(bs.traf.lat[irta], bs.traf.lon[irta],
+                                   bs.traf.actwp.lat[irta], bs.traf.actwp.lon[irta])*nm \
+                      + wpxtorta # last term zero for active wp rta
+
+        # Set bs.traf.actwp.spd to rta speed, if necessary
+        self.setspeedforRTA(irta, bs.traf.actwp.torta[irta], dist2go4rta)
+
+        # If VNAV speed is on (by default coupled to VNAV), use it for speed guidance
+        ispd = irta[bs.traf.swvnavspd[irta] & (bs.traf.actwp.spd[irta] >= 0.0)]
+        bs.traf.selspd[ispd] = bs.traf.actwp.spd[ispd]
+
+    def getnextwps(self, iac, swlastwp):
+        ''' Execute the stack commands of the active waypoints that aircraft
+            iac pass now, and get the data of the next waypoint of the aircraft
+            that were not at their last waypoint, as arrays in the order of
+            Route.getnextwp(). '''
+        for i in iac:
+            self.route[i].runactwpstack()
+        inext = iac[~swlastwp]
+        if len(inext) == 0:
+            return None
+        return Route.getnextwps([self.route[i] for i in inext], self.rteslot[inext])
 
     def update(self):
         # FMS LNAV mode:
@@ -379,12 +381,17 @@ class Autopilot(Entity, replaceable=True):
         self.tas = vcasormach2tas(bs.traf.selspd, bs.traf.alt)
 
     def ComputeVNAV(self, idx, toalt, xtoalt, torta, xtorta):
+        ''' VNAV guidance for aircraft idx (an index or an array of indices),
+            with the next altitude constraint toalt at distance xtoalt from
+            the active waypoint, and the next RTA torta at distance xtorta. '''
+        idx = np.atleast_1d(idx)
+        toalt, xtoalt, torta, xtorta = (np.zeros(len(idx)) + v for v in (toalt, xtoalt, torta, xtorta))
         # debug print ("ComputeVNAV for",bs.traf.id[idx],":",toalt/ft,"ft  ",xtoalt/nm,"nm")
 
-        # Check if there is a target altitude and VNAV is on, else return doing nothing
-        if toalt < 0 or not bs.traf.swvnav[idx]:
-            self.dist2vs[idx] = -999. #dist to next wp will never be less than this, so VNAV will do nothing
-            return
+        # Check if there is a target altitude and VNAV is on, else do nothing
+        vnav = (toalt >= 0) & bs.traf.swvnav[idx]
+        self.dist2vs[idx[~vnav]] = -999. #dist to next wp will never be less than this, so VNAV will do nothing
+        idx, toalt, xtoalt, torta, xtorta = idx[vnav], toalt[vnav], xtoalt[vnav], torta[vnav], xtorta[vnav]
 
         # Flat earth distance to next wp
         dy = (bs.traf.actwp.lat[idx] - bs.traf.lat[idx])  # [deg lat = 60. nm]
@@ -393,8 +400,7 @@ class Autopilot(Entity, replaceable=True):
 
         # Check  whether active waypoint speed needs to be adjusted for RTA
         # sets bs.traf.actwp.spd, if necessary
-        #debug print("xtorta+legdist =",(xtorta+legdist)/nm)
-        self.setspeedforRTA(idx, torta, xtorta+legdist) # all scalar
+        self.setspeedforRTA(idx, torta, xtorta+legdist)
 
         # So: somewhere there is an altitude constraint ahead
         # Compute proper values for bs.traf.actwp.nextaltco, self.dist2vs, self.alt, bs.traf.actwp.vs
@@ -433,95 +439,76 @@ class Autopilot(Entity, replaceable=True):
         #   which can be many waypoints beyond current actual waypoint
 
 
-        # VNAV Descent mode
-        if bs.traf.alt[idx] > toalt + 10. * ft:
-
-
-            #Calculate max allowed altitude at next wp (above toalt)
-            bs.traf.actwp.nextaltco[idx] = min(bs.traf.alt[idx],toalt + xtoalt * self.steepness) # [m] next alt constraint
-            bs.traf.actwp.xtoalt[idx]    = xtoalt # [m] distance to next alt constraint measured from next waypoint
-
-
-            # Dist to waypoint where descent should start [m]
-            self.dist2vs[idx] = bs.traf.actwp.turndist[idx] + \
-                               np.abs(bs.traf.alt[idx] - bs.traf.actwp.nextaltco[idx]) / self.steepness
-            #print("self.dist2vs=",self.dist2vs)
-
-            # Flat earth distance to next wp
-            dy = (bs.traf.actwp.lat[idx] - bs.traf.lat[idx])   # [deg lat = 60. nm]
-            dx = (bs.traf.actwp.lon[idx] - bs.traf.lon[idx]) * bs.traf.coslat[idx] # [corrected deg lon = 60. nm]
-            legdist = 60. * nm * np.sqrt(dx * dx + dy * dy)  # [m]
+        alt = bs.traf.alt[idx]
+        gs = bs.traf.gs[idx]
+        tas = bs.traf.tas[idx]
 
+        # VNAV Descent mode, VNAV climb mode, or level leg
+        descent = alt > toalt + 10. * ft
+        climb = alt < toalt - 10. * ft
+        setalt = descent | climb
 
-            # If the descent is urgent, descend with maximum steepness
-            if legdist < self.dist2vs[idx]: # [m]
-                self.alt[idx] = bs.traf.actwp.nextaltco[idx]  # dial in altitude of next waypoint as calculated
+        # Descent: max allowed altitude at next wp (above toalt)
+        # Climb: altitude we want to climb to: next alt constraint in our route
+        # (could be further down the route)
+        nextaltco = np.where(descent, np.minimum(alt, toalt + xtoalt * self.steepness), toalt) # [m]
+        bs.traf.actwp.nextaltco[idx[setalt]] = nextaltco[setalt] # [m] next alt constraint
+        bs.traf.actwp.xtoalt[idx[setalt]] = xtoalt[setalt] # [m] distance to next alt constraint measured from next waypoint
 
-                t2go         = max(0.1, legdist + xtoalt) / max(0.01, bs.traf.gs[idx])
-                bs.traf.actwp.vs[idx]  = (bs.traf.actwp.nextaltco[idx] - bs.traf.alt[idx]) / t2go
-
-            else:
-                # Calculate V/S using self.steepness,
-                # protect against zero/invalid ground speed value
-#                if bs.sim.simt>11.99:
-#                    print("bs.traf.tas.shape =",bs.traf.tas.shape)
-#                    print("bs.traf.gs.shape =", bs.traf.gs.shape)
-#                    print("bs.traf.actwp.vs.shape =", bs.traf.actwp.vs.shape)
-
-                bs.traf.actwp.vs[idx] = -self.steepness * (bs.traf.gs[idx] +
-                      (bs.traf.gs[idx] < 0.2 * bs.traf.tas[idx]) * bs.traf.tas[idx])
-
-        # VNAV climb mode: climb as soon as possible (T/C logic)
-        elif bs.traf.alt[idx] < toalt - 10. * ft:
-
-            # Altitude we want to climb to: next alt constraint in our route (could be further down the route)
-            bs.traf.actwp.nextaltco[idx] = toalt   # [m]
-            bs.traf.actwp.xtoalt[idx]    = xtoalt  # [m] distance to next alt constraint measured from next waypoint
-            self.alt[idx]          = bs.traf.actwp.nextaltco[idx]  # dial in altitude of next waypoint as calculated
-            self.dist2vs[idx]      = 99999.*nm #[m] Forces immediate climb as current distance to next wp will be less
-
-            # Flat earth distance to next wp
-            dy = (bs.traf.actwp.lat[idx] - bs.traf.lat[idx])
-            dx = (bs.traf.actwp.lon[idx] - bs.traf.lon[idx]) * bs.traf.coslat[idx]
-            legdist = 60. * nm * np.sqrt(dx * dx + dy * dy) # [m]
-            t2go = max(0.1, legdist+xtoalt) / max(0.01, bs.traf.gs[idx])
-            bs.traf.actwp.vs[idx]  = np.maximum(self.steepness*bs.traf.gs[idx], \
-                            (bs.traf.actwp.nextaltco[idx] - bs.traf.alt[idx])/ t2go) # [m/s]
+        # Descent: dist to waypoint where descent should start [m]
+        # Climb: forces immediate climb as current distance to next wp will be less
         # Level leg: never start V/S
-        else:
-            self.dist2vs[idx] = -999. # [m]
-
-
-        return
+        dist2vs = np.where(descent,
+                           bs.traf.actwp.turndist[idx] + np.abs(alt - nextaltco) / self.steepness,
+                           np.where(climb, 99999.*nm, -999.)) # [m]
+        self.dist2vs[idx] = dist2vs
+
+        # If the descent is urgent, descend with maximum steepness
+        urgent = descent & (legdist < dist2vs) # [m]
+
+        # Dial in altitude of next waypoint as calculated
+        dialalt = urgent | climb
+        self.alt[idx[dialalt]] = nextaltco[dialalt]
+
+        # Calculate V/S using self.steepness, protect against zero/invalid ground speed value,
+        # or faster when the descent is urgent, and climb as fast as possible
+        t2go = np.maximum(0.1, legdist + xtoalt) / np.maximum(0.01, gs)
+        vs = np.where(climb, np.maximum(self.steepness * gs, (nextaltco - alt) / t2go), # [m/s]
+                      np.where(urgent, (nextaltco - alt) / t2go,
+                               -self.steepness * (gs + (gs < 0.2 * tas) * tas)))
+        bs.traf.actwp.vs[idx[setalt]] = vs[setalt]
 
     def setspeedforRTA(self, idx, torta, xtorta):
+        ''' Calculate the CAS that is required to meet the next RTA torta
+            at distance xtorta, for aircraft idx (an index or an array of
+            indices), and use it as speed of the active waypoint when there
+            is no speed constraint.
+
+            Returns the required CAS [m/s], or -999 where there is no RTA or
+            when it can no longer be met. '''
+        idx = np.atleast_1d(idx)
+        torta, xtorta = np.zeros(len(idx)) + torta, np.zeros(len(idx)) + xtorta
         #debug print("setspeedforRTA called, torta,xtorta =",torta,xtorta/nm)
 
-        # Calculate required CAS to meet RTA
-        # for aircraft nr. idx (scalar)
-        if torta < -90. : # -999 signals there is no RTA defined in remainder of route
-            return False
-
+        # -999 signals there is no RTA defined in remainder of route
         deltime = torta-bs.sim.simt # Remaining time to next RTA [s] in simtime
-        if deltime>0: # Still possible?
-            gsrta = calcvrta(bs.traf.gs[idx], xtorta,
-                             deltime, bs.traf.perf.axmax[idx])
+        valid = (torta >= -90.) & (deltime > 0.) # Still possible?
+        iac = idx[valid]
+        gsrta = vcalcvrta(bs.traf.gs[iac], xtorta[valid],
+                          deltime[valid], bs.traf.perf.axmax[iac])
 
-            # Subtract tail wind speed vector
-            tailwind = (bs.traf.windnorth[idx]*bs.traf.gsnorth[idx] + bs.traf.windeast[idx]*bs.traf.gseast[idx]) / \
-                        bs.traf.gs[idx]
+        # Subtract tail wind speed vector
+        tailwind = (bs.traf.windnorth[iac]*bs.traf.gsnorth[iac] + bs.traf.windeast[iac]*bs.traf.gseast[iac]) / \
+                    bs.traf.gs[iac]
 
-            # Convert to CAS
-            rtacas = tas2cas(gsrta-tailwind,bs.traf.alt[idx])
+        # Convert to CAS
+        rtacas = np.full(len(idx), -999.)
+        rtacas[valid] = vtas2cas(gsrta-tailwind, bs.traf.alt[iac])
 
-            # Performance limits on speed will be applied in traf.update
-            if bs.traf.actwp.spdcon[idx]<0. and bs.traf.swvnavspd[idx]:
-                bs.traf.actwp.spd[idx] = rtacas
-                #print("setspeedforRTA: xtorta =",xtorta)
-
-            return rtacas
-        else:
-            return False
+        # Performance limits on speed will be applied in traf.update
+        setspd = valid & (bs.traf.actwp.spdcon[idx]<0.) & bs.traf.swvnavspd[idx]
+        bs.traf.actwp.spd[idx[setspd]] = rtacas[setspd]
+        return rtacas
 
     @stack.command(name='ALT')
     def selaltcmd(self, idx: 'acid', alt: 'alt', vspd: 'vspd' = None):
@@ -828,6 +815,38 @@ def calcvrta(v0, dx, deltime, trafax):
 
     return vtarg
 
+def vcalcvrta(v0, dx, deltime, trafax):
+    """ Vectorised calcvrta: required target ground speed v1 [m/s] to
+        meet an RTA, for arrays of aircraft. Arguments as in calcvrta. """
+    dt = deltime
+
+    # Do we need decelerate or accelerate
+    ax = np.where(v0 * dt < dx, 1., -1.) * np.maximum(0.01, np.abs(trafax))
+
+    # Solve 2nd order equation for v1 (see calcvrta)
+    a = -0.5 / ax
+    b = (v0 / ax + dt)
+    c = -0.5 * v0 * v0 / ax - dx
+
+    D = b * b - 4. * a * c
+    sqrtD = np.sqrt(np.maximum(0., D))
+
+    # Possibly two v1 solutions
+    x1 = (-b - sqrtD) / (2. * a)
+    x2 = (-b + sqrtD) / (2. * a)
+
+    # Physically possible: both dtacc and dtconst >0
+    dtacc1 = (x1 - v0) / ax
+    dtacc2 = (x2 - v0) / ax
+    ok1 = (D >= 0.) & (dtacc1 >= 0.) & (dt - dtacc1 >= 0.)
+    ok2 = (D >= 0.) & (dtacc2 >= 0.) & (dt - dtacc2 >= 0.)
+
+    # Just in case both would be valid, take closest to v0
+    # Not possible? Maybe borderline, so then simple calculation
+    closest = np.where(np.abs(x2 - v0) < np.abs(x1 - v0), x2, x1)
+    return np.where(ok1 & ok2, closest,
+                    np.where(ok1, x1, np.where(ok2, x2, dx / dt)))
+
 def distaccel(v0,v1,axabs):
     """Calculate distance travelled during acceleration/deceleration
     v0 = start speed, v1 = endspeed, axabs = magnitude of accel/decel
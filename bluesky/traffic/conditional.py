@@ -5,93 +5,89 @@ KL204 ATALT FL100 KL204 SPD 350
 import numpy as np
 import bluesky as bs
 from bluesky import stack
-from bluesky.tools.geo import qdrdist
+from bluesky.core import TrafficArrays
+from bluesky.tools.geo import kwikdist
 
 # Enumerated condtion types
 alttype, spdtype, postype = 0, 1, 2
 
 
-class Condition():
+class Condition(TrafficArrays):
+    ''' Conditional commands, stored as parallel arrays with one element per
+        condition. Conditions refer to their aircraft by index, which is
+        shifted when aircraft are deleted. '''
+    checkpointvars = ('ncond', 'acidx', 'condtype', 'target', 'lastdif', 'lat', 'lon', 'cmd')
+
     def __init__(self):
+        super().__init__()
+        self.clear()
 
+    def clear(self):
+        ''' Remove all conditions. '''
         self.ncond = 0  # Number of conditions
 
-        self.id       = []                         # Id of aircraft of condition
-        self.condtype = np.array([],dtype=int)     # Condition type (0=alt,1=spd)
+        self.acidx    = np.array([],dtype=int)     # Index of aircraft of condition
+        self.condtype = np.array([],dtype=int)     # Condition type (0=alt,1=spd,2=pos)
         self.target   = np.array([],dtype=float)   # Target value (alt,speed,distance[nm])
         self.lastdif  = np.array([],dtype=float)   # Difference during last update
-        self.posdata  = []                         # Data for postype: tuples lat[deg],lon[deg] of ref position
+        self.lat      = np.array([],dtype=float)   # [deg] Reference position for postype
+        self.lon      = np.array([],dtype=float)
         self.cmd      = []                         # Commands to be issued
 
     def update(self):
         if self.ncond==0:
             return
 
-        # Update indices based on list of id's
-        acidxlst = np.array(bs.traf.id2idx(self.id))
-        if len(acidxlst)>0:
-            idelcond = sorted(list(np.where(acidxlst<0)[0]))
-            for i in idelcond[::-1]:
-                del (self.id[i])
-                self.condtype = np.delete(self.condtype, i)
-                self.target = np.delete(self.target, i)
-                self.lastdif = np.delete(self.lastdif, i)
-                del self.posdata[i]
-                del self.cmd[i]
-
-            self.ncond = len(self.id)
-            if self.ncond==0:
-                return
-            acidxlst = np.array(bs.traf.id2idx(self.id))
-
-        # Check condition types
-        actdist = np.ones(self.ncond)*999e9  # Invalid number which never triggers anything is extremely large
-        for j in range(self.ncond):
-            if self.condtype[j] == postype:
-                qdr,dist = qdrdist(bs.traf.lat[acidxlst[j]],bs.traf.lon[acidxlst[j]],self.posdata[j][0],self.posdata[j][1])
-                actdist[j] = dist # [nm]
-
         # Get relevant actual value using index list as index to numpy arrays
-        self.actual = (self.condtype == alttype) * bs.traf.alt[acidxlst] + \
-                      (self.condtype == spdtype) * bs.traf.cas[acidxlst] + \
-                      (self.condtype == postype) * actdist
+        acidx = self.acidx
+        actual = np.where(self.condtype == alttype, bs.traf.alt[acidx], bs.traf.cas[acidx])
 
-        # Compare sign of actual difference with sign of last difference
-        actdif       = self.target - self.actual
+        # Distance [nm] to the reference position of position conditions
+        ipos = np.flatnonzero(self.condtype == postype)
+        actual[ipos] = kwikdist(bs.traf.lat[acidx[ipos]], bs.traf.lon[acidx[ipos]],
+                                self.lat[ipos], self.lon[ipos])
 
-        # Make sorted arrya of indices of true conditions and their conditional commands
-        idxtrue      = sorted(list(np.where(actdif*self.lastdif <= 0.0)[0]))# Sign changed
+        # Compare sign of actual difference with sign of last difference
+        actdif       = self.target - actual
+        istrue       = actdif*self.lastdif <= 0.0 # Sign changed
         self.lastdif = actdif
-        if idxtrue==None or len(idxtrue)==0:
+        if not np.any(istrue):
             return
 
-
-        # Execute commands found to have true condition
-        for i in idxtrue:
-            if i>=0:
-                stack.stack(self.cmd[i])
-                # debug
-                # stack.stack(" ECHO Conditional command issued: "+self.cmd[i])
-
-        # Delete executed commands to clean up arrays and lists
-        # from highest index to lowest for consistency
-        for i in idxtrue[::-1]:
-            if i>=0:
-                del self.id[i]
-                self.condtype = np.delete(self.condtype,i)
-                self.target   = np.delete(self.target,i)
-                self.lastdif  = np.delete(self.lastdif,i)
-                del self.posdata[i]
-                del self.cmd[i]
-
-        # Adjust number of conditions
-        self.ncond = len(self.id)
-
-        if self.ncond!=len(self.cmd):
-            print ("self.ncond=",self.ncond)
-            print ("self.cmd=",self.cmd)
-            print ("traffic/conditional.py: self.delcondition: invalid condition array size")
-        return
+        # Execute commands found to have true condition, in order of creation
+        idxtrue = np.flatnonzero(istrue)
+        for i in idxtrue.tolist():
+            stack.stack(self.cmd[i])
+            # debug
+            # stack.stack(" ECHO Conditional command issued: "+self.cmd[i])
+
+        # Delete executed commands
+        self.compact(~istrue)
+
+    def compact(self, keep):
+        ''' Keep only the conditions where mask keep is True. '''
+        self.acidx    = self.acidx[keep]
+        self.condtype = self.condtype[keep]
+        self.target   = self.target[keep]
+        self.lastdif  = self.lastdif[keep]
+        self.lat      = self.lat[keep]
+        self.lon      = self.lon[keep]
+        self.cmd      = [cmd for cmd, k in zip(self.cmd, keep.tolist()) if k]
+        self.ncond    = len(self.cmd)
+
+    def delete(self, idx):
+        ''' Remove the conditions of deleted aircraft, and shift the aircraft
+            indices of the remaining conditions. '''
+        super().delete(idx)
+        if self.ncond:
+            keepac = np.ones(bs.traf.ntraf, dtype=bool)
+            keepac[idx] = False
+            self.compact(keepac[self.acidx])
+            self.acidx = np.cumsum(keepac)[self.acidx] - 1
+
+    def reset(self):
+        super().reset()
+        self.clear()
 
     def ataltcmd(self,acidx,targalt,cmdtxt):
         actalt = bs.traf.alt[acidx]
@@ -104,21 +100,21 @@ class Condition():
         return True
 
     def atdistcmd(self, acidx, lat, lon, targdist, cmdtxt):
-        qdr, actdist = qdrdist(bs.traf.lat[acidx], bs.traf.lon[acidx], lat, lon)
+        actdist = kwikdist(bs.traf.lat[acidx], bs.traf.lon[acidx], lat, lon)
         self.addcondition(acidx, postype, targdist, actdist, cmdtxt, (lat,lon))
         return True
 
     def addcondition(self,acidx, icondtype, target, actual, cmdtxt,latlon=None):
         #print ("addcondition:", acidx, icondtype, target, actual, cmdtxt, latlon)
+        lat, lon = latlon or (np.nan, np.nan)
 
         # Add condition to arrays
-        self.id.append(bs.traf.id[acidx])
-
+        self.acidx    = np.append(self.acidx,acidx)
         self.condtype = np.append(self.condtype,icondtype)
         self.target   = np.append(self.target,target)
         self.lastdif  = np.append(self.lastdif,target - actual)
-
-        self.posdata.append(latlon)
+        self.lat      = np.append(self.lat,lat)
+        self.lon      = np.append(self.lon,lon)
         self.cmd.append(cmdtxt)
 
         self.ncond = self.ncond+1
@@ -126,18 +122,6 @@ class Condition():
         return
 
     def renameac(self,oldid,newid):
-        # Continonal commands are stored per id (ac name)
-        # When renamed, call this method to update list
-        # rename ids in list of ids
-        # Call this if RENAME command is implemented
-        if self.id.count(old.id) == 0:
-            return
-        for i in range(len(self.id)):
-            if self.id[i] == oldid:
-                self.id[i] = newid
+        # Conditional commands are stored per aircraft index, so they
+        # do not change when an aircraft is renamed
         return
-
-
-
-
-
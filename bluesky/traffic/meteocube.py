@@ -0,0 +1,173 @@
+''' High resolution meteo data for the HIGHRES mode, as in-memory cubes of
+    (lat, lon, level) data for each forecast time. '''
+from datetime import timedelta
+from os import path
+import numpy as np
+
+import bluesky as bs
+from bluesky.tools import Functions
+from bluesky.tools.prefetch import Prefetcher
+from bluesky.tools.aero import ft
+
+
+bs.settings.set_variable_defaults(meteo_path='data/meteo')
+
+
+class MeteoSlice:
+    ''' Meteo data of one forecast time on a lat/lon grid, with a profile of
+        levels for each grid column. Columns can have different (numbers
+        of) levels: alt is sorted per column and padded with nan.
+
+        Arrays:
+        - lat(nlat), lon(nlon): sorted grid axes [deg]
+        - alt(nlat,nlon,nlev): altitudes of the levels [m]
+        - uwind, vwind(nlat,nlon,nlev): wind components of the levels [m/s]
+
+        The wind components are used like in the HIGHRES database: uwind is
+        the north component, vwind the east component. '''
+    def __init__(self, lat, lon, alt, uwind, vwind):
+        self.lat = lat
+        self.lon = lon
+        self.alt = alt
+        self.uwind = uwind
+        self.vwind = vwind
+
+    @staticmethod
+    def fromrows(lat, lon, alt, uwind, vwind):
+        ''' Make a slice of data points with a position lat, lon [deg] and
+            altitude alt [m], e.g., the rows of the meteo database. '''
+        lats, ilat = np.unique(lat, return_inverse=True)
+        lons, ilon = np.unique(lon, return_inverse=True)
+
+        # Level index of each point within its column, sorted by altitude
+        icol = ilat * len(lons) + ilon
+        order = np.lexsort((alt, icol))
+        icol = icol[order]
+        start = np.flatnonzero(np.r_[True, icol[1:] != icol[:-1]])
+        ncol = np.diff(np.r_[start, len(icol)])
+        ilev = np.arange(len(icol)) - np.repeat(start, ncol)
+
+        shape = (len(lats), len(lons), max(ncol, default=0))
+        data = []
+        for values in (alt, uwind, vwind):
+            arr = np.full(shape, np.nan)
+            arr.reshape(-1, shape[2])[icol, ilev] = np.asarray(values, dtype=float)[order]
+            data.append(arr)
+        return MeteoSlice(lats, lons, *data)
+
+    @staticmethod
+    def load(fname):
+        ''' Load a slice from an npz file. '''
+        with np.load(fname) as npz:
+            return MeteoSlice(*(npz[name] for name in ('lat', 'lon', 'alt', 'uwind', 'vwind')))
+
+    def save(self, fname):
+        ''' Save the slice to an npz file. '''
+        np.savez(fname, lat=self.lat, lon=self.lon, alt=self.alt,
+                 uwind=self.uwind, vwind=self.vwind)
+
+    def interp(self, lat, lon, alt):
+        ''' Trilinear interpolation of the wind at positions lat, lon [deg]
+            and altitudes alt [m]: linear in altitude within each of the four
+            surrounding columns, followed by bilinear interpolation.
+            Returns the wind components, and whether the position is inside
+            the grid. Positions below the lowest level of one of the columns
+            get zero wind. '''
+        i0, fi, inlat = axisindex(lat, self.lat)
+        j0, fj, inlon = axisindex(lon, self.lon)
+        i1 = np.minimum(i0 + 1, len(self.lat) - 1)
+        j1 = np.minimum(j0 + 1, len(self.lon) - 1)
+
+        uwind = np.zeros(len(lat))
+        vwind = np.zeros(len(lat))
+        valid = np.ones(len(lat), dtype=bool)
+        for i, wi in ((i0, 1. - fi), (i1, fi)):
+            for j, wj in ((j0, 1. - fj), (j1, fj)):
+                # Levels below and above each position in this column,
+                # extrapolated above the highest level like the database rows
+                levels = self.alt[i, j]
+                k = np.sum(levels < alt[:, np.newaxis], axis=1)
+                nlev = np.sum(~np.isnan(levels), axis=1)
+                valid &= (k > 0) & (nlev > 1)
+                k = np.minimum(np.maximum(k, 1), np.maximum(nlev - 1, 1))[:, np.newaxis]
+                alt0 = np.take_along_axis(levels, k - 1, axis=1)[:, 0]
+                alt1 = np.take_along_axis(levels, k, axis=1)[:, 0]
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    fk = np.where(alt1 > alt0, (alt - alt0) / (alt1 - alt0), 0.)
+                for data, result in ((self.uwind, uwind), (self.vwind, vwind)):
+                    col = data[i, j]
+                    value = np.take_along_axis(col, k - 1, axis=1)[:, 0] * (1. - fk) + \
+                        np.take_along_axis(col, k, axis=1)[:, 0] * fk
+                    result += np.where(valid, wi * wj * value, 0.)
+
+        uwind[~valid] = 0.
+        vwind[~valid] = 0.
+        return uwind, vwind, inlat & inlon
+
+
+def axisindex(values, axis):
+    ''' Index of the grid point below values on a sorted axis, the
+        interpolation factor for the next grid point, and whether values
+        are within the axis range. '''
+    if len(axis) == 1:
+        return np.zeros(len(values), dtype=int), np.zeros(len(values)), values == axis[0]
+    i0 = np.clip(np.searchsorted(axis, values, side='right') - 1, 0, len(axis) - 2)
+    f = np.clip((values - axis[i0]) / (axis[i0 + 1] - axis[i0]), 0., 1.)
+    return i0, f, (values >= axis[0]) & (values <= axis[-1])
+
+
+class MeteoCube:
+    ''' HIGHRES meteo provider: wind from the two forecast time slices
+        around the simulation time, interpolated in space and time.
+
+        Slices are read from npz files meteo_path/<name>/<timestamp>.npz.
+        When the file of a slice does not exist, the slice is imported
+        from the Postgres database <name> (optional, requires psycopg2),
+        and stored as npz file for the next time.
+
+        The slice of the next forecast time is prefetched in the background,
+        and swapped in when the simulation time passes the current slices. '''
+    def __init__(self, name):
+        self.name = name
+        self.stamps = None
+        self.slices = (None, None)
+        self.loader = Prefetcher(self.loadslice)
+
+    def fname(self, stamp):
+        return path.join(bs.settings.meteo_path, self.name, f'{stamp}.npz')
+
+    def loadslice(self, stamp):
+        ''' Load the slice of forecast time stamp. '''
+        fname = self.fname(stamp)
+        if path.isfile(fname):
+            return MeteoSlice.load(fname)
+
+        df = Functions.query_DB_to_DF(self.name, "SELECT * FROM " + self.name +
+                                      " WHERE timestamp_data = " + str(stamp))
+        meteo = MeteoSlice.fromrows(df['lat'].to_numpy(), df['lon'].to_numpy(),
+                                    df['alt'].to_numpy() * ft, df['uwind'].to_numpy(),
+                                    df['vwind'].to_numpy())
+        try:
+            meteo.save(fname)
+        except OSError as e:
+            print(f'HIGHRES: could not store meteo data in {fname}: {e}')
+        return meteo
+
+    def settime(self, utc):
+        ''' Load the slices around time utc, when these are not loaded yet. '''
+        stamps = Functions.utc2stamps(utc)
+        if stamps != self.stamps:
+            slices = tuple(self.loader.get(stamp) for stamp in stamps)
+            self.stamps, self.slices = stamps, slices
+            self.loader.prefetch(Functions.utc2stamps(utc + timedelta(minutes=10))[1])
+
+    def getdata(self, utc, lat, lon, alt):
+        ''' Wind north and east components [m/s] at time utc and positions
+            lat, lon [deg], alt [m], and whether each position is inside the
+            meteo grid. '''
+        self.settime(utc)
+        timefrac = Functions.utc2frac(utc, self.stamps[0])
+        u1, v1, inside = self.slices[0].interp(lat, lon, alt)
+        u2, v2, _ = self.slices[1].interp(lat, lon, alt)
+        return (1. - timefrac) * u1 + timefrac * u2, \
+            (1. - timefrac) * v1 + timefrac * v2, inside
@@ -10,6 +10,7 @@
 from glob import glob
 from os import path
 import re
+from bluesky.tools import cachefile
 from .fwparser import FixedWidthParser, ParseError
 
 # File formats of BADA data files. Uses fortran-like notation
@@ -66,6 +67,9 @@ accoeffs     = dict()
 release_date = 'Unknown'
 bada_version = 'Unknown'
 
+# Version of the coefficient cache, change when the cached data changes
+coeff_version = 'v20261018'
+
 
 def getCoefficients(actype):
     ''' Get a set of BADA coefficients for the given aircraft type.
@@ -125,19 +129,47 @@ def init(bada_path=''):
         print('SYNONYM.NEW not found in BADA path, could not load BADA.')
         return False
 
+    # Load the synonyms and aircraft coefficients from the cache, which is
+    # rebuilt when one of the BADA files has changed
+    opffiles = glob(path.join(path.normpath(bada_path), '*.OPF'))
+    apffiles = glob(path.join(path.normpath(bada_path), '*.APF'))
+    with cachefile.openarrays('bada.npc', coeff_version,
+                              [synonymfile] + opffiles + apffiles) as cache:
+        try:
+            syns, coeffs = cache.load()
+        except cachefile.CacheError as e:
+            print(e.args[0])
+            data = parse(synonymfile, opffiles)
+            if data is None:
+                return False
+            syns, coeffs = data
+            cache.dump(data)
+
+    synonyms.update(syns)
+    accoeffs.update(coeffs)
+    print('%d aircraft entries loaded' % len(synonyms))
+    print('%d unique aircraft coefficient sets loaded' % len(accoeffs))
+    return (len(synonyms) > 0 and len(accoeffs) > 0)
+
+
+def parse(synonymfile, opffiles):
+    ''' Parse the BADA synonym file and the aircraft coefficient files.
+        Returns dicts with the synonyms and coefficient sets, or None when
+        the synonym file could not be read. '''
     try:
         data = syn_parser.parse(synonymfile)
     except ParseError as e:
         print('Error reading synonym file {} on line {}'.format(e.fname, e.lineno))
-        return False
+        return None
 
+    syns = dict()
     for line in data:
         syn = Synonym(line)
-        synonyms[syn.accode] = syn
-    print('%d aircraft entries loaded' % len(synonyms))
+        syns[syn.accode] = syn
 
     # Load aircraft coefficient data
-    for fname in glob(path.join(path.normpath(bada_path), '*.OPF')):
+    coeffs = dict()
+    for fname in opffiles:
         ac = ACData()
         try:
             ac.setOPFData(opf_parser.parse(fname))
@@ -150,9 +182,8 @@ def init(bada_path=''):
             ac = None
 
         if ac:
-            accoeffs[ac.actype] = ac
-    print('%d unique aircraft coefficient sets loaded' % len(accoeffs))
-    return (len(synonyms) > 0 and len(accoeffs) > 0)
+            coeffs[ac.actype] = ac
+    return syns, coeffs
 
 
 class Synonym:
@@ -1,11 +1,14 @@
 """ OpenAP performance library. """
 import os
 import json
+from glob import glob
 import numpy as np
 import pandas as pd
 import bluesky as bs
 from bluesky import settings
 from bluesky.settings import get_project_root
+from bluesky.tools import cachefile
+from bluesky.traffic.performance.openap import thrust
 
 
 settings.set_variable_defaults(perf_path_openap=
@@ -28,10 +31,36 @@ fixwing_dragpolar_db = settings.perf_path_openap + "/fixwing/dragpolar.csv"
 
 rotor_aircraft_db = settings.perf_path_openap + "/rotor/aircraft.json"
 
+# Version of the coefficient cache, change when the cached data changes
+coeff_version = "v20261018"
+
+# Per-aircraft coefficients of the OpenAP model that are stored in the
+# per-type tables, with the value for types that do not specify them
+table_params = dict(
+    lifttype=0.0, mass=0.0, Sref=0.0, engnum=0, engpower=0.0, engthrmax=0.0,
+    engbpr=0.0, ff_coeff_a=0.0, ff_coeff_b=0.0, ff_coeff_c=0.0,
+    vmin=0.0, vmax=0.0, vsmin=0.0, vsmax=0.0, hmax=0.0, axmax=2.0,
+    vminic=0.0, vminer=0.0, vminap=0.0, vmaxic=0.0, vmaxer=0.0, vmaxap=0.0,
+    vminto=0.0, hcross=0.0, mmo=0.0, cd0_clean=0.0, k_clean=0.0, cd0_to=0.0,
+    k_to=0.0, cd0_ld=0.0, k_ld=0.0, delta_cd_gear=0.0)
+
 
 class Coefficient:
     def __init__(self):
-
+        # Load the coefficients from the cache, which is rebuilt when one of
+        # the OpenAP data files has changed
+        sources = [synonyms_db, fixwing_aircraft_db, fixwing_engine_db,
+                   fixwing_dragpolar_db, rotor_aircraft_db]
+        sources += glob(fixwing_envelops_dir + "*.csv")
+        with cachefile.openarrays("openap.npc", coeff_version, sources) as cache:
+            try:
+                self.__dict__.update(cache.load())
+            except cachefile.CacheError as e:
+                print(e.args[0])
+                self._load_all()
+                cache.dump(self.__dict__)
+
+    def _load_all(self):
         # Load synonyms.dat text file into dictionary
         self.synodict = {}
         with open(synonyms_db, "r") as f_syno:
@@ -63,6 +92,84 @@ class Coefficient:
         self.dragpolar_fixwing = df.to_dict(orient="index")
         self.dragpolar_fixwing["NA"] = df.mean().to_dict()
 
+        self._compile_tables()
+
+    def _compile_tables(self):
+        """Compile the coefficients of all rotor and fixwing types into
+        tables, with one element per type for each parameter in table_params"""
+        # Type id (row in the tables) of each type
+        self.typeids = {
+            actype: i for i, actype in enumerate(self.actypes_rotor + self.actypes_fixwing)
+        }
+        self.tables = {
+            name: np.full(len(self.typeids), default)
+            for name, default in table_params.items()
+        }
+        # Type name used for each type id
+        self.actypes = np.array(list(self.typeids), dtype=object)
+
+        for actype, i in self.typeids.items():
+            row = dict()
+            if actype in self.acs_rotor:
+                ac = self.acs_rotor[actype]
+                row["lifttype"] = LIFT_ROTOR
+                row["mass"] = 0.5 * (ac["oew"] + ac["mtow"])
+                row["engnum"] = int(ac["n_engines"])
+                row["engpower"] = ac["engines"][0][1]
+            else:
+                ac = self.acs_fixwing[actype]
+                # populate fuel flow model with the first engine
+                e = next(iter(ac["engines"].values()))
+                row["ff_coeff_a"], row["ff_coeff_b"], row["ff_coeff_c"] = \
+                    thrust.compute_eng_ff_coeff(e["ff_idl"], e["ff_app"], e["ff_co"], e["ff_to"])
+                row["lifttype"] = LIFT_FIXWING
+                row["Sref"] = ac["wa"]
+                row["mass"] = 0.5 * (ac["oew"] + ac["mtow"])
+                row["engnum"] = int(ac["n_engines"])
+                row["engthrmax"] = e["thr"]
+                row["engbpr"] = e["bpr"]
+
+            # type specific coefficients for flight envelops
+            if actype in self.limits_rotor:
+                limits = self.limits_rotor[actype]
+                for name in ("vmin", "vmax", "vsmin", "vsmax", "hmax"):
+                    row[name] = limits[name]
+                for name in ("cd0_clean", "k_clean", "cd0_to", "k_to",
+                             "cd0_ld", "k_ld", "delta_cd_gear"):
+                    row[name] = np.nan
+            else:
+                if actype not in self.limits_fixwing or actype not in self.dragpolar_fixwing:
+                    actype = "B744"
+                    self.actypes[i] = actype
+                limits = self.limits_fixwing[actype]
+                for name in ("vminic", "vminer", "vminap", "vmaxic", "vmaxer", "vmaxap",
+                             "vsmin", "vsmax", "hmax", "axmax", "vminto", "mmo"):
+                    row[name] = limits[name]
+                row["hcross"] = limits["crosscl"]
+                dragpolar = self.dragpolar_fixwing[actype]
+                for name in ("cd0_clean", "k_clean", "cd0_to", "k_to",
+                             "cd0_ld", "k_ld", "delta_cd_gear"):
+                    row[name] = dragpolar[name]
+
+            for name, value in row.items():
+                self.tables[name][i] = value
+
+    def gettypeid(self, actype):
+        """Get the type id of aircraft type actype (upper case), and a
+        list of warnings when the type is replaced by another type"""
+        warnings = []
+        # Check synonym file if not in open ap actypes
+        if actype not in self.typeids and actype in self.synodict:
+            warnings.append(f"Warning: {actype} replaced by {self.synodict[actype]}")
+            actype = self.synodict[actype]
+
+        # convert to known aircraft type
+        if actype not in self.typeids:
+            warnings.append(f"Warning: {actype} replaced by B744")
+            actype = "B744"
+
+        return self.typeids[actype], warnings
+
     def _load_all_fixwing_flavor(self):
         import warnings
 
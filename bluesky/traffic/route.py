@@ -1,15 +1,28 @@
 """ Route implementation for the BlueSky FMS."""
 from os import path
-from weakref import WeakValueDictionary
+from weakref import WeakValueDictionary, finalize
 from numpy import *
 import bluesky as bs
 from bluesky.tools import geo
 from bluesky.core import Replaceable
-from bluesky.tools.aero import ft, kts, g0, nm, mach2cas, casormach2tas
+from bluesky.tools.aero import ft, kts, g0, nm, mach2cas, vcasormach2tas
 from bluesky.tools.misc import degto180, get_indices, txt2tim, txt2alt, txt2spd
 from bluesky.tools.position import txt2pos
 from bluesky import stack
 from bluesky.stack.cmdparser import Command, command, commandgroup
+from . import routestore
+
+
+def wpcolumn(name, doc):
+    """ Property for a column of the waypoint data of a route in the route
+        store. Returns a numpy view on the waypoints of the route. """
+    def fget(self):
+        return self.store.column(self.slot, name)
+
+    def fset(self, value):
+        self.store.column(self.slot, name)[:] = value
+
+    return property(fget, fset, doc=doc)
 
 
 
@@ -37,36 +50,54 @@ class Route(Replaceable):
     # Aircraft route objects
     _routes = WeakValueDictionary()
 
+    # Waypoint data of all routes
+    store = routestore.RouteStore()
+
+    # Waypoint data of this route in the route store
+    wptype = wpcolumn('type', 'List of waypoint types')
+    wplat = wpcolumn('lat', 'List of waypoint latitudes')
+    wplon = wpcolumn('lon', 'List of waypoint longitudes')
+    wpalt = wpcolumn('alt', '[m] negative value means not specified')
+    wpspd = wpcolumn('spd', '[m/s] negative value means not specified')
+    wprta = wpcolumn('rta', '[s] negative value means not specified')
+    wpflyby = wpcolumn('flyby', 'Flyby (True)/flyover(False) switch')
+
+    # Made for drones: fly turn mode, means use specified turn radius and optionally turn speed
+    wpflyturn = wpcolumn('flyturn', 'Flyturn (True) or flyover/flyby (False) switch')
+    wpturnrad = wpcolumn('turnrad', '[nm] Turn radius per waypoint (<0 = not specified)')
+    wpturnspd = wpcolumn('turnspd', '[kts] Turn speed (IAS/CAS) per waypoint (<0 = not specified)')
+
+    # Flight plan calculations
+    wpdirfrom = wpcolumn('dirfrom', '[deg] Direction of the leg from the waypoint')
+    wpdistto = wpcolumn('distto', '[nm] Length of the leg to the waypoint')
+    wpialt = wpcolumn('ialt', 'Index of the next altitude constraint')
+    wptoalt = wpcolumn('toalt', '[m] Next altitude constraint')
+    wpxtoalt = wpcolumn('xtoalt', '[m] Distance to the next altitude constraint')
+    wpirta = wpcolumn('irta', 'Index of the next RTA')
+    wptorta = wpcolumn('torta', '[s] Next RTA')
+    wpxtorta = wpcolumn('xtorta', '[m] Distance to the next RTA')
+
     def __init__(self, acid):
         # Add self to dictionary of all aircraft routes
         Route._routes[acid] = self
         # Aircraft id (callsign) of the aircraft to which this route belongs
         self.acid = acid
-        self.nwp = 0
+
+        # Slot of this route in the route store. A route that is
+        # re-initialised keeps its slot
+        if 'slot' in self.__dict__:
+            self.store.clear(self.slot)
+        else:
+            self.alloc()
 
         #Vertical fms logc: enable Top of CLimb & Top of Descent logic
         self.swtoc = True
         self.swtod = True
 
-        # Waypoint data
+        # Waypoint data that is not in the route store
         self.wpname = []    # List of waypoint names for this flight plan
-        self.wptype = []    # List of waypoint types
-        self.wplat  = []    # List of waypoint latitudes
-        self.wplon  = []    # List of waypoint longitudes
-        self.wpalt  = []    # [m] negative value means not specified
-        self.wpspd  = []    # [m/s] negative value means not specified
-        self.wprta  = []    # [m/s] negative value means not specified
-        self.wpflyby = []   # Flyby (True)/flyover(False) switch
         self.wpstack = []   # Stack with command execured when passing this waypoint
 
-        # Made for drones: fly turn mode, means use specified turn radius and optionally turn speed
-        self.wpflyturn = []   # Flyturn (True) or flyover/flyby (False) switch
-        self.wpturnrad = []   # [nm] Turn radius per waypoint (<0 = not specified)
-        self.wpturnspd = []   # [kts] Turn speed (IAS/CAS) per waypoint (<0 = not specified)
-
-        # Current actual waypoint
-        self.iactwp = -1
-
         # Set to default addwpt wpmode
         # Note that neither flyby nor flyturn means: flyover)
         self.swflyby   = True    # Default waypoints are flyby waypoint
@@ -81,13 +112,50 @@ class Route(Replaceable):
         # default: False
         self.flag_landed_runway = False
 
-        self.wpdirfrom = []
-        self.wpdistto  = []
-        self.wpialt    = []
-        self.wptoalt   = []
-        self.wpxtoalt  = []
-        self.wptorta   = []
-        self.wpxtorta  = []
+    def alloc(self):
+        """ Allocate a slot in the route store, which is freed again when
+            this route is deleted. """
+        self.slot = self.store.alloc()
+        finalize(self, self.store.free, self.slot)
+
+    def __getstate__(self):
+        """ A pickled route (e.g., in a checkpoint) contains a copy of its
+            waypoint data instead of its slot in the route store. """
+        state = self.__dict__.copy()
+        del state['slot']
+        state['wpdata'] = {name: self.store.column(self.slot, name).copy()
+                           for name in routestore.columns}
+        state['iactwp'] = self.iactwp
+        return state
+
+    def __setstate__(self, state):
+        wpdata = state.pop('wpdata')
+        iactwp = state.pop('iactwp')
+        self.__dict__.update(state)
+        Route._routes[self.acid] = self
+        self.alloc()
+        self.store.resize(self.slot, len(self.wpname))
+        for name, values in wpdata.items():
+            self.store.column(self.slot, name)[:] = values
+        self.iactwp = iactwp
+
+    @property
+    def nwp(self):
+        """ Number of waypoints in this route. """
+        return int(self.store.nwp[self.slot])
+
+    @nwp.setter
+    def nwp(self, n):
+        self.store.resize(self.slot, n)
+
+    @property
+    def iactwp(self):
+        """ Index of the current active waypoint. """
+        return int(self.store.iactwp[self.slot])
+
+    @iactwp.setter
+    def iactwp(self, iwp):
+        self.store.iactwp[self.slot] = iwp
 
     @staticmethod
     def get_available_name(data, name_, len_=2):
@@ -99,7 +167,7 @@ class Route(Replaceable):
         fmt_ = "{:0" + str(len_) + "d}"
 
         # Avoid using call sign without number
-        if bs.traf.id.count(name_) > 0:
+        if bs.traf.id2idx(name_) >= 0:
             appi = 1
             name_ = name_+fmt_.format(appi)
 
@@ -599,33 +667,20 @@ class Route(Replaceable):
         wplat = (wplat + 90.) % 180. - 90.
         wplon = (wplon + 180.) % 360. - 180.
 
+        wpdata = dict(lat=wplat, lon=wplon, alt=wpalt, spd=wpspd, type=wptype,
+                      flyby=self.swflyby, flyturn=self.swflyturn,
+                      turnrad=self.turnrad, turnspd=self.turnspd,
+                      rta=-999.0)  # initially no RTA
+
         if overwrt:
             self.wpname[wpidx]  = wpname
-            self.wplat[wpidx]   = wplat
-            self.wplon[wpidx]   = wplon
-            self.wpalt[wpidx]   = wpalt
-            self.wpspd[wpidx]   = wpspd
-            self.wptype[wpidx]  = wptype
-            self.wpflyby[wpidx] = self.swflyby
-            self.wpflyturn[wpidx] = self.swflyturn
-            self.wpturnrad[wpidx] = self.turnrad
-            self.wpturnspd[wpidx] = self.turnspd
-            self.wprta[wpidx]   = -999.0 # initially no RTA
             self.wpstack[wpidx] = []
+            self.store.set(self.slot, wpidx, **wpdata)
 
         else:
             self.wpname.insert(wpidx, wpname)
-            self.wplat.insert(wpidx, wplat)
-            self.wplon.insert(wpidx, wplon)
-            self.wpalt.insert(wpidx, wpalt)
-            self.wpspd.insert(wpidx, wpspd)
-            self.wptype.insert(wpidx, wptype)
-            self.wpflyby.insert(wpidx, self.swflyby)
-            self.wpflyturn.insert(wpidx, self.swflyturn)
-            self.wpturnrad.insert(wpidx, self.turnrad)
-            self.wpturnspd.insert(wpidx, self.turnspd)
-            self.wprta.insert(wpidx,-999.0)       # initially no RTA
             self.wpstack.insert(wpidx,[])
+            self.store.insert(self.slot, wpidx, **wpdata)
 
 
     def addwpt(self, iac, name, wptype, lat, lon, alt=-999., spd=-999., afterwp="", beforewp=""):
@@ -680,7 +735,6 @@ class Route(Replaceable):
                 self.insert_wpt_data(
                     wpidx, wprtename, wplat, wplon, wptype, alt, spd)
 
-                self.nwp += 1
                 if orig and self.iactwp >= 0:
                     self.iactwp += 1
                 elif not orig and self.iactwp < 0 and self.nwp == 1:
@@ -744,7 +798,6 @@ class Route(Replaceable):
                         False, wpidx, newname, wplat, wplon, wptype, alt, spd)
 
                 idx = wpidx
-                self.nwp += 1
 
             else:
                 idx = -1
@@ -975,16 +1028,7 @@ class Route(Replaceable):
 
         nextqdr = self.getnextqdr()
 
-        # in case that there is a runway, the aircraft should remain on it
-        # instead of deviating to the airport centre
-        # When there is a destination: current = runway, next  = Dest
-        # Else: current = runway and this is also the last waypoint
-        if (self.wptype[self.iactwp] == 5 and
-                self.wpname[self.iactwp] == self.wpname[-1]) or \
-           (self.wptype[self.iactwp] == 5 and self.iactwp+1<self.nwp and
-                self.wptype[self.iactwp + 1] == 3):
-
-            self.flag_landed_runway = True
+        self.checkrunway()
 
         #print ("getnextwp:",self.wpname[self.iactwp],"   torta = ",self.wptorta[self.iactwp])
 
@@ -998,6 +1042,43 @@ class Route(Replaceable):
                self.wpturnspd[self.iactwp], \
                nextqdr, swlastwp
 
+    @staticmethod
+    def getnextwps(routes, slots):
+        """Go to next waypoint for a list of routes, with their slots in the
+           route store, and return the data as arrays in the order of getnextwp()"""
+        landed = array([rte.flag_landed_runway for rte in routes], dtype=bool)
+        wpdata = Route.store.getnextwps(slots[~landed])
+
+        # Check for runways, only for the routes that switched to a runway
+        iwp = maximum(0, Route.store.start[slots] + Route.store.iactwp[slots])
+        for i in flatnonzero(~landed & (Route.store.type[iwp] == Route.runway)):
+            routes[i].checkrunway()
+
+        if not any(landed):
+            return wpdata
+
+        # Routes that already landed on a runway
+        alldata = [empty(len(routes), dtype=col.dtype) for col in wpdata]
+        for col, values in zip(alldata, wpdata):
+            col[~landed] = values
+        for i in flatnonzero(landed):
+            for col, value in zip(alldata, routes[i].getnextwp()):
+                col[i] = value
+        return alldata
+
+    def checkrunway(self):
+        """Check whether the aircraft lands on the runway of the active waypoint"""
+        # in case that there is a runway, the aircraft should remain on it
+        # instead of deviating to the airport centre
+        # When there is a destination: current = runway, next  = Dest
+        # Else: current = runway and this is also the last waypoint
+        if (self.wptype[self.iactwp] == 5 and
+                self.wpname[self.iactwp] == self.wpname[-1]) or \
+           (self.wptype[self.iactwp] == 5 and self.iactwp+1<self.nwp and
+                self.wptype[self.iactwp + 1] == 3):
+
+            self.flag_landed_runway = True
+
     def runactwpstack(self):
         for cmdline in self.wpstack[self.iactwp]:
             stack.stack(cmdline)
@@ -1050,14 +1131,9 @@ class Route(Replaceable):
         if acrte.iactwp == wpidx and not wpidx == acrte.nwp - 1:
             acrte.direct(acidx, acrte.wpname[wpidx + 1])
 
-        acrte.nwp =acrte.nwp - 1
         del acrte.wpname[wpidx]
-        del acrte.wplat[wpidx]
-        del acrte.wplon[wpidx]
-        del acrte.wpalt[wpidx]
-        del acrte.wpspd[wpidx]
-        del acrte.wprta[wpidx]
-        del acrte.wptype[wpidx]
+        del acrte.wpstack[wpidx]
+        acrte.store.delete(acrte.slot, wpidx)
         if acrte.iactwp > wpidx:
             acrte.iactwp = max(0, acrte.iactwp - 1)
 
@@ -1199,132 +1275,94 @@ class Route(Replaceable):
                 lon = f*self.wplon[j]+(1.-f)*self.wplon[j+1]
 
                 self.wpname.insert(j,name[i])
-                self.wptype.insert(j,Route.calcwp)
-                self.wplat.insert(j,lat)
-                self.wplon.insert(j,lon)
-                self.wpalt.insert(j,alt[i])
-                self.wpspd.insert(j,-999.)
+                self.wpstack.insert(j,[])
+                self.store.insert(self.slot, j, type=Route.calcwp,
+                                  lat=lat, lon=lon, alt=alt[i])
 
     def insertcalcwp(self, i, name):
         """Insert empty wp with no attributes at location i"""
 
         self.wpname.insert(i,name)
-        self.wplat.insert(i,0.)
-        self.wplon.insert(i,0.)
-        self.wpalt.insert(i,-999.)
-        self.wpspd.insert(i,-999.)
-        self.wptype.insert(i,Route.calcwp)
+        self.wpstack.insert(i,[])
+        self.store.insert(self.slot, i, type=Route.calcwp)
 
     def calcfp(self): # Current Flight Plan calculations, which actualize based on flight condition
         """Do flight plan calculations"""
 #        self.delwpt("T/D")
 #        self.delwpt("T/C")
 
-        # Direction to waypoint
-        self.nwp = len(self.wpname)
-
-        # Create flight plan calculation table
-        self.wpdirfrom   = self.nwp*[0.]
-        self.wpdistto    = self.nwp*[0.]
-        self.wpialt      = self.nwp*[-1]
-        self.wptoalt     = self.nwp*[-999.]
-        self.wpxtoalt    = self.nwp*[1.]  # Avoid division by zero
-        self.wpirta      = self.nwp*[-1]
-        self.wptorta     = self.nwp*[-999.]
-        self.wpxtorta    = self.nwp*[1.]  #[m] Avoid division by zero
-
-        # No waypoints: make empty variables to be safe and return: nothing to do
-        if self.nwp==0:
+        # Reset flight plan calculation table
+        self.wpdirfrom   = 0.
+        self.wpdistto    = 0.
+        self.wpialt      = -1
+        self.wptoalt     = -999.
+        self.wpxtoalt    = 1.  # Avoid division by zero
+        self.wpirta      = -1
+        self.wptorta     = -999.
+        self.wpxtorta    = 1.  #[m] Avoid division by zero
+
+        # No waypoints: nothing to do
+        nwp = self.nwp
+        if nwp==0:
             return
 
         # Calculate lateral leg data
         # LNAV: Calculate leg distances and directions
+        wplat, wplon = self.wplat, self.wplon
+        wpdirfrom, wpdistto = self.wpdirfrom, self.wpdistto
+        wpdirfrom[:-1], wpdistto[1:] = geo.qdrdist(wplat[:-1], wplon[:-1],
+                                                   wplat[1:], wplon[1:]) # [deg], [nm]
 
-        for i in range(0, self.nwp - 1):
-            qdr,dist = geo.qdrdist(self.wplat[i]  ,self.wplon[i],
-                                self.wplat[i+1],self.wplon[i+1])
-            self.wpdirfrom[i] = qdr
-            self.wpdistto[i+1]  = dist #[nm]  distto is in nautical miles
+        if nwp>1:
+            wpdirfrom[-1] = wpdirfrom[-2]
 
-        if self.nwp>1:
-            self.wpdirfrom[-1] = self.wpdirfrom[-2]
+        # Distance along the route from the first waypoint [m]
+        xroute = cumsum(wpdistto) * nm
+        iwp = arange(nwp)
 
         # Calculate longitudinal leg data
         # VNAV: calc next altitude constraint: index, altitude and distance to it
-        ialt = -1     # index to waypoint with next altitude constraint
-        toalt = -999. # value of next altitude constraint
-        xtoalt = 0.   # distance to next altitude constraint from this wp
-        for i in range(self.nwp-1,-1,-1):
-
-            # waypoint with altitude constraint (dest of al specified)
-            if self.wptype[i]==Route.dest:
-                ialt   = i
-                toalt  = 0.
-                xtoalt = 0.                # [m]
-
-            elif self.wpalt[i] >= 0:
-                ialt   = i
-                toalt  = self.wpalt[i]
-                xtoalt = 0.                # [m]
-
-            # waypoint with no altitude constraint:keep counting
-            else:
-                if i!=self.nwp-1:
-                    xtoalt = xtoalt + self.wpdistto[i+1]*nm  # [m] xtoalt is in meters!
-                else:
-                    xtoalt = 0.0
-
-            self.wpialt[i]   = ialt
-            self.wptoalt[i]  = toalt   #[m]
-            self.wpxtoalt[i] = xtoalt  #[m]
+        # waypoint with altitude constraint (dest or alt specified)
+        isdest = self.wptype == Route.dest
+        altcon = isdest | (self.wpalt >= 0)
+        ialt = minimum.accumulate(where(altcon, iwp, nwp)[::-1])[::-1]
+
+        # After the last constraint: count distance to last waypoint
+        found = ialt < nwp
+        inext = minimum(ialt, nwp - 1)
+        self.wpialt   = where(found, ialt, -1)
+        self.wptoalt  = where(found, where(isdest, 0., self.wpalt)[inext], -999.) #[m]
+        self.wpxtoalt = xroute[inext] - xroute  #[m] xtoalt is in meters!
 
         # RTA: calc next rta constraint: index, altitude and distance to it
         # If any RTA.
-        if any(array(self.wprta)>=0.0):
-            #print("Yes, I found RTAs")
-            irta = -1       # index of wp
-            torta = -999.   # next rta value
-            xtorta = 0.     # distance to next rta
-            for i in range(self.nwp - 1, -1, -1):
-
-                # waypoint with rta: reset counter, update rts
-                if self.wprta[i] >= 0:
-                    irta = i
-                    torta = self.wprta[i]
-                    xtorta = 0.  # [m]
-
-                # waypoint with no altitude constraint:keep counting
-                else:
-                    if i != self.nwp - 1:
-                        # No speed or rta constraint: add to xtorta
-                        if self.wpspd[i] <= 0.0:
-                            xtorta = xtorta + self.wpdistto[i + 1] * nm  # [m] xtoalt is in meters!
-                        else:
-                            # speed constraint on this leg: shift torta to account for this
-                            # altitude unknown
-                            if self.wptoalt[i] >0.:
-                                alt = toalt
-                            else:
-                                # TODO: current a/c altitude would be better guess, but not accessible here
-                                # as we do not know aircraft index for this route
-                                alt = 10000.*ft # default to minimize errors, when no alt constraints are present
-                            legtas = casormach2tas(self.wpspd[i],alt)
-                            #TODO: account for wind at this position vy adding wind vectors to waypoints?
-
-                            # xtorta stays the same! This leg will not be available for RTA scheduling, so distance
-                            # is not in xtorta. Therefore we need to subtract legtime to ignore this leg for the RTA
-                            # scheduling
-                            legtime = self.wpdistto[i+1]/legtas
-                            torta = torta - legtime
-                    else:
-                        xtorta = 0.0
-                        torta = -999.0
-
-                self.wpirta[i]   = irta
-                self.wptorta[i]  = torta  # [s]
-                self.wpxtorta[i] = xtorta  # [m]
-            #print("wpxtorta=",self.wpxtorta)
-            #print("wptorta=", self.wptorta)
+        wprta = self.wprta
+        if any(wprta>=0.0):
+            irta = minimum.accumulate(where(wprta >= 0., iwp, nwp)[::-1])[::-1]
+            found = irta < nwp
+            inext = minimum(irta, nwp - 1)
+
+            # No speed constraint on leg: add to xtorta
+            spdcon = self.wpspd[:-1] > 0.0
+            legdist = where(spdcon, 0., wpdistto[1:] * nm)  # [m] xtorta is in meters!
+
+            # Speed constraint on leg: xtorta stays the same! This leg will not be
+            # available for RTA scheduling, so distance is not in xtorta. Therefore
+            # we need to subtract legtime to ignore this leg for the RTA scheduling
+            # altitude unknown: use the first altitude constraint when there is one
+            # TODO: current a/c altitude would be better guess, but not accessible here
+            # as we do not know aircraft index for this route
+            legalt = where(self.wptoalt[:-1] > 0., self.wptoalt[0], 10000.*ft)
+            legtime = zeros(nwp - 1)
+            legtime[spdcon] = wpdistto[1:][spdcon] / \
+                vcasormach2tas(self.wpspd[:-1][spdcon], legalt[spdcon])
+            #TODO: account for wind at this position vy adding wind vectors to waypoints?
+
+            xcum = concatenate(([0.], cumsum(legdist)))
+            tcum = concatenate(([0.], cumsum(legtime)))
+            self.wpirta   = where(found, irta, -1)
+            self.wptorta  = where(found, wprta[inext], -999.) - (tcum[inext] - tcum[iwp])  # [s]
+            self.wpxtorta = xcum[inext] - xcum[iwp]  # [m]
 
     def findact(self,i):
         """ Find best default active waypoint.
@@ -0,0 +1,246 @@
+''' Columnar storage of the waypoint data of all routes. '''
+import numpy as np
+from bluesky.tools import geo
+
+
+# Waypoint columns, with their default values (which also set their types)
+columns = dict(
+    lat=0.0,        # [deg] Waypoint latitude
+    lon=0.0,        # [deg] Waypoint longitude
+    alt=-999.,      # [m] Altitude constraint, negative value means not specified
+    spd=-999.,      # [m/s] Speed constraint, negative value means not specified
+    rta=-999.,      # [s] Required time of arrival, negative value means not specified
+    type=0,         # Waypoint type (see Route)
+    flyby=True,     # Flyby (True)/flyover(False) switch
+    flyturn=False,  # Flyturn (True) or flyover/flyby (False) switch
+    turnrad=-999.,  # [nm] Turn radius (<0 = not specified)
+    turnspd=-999.,  # [kts] Turn speed (IAS/CAS) (<0 = not specified)
+    # Flight plan calculations of Route.calcfp()
+    dirfrom=0.,     # [deg] Direction of the leg from this waypoint
+    distto=0.,      # [nm] Length of the leg to this waypoint
+    ialt=-1,        # Index of the next altitude constraint
+    toalt=-999.,    # [m] Next altitude constraint
+    xtoalt=1.,      # [m] Distance to the next altitude constraint
+    irta=-1,        # Index of the next RTA
+    torta=-999.,    # [s] Next RTA
+    xtorta=1.)      # [m] Distance to the next RTA
+
+# Initial size of the waypoint arrays and the slot arrays
+mincapacity = 256
+
+# Minimum capacity of the segment of a route
+minsegment = 8
+
+
+class RouteStore:
+    ''' Waypoint data of all routes, in flat arrays with one element per
+        waypoint for each of the columns.
+
+        Each route has a slot, with the start, capacity and number of
+        waypoints of its segment of the flat arrays (CSR layout), and the
+        index of its active waypoint. A route that outgrows its segment moves
+        to a segment with double capacity at the end of the arrays. The
+        arrays are compacted when more than half of them is unused.
+
+        The Route object of each aircraft is a view on its slot. Queries
+        for a set of routes are vectorised over an array of slots. '''
+    def __init__(self):
+        # Number of waypoint elements in use (including unused segments),
+        # and number of unused elements
+        self.size = 0
+        self.nunused = 0
+        for name, default in columns.items():
+            setattr(self, name, np.full(mincapacity, default))
+
+        # Slot data
+        self.start = np.zeros(mincapacity, dtype=int)
+        self.capacity = np.zeros(mincapacity, dtype=int)
+        self.nwp = np.zeros(mincapacity, dtype=int)
+        self.iactwp = np.full(mincapacity, -1)
+        self.nslots = 0
+        self.freeslots = []
+
+    def alloc(self):
+        ''' Allocate a slot for a new, empty route. '''
+        if self.freeslots:
+            slot = self.freeslots.pop()
+        else:
+            slot = self.nslots
+            self.nslots += 1
+            if slot == len(self.start):
+                for name in ('start', 'capacity', 'nwp', 'iactwp'):
+                    arr = getattr(self, name)
+                    setattr(self, name, np.concatenate((arr, np.zeros_like(arr))))
+        self.start[slot] = self.size
+        self.capacity[slot] = 0
+        self.clear(slot)
+        return slot
+
+    def free(self, slot):
+        ''' Free the slot of a deleted route. '''
+        self.clear(slot)
+        self.nunused += self.capacity[slot]
+        self.capacity[slot] = 0
+        self.freeslots.append(slot)
+
+    def clear(self, slot):
+        ''' Remove all waypoints from a route. '''
+        self.nwp[slot] = 0
+        self.iactwp[slot] = -1
+
+    def column(self, slot, name):
+        ''' View on a column of the waypoints of a route. '''
+        start = self.start[slot]
+        return getattr(self, name)[start:start + self.nwp[slot]]
+
+    def reserve(self, slot, n):
+        ''' Make sure the segment of a route can store n waypoints. '''
+        capacity = self.capacity[slot]
+        if n <= capacity:
+            return
+        capacity = max(minsegment, 2 * capacity, n)
+        if self.size + capacity > len(self.lat):
+            if self.nunused > self.size // 2:
+                self.compact()
+            if self.size + capacity > len(self.lat):
+                self.grow(max(2 * len(self.lat), self.size + capacity))
+
+        # Move the segment to the end of the arrays
+        start, nwp = self.start[slot], self.nwp[slot]
+        for name in columns:
+            arr = getattr(self, name)
+            arr[self.size:self.size + nwp] = arr[start:start + nwp]
+        self.nunused += self.capacity[slot]
+        self.start[slot] = self.size
+        self.capacity[slot] = capacity
+        self.size += capacity
+
+    def grow(self, length):
+        ''' Increase the length of the waypoint arrays. '''
+        for name, default in columns.items():
+            arr = np.full(length, default)
+            arr[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, arr)
+
+    def compact(self):
+        ''' Remove unused elements from the waypoint arrays. '''
+        slots = np.flatnonzero(self.capacity[:self.nslots])
+        slots = slots[np.argsort(self.start[slots])]
+        capacity = self.capacity[slots]
+        start = np.cumsum(capacity) - capacity
+
+        # Element indices of all waypoints in the old and new arrays
+        nwp = self.nwp[slots]
+        offset = np.cumsum(nwp) - nwp
+        iwp = np.arange(nwp.sum())
+        src = np.repeat(self.start[slots] - offset, nwp) + iwp
+        dst = np.repeat(start - offset, nwp) + iwp
+
+        for name, default in columns.items():
+            arr = getattr(self, name)
+            new = np.full(len(arr), default)
+            new[dst] = arr[src]
+            setattr(self, name, new)
+        self.start[slots] = start
+        self.size = int(capacity.sum())
+        self.nunused = 0
+
+    def resize(self, slot, n):
+        ''' Set the number of waypoints of a route. New waypoints at the
+            end of the route get default values. '''
+        nwp = self.nwp[slot]
+        if n > nwp:
+            self.reserve(slot, n)
+            start = self.start[slot]
+            for name, default in columns.items():
+                getattr(self, name)[start + nwp:start + n] = default
+        self.nwp[slot] = n
+
+    def insert(self, slot, i, **values):
+        ''' Insert a waypoint before index i (like list.insert) in a route.
+            Columns that are not in values get their default value. '''
+        nwp = self.nwp[slot]
+        i = min(max(0, i + nwp if i < 0 else i), nwp)
+        self.reserve(slot, nwp + 1)
+        iwp = self.start[slot] + i
+        iend = self.start[slot] + nwp
+        for name, default in columns.items():
+            arr = getattr(self, name)
+            arr[iwp + 1:iend + 1] = arr[iwp:iend]
+            arr[iwp] = values.get(name, default)
+        self.nwp[slot] = nwp + 1
+
+    def set(self, slot, i, **values):
+        ''' Set column values of waypoint i of a route. '''
+        iwp = self.start[slot] + (i + self.nwp[slot] if i < 0 else i)
+        for name, value in values.items():
+            getattr(self, name)[iwp] = value
+
+    def delete(self, slot, i):
+        ''' Delete waypoint i from a route. '''
+        nwp = self.nwp[slot]
+        iwp = self.start[slot] + (i + nwp if i < 0 else i)
+        iend = self.start[slot] + nwp
+        for name in columns:
+            arr = getattr(self, name)
+            arr[iwp:iend - 1] = arr[iwp + 1:iend]
+        self.nwp[slot] = nwp - 1
+
+    # Vectorised functions for sets of routes, of which the slots are given
+    def getactwp(self, slots, *names):
+        ''' Values of the columns in names at the active waypoint of each
+            route. Routes without active waypoint get the default values. '''
+        iactwp = self.iactwp[slots]
+        valid = (iactwp >= 0) & (iactwp < self.nwp[slots])
+        iwp = np.where(valid, self.start[slots] + iactwp, 0)
+        return tuple(np.where(valid, getattr(self, name)[iwp], columns[name]) for name in names)
+
+    def disttogo(self, slots, lat, lon):
+        ''' Distance [nm] along each route from position lat, lon via the
+            active waypoint to the last waypoint, using the leg lengths of
+            the flight plan calculations. Zero for routes without active
+            waypoint. '''
+        iactwp = self.iactwp[slots]
+        nwp = self.nwp[slots]
+        valid = (iactwp >= 0) & (iactwp < nwp)
+        iwp = self.start[slots][valid] + iactwp[valid]
+        iend = self.start[slots][valid] + nwp[valid]
+
+        # Sum of the legs after the active waypoint from the cumulative
+        # leg lengths of all waypoints
+        cumdist = np.concatenate(([0.], np.cumsum(self.distto[:self.size])))
+        dist = np.zeros(len(iactwp))
+        _, dist[valid] = geo.qdrdist(lat[valid], lon[valid], self.lat[iwp], self.lon[iwp])
+        dist[valid] += cumdist[iend] - cumdist[iwp + 1]
+        return dist
+
+    def nextqdr(self, slots):
+        ''' Direction [deg] of the leg after the active waypoint of each
+            route, or -999 when the active waypoint is the last waypoint. '''
+        iactwp = self.iactwp[slots]
+        valid = (iactwp > -1) & (iactwp < self.nwp[slots] - 1)
+        iwp = self.start[slots][valid] + iactwp[valid]
+        qdr = np.full(len(iactwp), -999.)
+        qdr[valid], _ = geo.qdrdist(self.lat[iwp], self.lon[iwp],
+                                    self.lat[iwp + 1], self.lon[iwp + 1])
+        return qdr
+
+    def getnextwps(self, slots):
+        ''' Go to the next waypoint of each route, and return the data of
+            the new active waypoints in the order of Route.getnextwp(). '''
+        nwp = self.nwp[slots]
+        # Switch LNAV off when last waypoint has been passed,
+        # otherwise increase the active waypoint index
+        lnavon = self.iactwp[slots] < nwp - 1
+        iactwp = self.iactwp[slots] + lnavon
+        self.iactwp[slots] = iactwp
+
+        # Switch to indicate that this is the last waypoint
+        swlastwp = iactwp == nwp - 1
+        nextqdr = self.nextqdr(slots)
+
+        iwp = np.maximum(0, self.start[slots] + iactwp)
+        return self.lat[iwp], self.lon[iwp], self.alt[iwp], self.spd[iwp], \
+            self.xtoalt[iwp], self.toalt[iwp], self.xtorta[iwp], self.torta[iwp], \
+            lnavon, self.flyby[iwp], self.flyturn[iwp], self.turnrad[iwp], \
+            self.turnspd[iwp], nextqdr, swlastwp
@@ -16,7 +16,7 @@ import bluesky as bs
 from bluesky.core import Entity, timed_function
 from bluesky.stack import refdata
 from bluesky.stack.recorder import savecmd
-from bluesky.tools import geo, Functions, Ground_radar_read
+from bluesky.tools import geo, Ground_radar_read
 from bluesky.tools.misc import latlon2txt, angleFromCoordinate, get_indices
 from bluesky.tools.aero import cas2tas, casormach2tas, fpm, kts, ft, g0, Rearth, nm, tas2cas,\
                          vatmos,  vtas2cas, vtas2mach, vcasormach
@@ -25,6 +25,7 @@ from bluesky.traffic.asas import ConflictDetection, ConflictResolution
 from .windsim import WindSim
 from .conditional import Condition
 from .trails import Trails
+from .meteocube import MeteoCube
 from .adsbmodel import ADSB
 from .aporasas import APorASAS
 from .autopilot import Autopilot
@@ -73,6 +74,12 @@ class Traffic(Entity):
     Created by  : Jacco M. Hoekstra
     """
 
+    # Bulk aircraft data can be used by CREBULK commands in the scenario stack
+    checkpointvars = ('bulkdata',)
+
+    # Position and accumulated values stay double precision in float32 mode
+    float64vars = ('lat', 'lon', 'alt', 'distflown', 'work')
+
     def __init__(self):
         super().__init__()
 
@@ -89,13 +96,20 @@ class Traffic(Entity):
         self.HighRes = False
         self.Wind_DB = ""
 
-        self.df_1 = ""
-        self.df_2 = ""
+        self.meteo = None
         self.HR_Loaded = False
         self.activate_HR = False
 
         self.id_select = ''  # aircraft that previously received a command
 
+        # Index of each aircraft id. Entries from index idmapvalid onward
+        # are outdated after a create or delete, and are refreshed on lookup
+        self.idmap = dict()
+        self.idmapvalid = 0
+
+        # Columnar aircraft data for bulk creation with CREBULK, by name
+        self.bulkdata = dict()
+
         self.trafdatafeed = TrafficDataFeed()
 
         #Ground Radar
@@ -210,6 +224,9 @@ class Traffic(Entity):
         # This ensures that the traffic arrays (which size is dynamic)
         # are all reset as well, so all lat,lon,sdp etc but also objects adsb
         super().reset()
+        self.idmap.clear()
+        self.idmapvalid = 0
+        self.bulkdata.clear()
 
         # reset performance model
         self.perf.reset()
@@ -250,7 +267,7 @@ class Traffic(Entity):
 
         if isinstance(acid, str):
             # Check if not already exist
-            if self.id.count(acid.upper()) > 0:
+            if self.id2idx(acid) >= 0:
                 return False, acid + " already exists."  # already exists do nothing
             acid = n * [acid]
 
@@ -275,6 +292,7 @@ class Traffic(Entity):
 
         # Aircraft Info
         self.id[-n:]   = acid
+        self.idmapvalid = min(self.idmapvalid, self.ntraf - n)
         self.type[-n:] = actype
 
         # Positions
@@ -355,6 +373,76 @@ class Traffic(Entity):
             # So insert a dummy command to record the line
             savecmd("---",line)
 
+    def crebulk(self, acid, actype, aclat, aclon, achdg, acalt, acspd, source=None,
+                ssr=None, flighttype=None, wtc=None, arr=None, sid=None):
+        """ Create multiple aircraft from columnar data, without the stack.
+
+            Arguments:
+            - acid, actype: callsigns and aircraft types
+            - aclat, aclon, achdg: positions [deg] and headings [deg]
+            - acalt, acspd: altitudes [m] and CAS [m/s] or Mach [-]
+            - source: data feed source of each aircraft ('' for simulated aircraft)
+            - ssr, flighttype, wtc: SSR codes, flight types and wake turbulence categories
+            - arr, sid: arrival/stack and SID (without adding waypoints)
+
+            Aircraft with an existing callsign are skipped. Returns the
+            indices of the created aircraft in order of the input.
+        """
+        acid = np.char.upper(np.asarray(acid, dtype=str))
+        n = len(acid)
+        _, first = np.unique(acid, return_index=True)
+        sel = first[self.ids2idx(acid[first]) < 0]
+        sel.sort()
+        if len(sel) == 0:
+            return np.array([], dtype=int)
+
+        col = lambda values, dtype=float: np.array(np.broadcast_to(
+            np.asarray(values, dtype=dtype), (n,))[sel])
+        acid, actype = col(acid, str), col(actype, str)
+        aclat, aclon, achdg = col(aclat), col(aclon), col(achdg)
+        acalt, acspd = col(acalt), col(acspd)
+
+        i0 = self.ntraf
+        self.cre(acid.tolist(), actype.tolist(), aclat, aclon, achdg, acalt, acspd)
+        idx = np.arange(i0, self.ntraf)
+
+        if source is not None:
+            source = col(source, object)
+            source[[not isinstance(s, str) for s in source]] = ''
+            ifeed = idx[source != '']
+            self.trafdatafeed.datafeed[ifeed] = True
+            self.trafdatafeed.datafeedids.extend(self.id[i] for i in ifeed.tolist())
+            for i, src in zip(idx.tolist(), source.tolist()):
+                self.trafdatafeed.source[i] = src
+        if ssr is not None:
+            self.lvnlvars.ssr[idx] = np.nan_to_num(col(ssr)).astype(int)
+        for name, values in (('flighttype', flighttype), ('wtc', wtc),
+                             ('arr', arr), ('sid', sid)):
+            if values is not None:
+                lst = getattr(self.lvnlvars, name)
+                for i, value in zip(idx.tolist(), col(values, object).tolist()):
+                    lst[i] = value.upper() if isinstance(value, str) else ''
+
+        return idx
+
+    def addbulkdata(self, name, data):
+        """ Store columnar aircraft data under name, for bulk creation with
+            the CREBULK command. data is a dict (or DataFrame) with the
+            argument names of crebulk as keys. """
+        self.bulkdata[name.upper()] = {key: np.asarray(values) for key, values in dict(data).items()}
+
+    def crebulkcmd(self, name, start=0, end=-1):
+        """ Create the aircraft in rows start to end (exclusive) of the bulk
+            data stored under name. """
+        data = self.bulkdata.get(name.upper())
+        if data is None:
+            return False, f'CREBULK: No aircraft data named {name}'
+        end = len(data['acid']) if end < 0 else end
+        # Scalar values apply to all aircraft
+        self.crebulk(**{key: values[start:end] if values.ndim else values
+                        for key, values in data.items()})
+        return True
+
     def creconfs(self, acid, actype, targetidx, dpsi, dcpa, tlosh, dH=None, tlosv=None, spd=None):
         ''' Create an aircraft in conflict with target aircraft.
 
@@ -436,6 +524,13 @@ class Traffic(Entity):
         if isinstance(idx, Collection):
             idx = np.sort(idx)
 
+        # Remove the deleted aircraft from the id map. The indices of all
+        # aircraft after the first deleted aircraft change
+        delidx = np.atleast_1d(np.arange(self.ntraf)[idx])
+        for acid in delidx.tolist():
+            self.idmap.pop(self.id[acid], None)
+        self.idmapvalid = min(self.idmapvalid, np.min(delidx, initial=self.ntraf))
+
         # Call the actual delete function
         super().delete(idx)
 
@@ -491,6 +586,11 @@ class Traffic(Entity):
         #---------- Aftermath ---------------------------------
         self.trails.update()
 
+        # Store the arrays that were replaced in this update in single
+        # precision again
+        if bs.settings.traf_float32:
+            self.castarrays()
+
     @timed_function(name='asas', dt=bs.settings.asas_dt, manual=True)
     def update_asas(self):
         # Conflict detection and resolution
@@ -574,18 +674,28 @@ class Traffic(Entity):
         """Find index of aircraft id"""
         if not isinstance(acid, str):
             # id2idx is called for multiple id's
-            # Fast way of finding indices of all ACID's in a given list
-            tmp = dict((v, i) for i, v in enumerate(self.id))
-            return [tmp.get(acidi, -1) for acidi in acid]
-        else:
-             # Catch last created id (* or # symbol)
-            if acid in ('#', '*'):
-                return self.ntraf - 1
+            return self.ids2idx(acid).tolist()
+
+        # Catch last created id (* or # symbol)
+        if acid in ('#', '*'):
+            return self.ntraf - 1
+
+        return self.getidmap().get(acid.upper(), -1)
+
+    def ids2idx(self, acids):
+        """Find the indices of multiple aircraft ids, as an integer array
+           with -1 for ids that don't exist."""
+        idmap = self.getidmap()
+        return np.fromiter((idmap.get(acid, -1) for acid in acids), dtype=int)
 
-            try:
-                return self.id.index(acid.upper())
-            except:
-                return -1
+    def getidmap(self):
+        """Return the dict with the index of each aircraft id, after
+           refreshing the entries that changed after a create or delete."""
+        if self.idmapvalid < self.ntraf:
+            self.idmap.update(zip(self.id[self.idmapvalid:self.ntraf],
+                                  range(self.idmapvalid, self.ntraf)))
+            self.idmapvalid = self.ntraf
+        return self.idmap
 
     def idselect2idx(self):
         """
@@ -599,10 +709,7 @@ class Traffic(Entity):
         """
 
         if self.id_select != '':
-            try:
-                return self.id.index(self.id_select.upper())
-            except:
-                return -1
+            return self.getidmap().get(self.id_select.upper(), -1)
         else:
             return -1
 
@@ -668,17 +775,19 @@ class Traffic(Entity):
 
         self.HighRes = flag
         self.Wind_DB = name
+        if self.meteo is None or self.meteo.name != name:
+            self.meteo = MeteoCube(name)
         if self.HighRes:
             print("HighResolution Meteo mode has been initialised.")
             self.wind.winddim = 1
             self.activate_HR = True
         else:
-            print("HighResolution Meteo mode has been disabled.")
+            print("HighResolution Meteo mode has been disabled. Meteo data: " + self.meteo.loader.info())
             self.wind.winddim = 0
 
     def updateHighRes(self):
         """
-            Function:   Updates the highres meteo data every minute, and loads the new data every 10 minutes
+            Function:   Updates the highres meteo data of all aircraft every 10 seconds, and loads the new data every 10 minutes
             Args:
                 - self
             Returns: -
@@ -690,25 +799,16 @@ class Traffic(Entity):
             """ Only goes here when 10 seconds have past. """
             if (str(bs.sim.utc)[17:] == "00" and str(bs.sim.utc)[15] == "0") or self.activate_HR == True:
                 """ Only goes here every 10 minutes, which is when the new weather data must be loaded. """
-                self.prev_timestamp, self.next_timestamp = Functions.utc2stamps(bs.sim.utc)
-                self.df_1 = Functions.query_DB_to_DF(self.Wind_DB,"SELECT * FROM " + self.Wind_DB + " WHERE timestamp_data = " + str(self.prev_timestamp))
-                self.df_2 = Functions.query_DB_to_DF(self.Wind_DB,"SELECT * FROM " + self.Wind_DB + " WHERE timestamp_data = " + str(self.next_timestamp))
+                self.meteo.settime(bs.sim.utc)
+                self.prev_timestamp, self.next_timestamp = self.meteo.stamps
                 self.HR_Loaded = True
                 self.activate_HR = False
 
-            if self.HR_Loaded:
-                base = floor(len(self.lat) * int(str(bs.sim.utc)[17:])/60)
-                top  = ceil(len(self.lat) * int(str(bs.sim.utc)[17:])/60) + ceil(len(self.lat) * 10/60)
-                if top >= len(self.lat):
-                    top -= 1
-                for idx in range(top - base):
-                    """ Fill the uwind and vwind variables. """
-                    timefrac = Functions.utc2frac(bs.sim.utc, self.prev_timestamp)
-                    if self.lat[idx + base] >= 49 and self.lat[idx + base] <= 55.9 and self.lon[idx + base] >= -1 and self.lon[idx + base] <= 9.9:
-                        value1 = Functions.find_datapoint_timeframe(self.df_1,[self.prev_timestamp, self.alt[idx + base] / 0.3048,self.lat[idx + base], self.lon[idx + base]])
-                        value2 = Functions.find_datapoint_timeframe(self.df_2,[self.next_timestamp, self.alt[idx + base] / 0.3048,self.lat[idx + base], self.lon[idx + base]])
-                        self.windnorth[idx + base] = Functions.time_interpolation(timefrac, value1[4], value2[4])
-                        self.windeast[idx + base] = Functions.time_interpolation(timefrac, value1[5], value2[5])
+            if self.HR_Loaded and self.ntraf:
+                """ Interpolate the wind of all aircraft within the meteo grid at once. """
+                windnorth, windeast, inside = self.meteo.getdata(bs.sim.utc, self.lat, self.lon, self.alt)
+                self.windnorth[inside] = windnorth[inside]
+                self.windeast[inside] = windeast[inside]
 
     def activate_GroundRadar(self, flag, *args):
         """
@@ -38,6 +38,8 @@ class TrafficDataFeed(Entity):
     Date: 13-1-2022
     """
 
+    checkpointvars = ('trackdata', 'trafprev', 'datafeedids')
+
     def __init__(self):
         super().__init__()
 
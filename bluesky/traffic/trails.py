@@ -18,6 +18,8 @@ class Trails(TrafficArrays):
     Created by  : Jacco M. Hoekstra
     """
 
+    float64vars = ('lastlat', 'lastlon', 'lasttim')
+
     def __init__(self,dttrail=10.):
         super().__init__()
         self.active = False  # Wether or not to show trails
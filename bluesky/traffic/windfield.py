@@ -7,6 +7,9 @@ from bluesky.tools.aero import ft
 import bluesky as bs
 import numpy as np
 
+
+bs.settings.set_variable_defaults(wind_grid=False, wind_gridres=0.25)
+
 class Windfield():
     """ Windfield class:
         Methods:
@@ -18,6 +21,11 @@ class Windfield():
                          returns index of vector (0,1,2,3,..)
                          all units are SI units, angles in degrees
 
+            addpoints(lat,lon,vnorth,veast,windalt=None)
+                       = add the wind components of many positions at once,
+                         optionally at the same altitudes for all positions
+                         (e.g. a GFS grid), returns indices of the vectors
+
             get(lat,lon,alt=0)
                        = get wind vector for given position and optional
                          altitude, all can be arrays,
@@ -25,6 +33,8 @@ class Windfield():
 
             remove(idx) = remove a defined profile using the index
 
+            makegrid() = interpolate the wind vectors on a regular grid
+
         Members:
             lat(nvec)          = latitudes of wind definitions
             lon(nvec)          = longitudes of wind definitions
@@ -39,6 +49,14 @@ class Windfield():
                           2 = 2D field (no alt profiles),
                           3 = 3D field (alt dependent wind at some points)
 
+            gridded   = Switch to interpolate the wind from a regular grid
+                        (settings.wind_grid). The grid is made from the wind
+                        vectors when the field has changed:
+            gridlat(nlat), gridlon(nlon) = grid axes [deg], regularly spaced
+            gridvn(nalt,nlat,nlon)       = wind north component [m/s]
+            gridve(nalt,nlat,nlon)       = wind east component [m/s]
+                        nalt = 1 for a 2D field
+
     """
     def __init__(self):
         # For altitude use fixed axis to allow vectorisation later
@@ -53,6 +71,10 @@ class Windfield():
         # List of indices of points with an altitude profile (for 3D check)
         self.iprof   = []
 
+        # Trilinear interpolation from a regular grid
+        self.gridded = bs.settings.wind_grid
+        self.gridres = bs.settings.wind_gridres  # [deg] for scattered vectors
+
         # Clear actual field
         self.clear()
         return
@@ -67,8 +89,15 @@ class Windfield():
         self.vnorth  = array([[]])
         self.veast   = array([[]])
         self.nvec    = 0
+        self.cleargrid()
         return
 
+    def cleargrid(self): # Grid is made again when the field has changed
+        self.gridlat = None
+        self.gridlon = None
+        self.gridvn  = None
+        self.gridve  = None
+
     def addpoint(self,lat,lon,winddir,windspd,windalt=None):
         """ addpoint: adds a lat,lon position with a wind direction [deg]
                                                      and wind speedd [m/s]
@@ -119,9 +148,68 @@ class Windfield():
             self.iprof.append(idx)
 
         self.nvec = self.nvec+1
+        self.cleargrid()
 
         return idx # return index of added point
 
+    def addpoints(self, lat, lon, vnorth, veast, windalt=None):
+        """ addpoints: adds the wind north and east components [m/s] of
+            positions lat, lon (nvec) at once.
+
+            Without altitudes the components are arrays (nvec). With an
+            array of altitudes windalt (nlev) [m], the components are arrays
+            (nlev,nvec) of the wind at these altitudes for each position.
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        vnorth = np.asarray(vnorth, dtype=float)
+        veast  = np.asarray(veast, dtype=float)
+        nvec = len(lat)
+        if nvec == 0:
+            return np.arange(0)
+
+        if windalt is None: # same wind for all altitudes
+            vnaxis = repeat(vnorth.reshape((1, nvec)), self.nalt, axis=0)
+            veaxis = repeat(veast.reshape((1, nvec)), self.nalt, axis=0)
+
+        else: # interpolate the profiles on the altitude axis, like interp()
+            windalt = np.atleast_1d(np.asarray(windalt, dtype=float))
+            order   = np.argsort(windalt)
+            windalt = windalt[order]
+            vnorth  = vnorth.reshape((len(windalt), nvec))[order]
+            veast   = veast.reshape((len(windalt), nvec))[order]
+            if len(windalt) == 1:
+                vnaxis = repeat(vnorth, self.nalt, axis=0)
+                veaxis = repeat(veast, self.nalt, axis=0)
+            else:
+                k = np.clip(np.searchsorted(windalt, self.altaxis), 1, len(windalt) - 1)
+                f = np.clip((self.altaxis - windalt[k - 1]) /
+                            (windalt[k] - windalt[k - 1]), 0., 1.).reshape((-1, 1))
+                vnaxis = (1. - f) * vnorth[k - 1] + f * vnorth[k]
+                veaxis = (1. - f) * veast[k - 1] + f * veast[k]
+
+        idx = np.arange(self.nvec, self.nvec + nvec)
+        self.lat    = append(self.lat, lat)
+        self.lon    = append(self.lon, lon)
+        if self.nvec == 0:
+            self.vnorth = vnaxis
+            self.veast  = veaxis
+        else:
+            self.vnorth = append(self.vnorth, vnaxis, axis=1)
+            self.veast  = append(self.veast, veaxis, axis=1)
+
+        if self.winddim < 3:
+            self.winddim = min(2, len(self.lat))
+
+        if windalt is not None:
+            self.winddim = 3
+            self.iprof.extend(idx.tolist())
+
+        self.nvec = self.nvec + nvec
+        self.cleargrid()
+
+        return idx
+
     def getdata(self,userlat,userlon,useralt=0.0): # in case no altitude specified and field is 3D, use sea level wind
         if bs.traf.HighRes == True:
             " Use prerecorded data "
@@ -165,25 +253,15 @@ class Windfield():
                 vnorth = ones(npos)*self.vnorth[0,0]
                 veast  = ones(npos)*self.veast[0,0]
 
+            elif self.gridded: # 2D/3D field interpolated from regular grid
+                if self.gridvn is None:
+                    self.makegrid()
+                vnorth, veast = self.interpgrid(lat.reshape(npos), lon.reshape(npos), alt)
+
             elif self.winddim >= 2: # 2D/3D field = more points defined but no altitude profile
 
                 #---- Get horizontal weight factors
-
-                # Average cosine for flat-eartyh approximation
-                cavelat = cos(radians(0.5*(lat+array([self.lat]).transpose())))
-
-                # Lat and lon distance in 60 nm units (1 lat degree)
-                dy = lat - array([self.lat]).transpose() #(nvec,npos)
-                dx = cavelat*(lon - array([self.lon]).transpose())
-
-                # Calulate invesre distance squared
-                invd2   = 1./(eps+dx*dx+dy*dy) # inverse of distance squared
-
-                # Normalize weights
-                sumsid2 = ones((1,self.nvec)).dot(invd2) # totals to normalize weights
-                totals = repeat(sumsid2,self.nvec,axis=0) # scale up dims to (nvec,npos)
-
-                horfact = invd2/totals # rows x col = nvec x npos, weight factors
+                horfact = self.horfact(lat, lon) # rows x col = nvec x npos, weight factors
 
                 #---- Altitude interpolation
 
@@ -225,6 +303,89 @@ class Windfield():
             else:
                 return float(vnorth),float(veast)
 
+    def horfact(self, lat, lon):
+        """ Inverse distance squared weight factors (nvec,npos) of the wind
+            vectors for positions lat, lon (1,npos) """
+        eps = 1e-20 # [m2] to avoid divison by zero for using exact same points
+
+        # Average cosine for flat-eartyh approximation
+        cavelat = cos(radians(0.5*(lat+array([self.lat]).transpose())))
+
+        # Lat and lon distance in 60 nm units (1 lat degree)
+        dy = lat - array([self.lat]).transpose() #(nvec,npos)
+        dx = cavelat*(lon - array([self.lon]).transpose())
+
+        # Calulate invesre distance squared
+        invd2   = 1./(eps+dx*dx+dy*dy) # inverse of distance squared
+
+        # Normalize weights
+        sumsid2 = ones((1,self.nvec)).dot(invd2) # totals to normalize weights
+        totals = repeat(sumsid2,self.nvec,axis=0) # scale up dims to (nvec,npos)
+
+        return invd2/totals
+
+    def makegrid(self):
+        """ Interpolate the wind vectors on a regular lat/lon grid, with the
+            altitude axis of the field (one level for a 2D field).
+            Vectors that already lie on a regular grid (like a GFS field)
+            are used as they are, otherwise the vectors are interpolated
+            on a grid with gridres spacing over their bounding box. """
+        nalt = self.nalt if self.winddim == 3 else 1
+        lats, ilat = np.unique(self.lat, return_inverse=True)
+        lons, ilon = np.unique(self.lon, return_inverse=True)
+
+        if len(lats) * len(lons) == self.nvec and isregular(lats) and isregular(lons) \
+                and len(np.unique(ilat * len(lons) + ilon)) == self.nvec:
+            self.gridvn = zeros((nalt, len(lats), len(lons)))
+            self.gridve = zeros((nalt, len(lats), len(lons)))
+            self.gridvn[:, ilat, ilon] = self.vnorth[:nalt]
+            self.gridve[:, ilat, ilon] = self.veast[:nalt]
+
+        else:
+            lats = gridaxis(lats[0], lats[-1], self.gridres)
+            lons = gridaxis(lons[0], lons[-1], self.gridres)
+            glat, glon = np.meshgrid(lats, lons, indexing='ij')
+            glat, glon = glat.reshape((1, -1)), glon.reshape((1, -1))
+            vn = zeros((nalt, glat.size))
+            ve = zeros((nalt, glat.size))
+
+            # Interpolate in chunks of grid points to limit the size of
+            # the (nvec, npos) weight matrix
+            chunk = max(1, 2000000 // self.nvec)
+            for i in range(0, glat.size, chunk):
+                horfact = self.horfact(glat[:, i:i + chunk], glon[:, i:i + chunk])
+                vn[:, i:i + chunk] = self.vnorth[:nalt].dot(horfact)
+                ve[:, i:i + chunk] = self.veast[:nalt].dot(horfact)
+            self.gridvn = vn.reshape((nalt, len(lats), len(lons)))
+            self.gridve = ve.reshape((nalt, len(lats), len(lons)))
+
+        self.gridlat = lats
+        self.gridlon = lons
+
+    def interpgrid(self, lat, lon, alt):
+        """ Trilinear interpolation of the gridded wind at positions lat,
+            lon [deg] and altitudes alt [m]. Positions outside the grid
+            get the wind at the nearest edge of the grid. """
+        nalt, nlat, nlon = self.gridvn.shape
+        i0, i1, fi = gridindex(lat, self.gridlat)
+        j0, j1, fj = gridindex(lon, self.gridlon)
+        if nalt > 1:
+            k0, k1, fk = gridindex(alt, self.altaxis)
+        else:
+            k0 = k1 = zeros(len(lat), dtype=int)
+            fk = zeros(len(lat))
+
+        # Weighted sum of the eight surrounding grid points
+        vnorth = zeros(len(lat))
+        veast  = zeros(len(lat))
+        for k, wk in ((k0, 1. - fk), (k1, fk)):
+            for i, wi in ((i0, 1. - fi), (i1, fi)):
+                for j, wj in ((j0, 1. - fj), (j1, fj)):
+                    w = wk * wi * wj
+                    vnorth += w * self.gridvn[k, i, j]
+                    veast  += w * self.gridve[k, i, j]
+        return vnorth, veast
+
     def remove(self,idx): # remove a point using the returned index when it was added
         if idx<len(self.lat):
             self.lat = delete(self.lat,idx)
@@ -239,4 +400,27 @@ class Windfield():
             if self.winddim<3 or len(self.iprof)==0 or len(self.lat)==0:
                 self.winddim = min(2,len(self.lat)) # Check for 0, 1D, 2D or 3D
 
+            self.cleargrid()
+
         return
+
+
+def isregular(axis):
+    """ Check whether the values of a sorted axis are regularly spaced """
+    return len(axis) < 3 or np.allclose(np.diff(axis), axis[1] - axis[0])
+
+
+def gridaxis(vmin, vmax, res):
+    """ Regularly spaced axis from vmin to vmax with a spacing of at most res """
+    return np.linspace(vmin, vmax, int(np.ceil((vmax - vmin) / res - 1e-9)) + 1)
+
+
+def gridindex(values, axis):
+    """ Indices of the grid points below and above values on a regularly
+        spaced axis, and the interpolation factor for the upper point """
+    if len(axis) == 1:
+        idx = zeros(len(values), dtype=int)
+        return idx, idx, zeros(len(values))
+    fidx = np.clip((values - axis[0]) / (axis[1] - axis[0]), 0., len(axis) - 1.)
+    i0 = minimum(floor(fidx).astype(int), len(axis) - 2)
+    return i0, i0 + 1, fidx - i0
@@ -52,6 +52,28 @@ class WindSim(Entity, Windfield, replaceable=True):
 
         return True
 
+    @command(name='WINDGRID')
+    def setgridded(self, flag: 'onoff' = None, res: float = None):
+        """ Interpolate the wind field from a regular lat/lon/altitude grid
+            (trilinear), instead of inverse-distance weighting over all
+            wind vectors for each position.
+
+            Arguments:
+            - flag: ON/OFF
+            - res: Grid spacing [deg] for scattered wind vectors. Vectors
+              that lie on a regular grid are used as they are.
+        """
+        if flag is None:
+            return True, f"WINDGRID is {'ON' if self.gridded else 'OFF'}, " + \
+                f"grid spacing {self.gridres} deg"
+        self.gridded = flag
+        if res is not None:
+            if res <= 0.0:
+                return False, "WINDGRID: grid spacing should be positive"
+            self.gridres = res
+        self.cleargrid()
+        return True
+
     @command(name='GETWIND')
     def get(self, lat: 'lat', lon: 'lon', alt: 'alt'=None):
         """ Get wind at a specified position (and optionally at altitude)
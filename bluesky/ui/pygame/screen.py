@@ -755,13 +755,13 @@ class Screen:
 
 
             # Draw conflicts: line from a/c to closest point of approach
-            nconf = len(bs.traf.cd.confpairs_unique)
-            n2conf = len(bs.traf.cd.confpairs)
+            nconf = len(bs.traf.cd.confunique)
+            n2conf = len(bs.traf.cd.confown)
 
             if nconf>0:
 
                 for j in range(n2conf):
-                    i = bs.traf.id2idx(bs.traf.cd.confpairs[j][0])
+                    i = bs.traf.cd.confown[j]
                     if i>=0 and i<bs.traf.ntraf and (i in trafsel):
                         latcpa, loncpa = geo.kwikpos(bs.traf.lat[i], bs.traf.lon[i], \
                                                     bs.traf.trk[i], bs.traf.cd.tcpamax[j] * bs.traf.gs[i] / nm)
@@ -874,13 +874,13 @@ class Screen:
                                  "Freq=" + str(int(len(self.dts) / max(0.001, sum(self.dts)))))
 
             self.fontsys.printat(self.win, 10+240, 2, \
-                                 "#LOS      = " + str(len(bs.traf.cd.lospairs_unique)))
+                                 "#LOS      = " + str(len(bs.traf.cd.losunique)))
             self.fontsys.printat(self.win, 10+240, 18, \
-                                 "Total LOS = " + str(len(bs.traf.cd.lospairs_all)))
+                                 "Total LOS = " + str(bs.traf.cd.nlos_tot))
             self.fontsys.printat(self.win, 10+240, 34, \
-                                 "#Con      = " + str(len(bs.traf.cd.confpairs_unique)))
+                                 "#Con      = " + str(len(bs.traf.cd.confunique)))
             self.fontsys.printat(self.win, 10+240, 50, \
-                                 "Total Con = " + str(len(bs.traf.cd.confpairs_all)))
+                                 "Total Con = " + str(bs.traf.cd.nconf_tot))
 
             # Frame ready, flip to screen
             pg.display.flip()
@@ -100,7 +100,7 @@ class Area(Entity):
         self.exparea = ''
         self.swtaxi = True  # Default ON: Doesn't do anything. See comments of set_taxi function below.
         self.swtaxialt = 1500.0  # Default alt for TAXI OFF
-        self.prevconfpairs = set()
+        self.prevconfkeys = np.array([], dtype=np.int64)
         self.confinside_all = 0
 
         # The FLST logger
@@ -161,28 +161,27 @@ class Area(Entity):
             # Store statistics for all new conflict pairs
             # Conflict pairs detected in the current timestep that were not yet
             # present in the previous timestep
-            confpairs_new = list(set(traf.cd.confpairs) - self.prevconfpairs)
-            if confpairs_new:
+            confnew = np.isin(traf.cd.confkey, self.prevconfkeys, invert=True)
+            if np.any(confnew):
                 # If necessary: select conflict geometry parameters for new conflicts
-                # idxdict = dict((v, i) for i, v in enumerate(traf.cd.confpairs))
-                # idxnew = [idxdict.get(i) for i in confpairs_new]
-                # dcpa_new = np.asarray(traf.cd.dcpa)[idxnew]
-                # tcpa_new = np.asarray(traf.cd.tcpa)[idxnew]
-                # tLOS_new = np.asarray(traf.cd.tLOS)[idxnew]
-                # qdr_new = np.asarray(traf.cd.qdr)[idxnew]
-                # dist_new = np.asarray(traf.cd.dist)[idxnew]
+                # dcpa_new = traf.cd.dcpa[confnew]
+                # tcpa_new = traf.cd.tcpa[confnew]
+                # tLOS_new = traf.cd.tLOS[confnew]
+                # qdr_new = traf.cd.qdr[confnew]
+                # dist_new = traf.cd.dist[confnew]
 
-                newconf_unique = {frozenset(pair) for pair in confpairs_new}
-                ac1, ac2 = zip(*newconf_unique)
-                idx1 = traf.id2idx(ac1)
-                idx2 = traf.id2idx(ac2)
-                newconf_inside = np.logical_or(insexp[idx1], insexp[idx2])
+                # Count each new conflict pair only once
+                idx1 = traf.cd.confown[confnew]
+                idx2 = traf.cd.confint[confnew]
+                _, iunique = np.unique(traf.cd.uniquekey(traf.cd.uid[idx1], traf.cd.uid[idx2]),
+                                       return_index=True)
+                newconf_inside = np.logical_or(insexp[idx1[iunique]], insexp[idx2[iunique]])
 
                 nnewconf_exp = np.count_nonzero(newconf_inside)
                 if nnewconf_exp:
                     self.confinside_all += nnewconf_exp
                     self.conflog.log(self.confinside_all)
-            self.prevconfpairs = set(traf.cd.confpairs)
+            self.prevconfkeys = traf.cd.confkey
 
             # Register distance values upon entry of experiment area
             newentries = np.logical_not(self.insexp) * insexp
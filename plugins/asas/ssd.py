@@ -1,8 +1,15 @@
 ''' Conflict resolution based on the SSD algorithm. '''
+import os
+import site
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.spatial import cKDTree
+import bluesky as bs
 from bluesky.traffic.asas import ConflictResolution
 from bluesky.tools import geo
 from bluesky.tools.aero import nm
-import numpy as np
 # Try to import pyclipper
 try:
     import pyclipper
@@ -10,6 +17,24 @@ except ImportError:
     print("Could not import pyclipper, RESO SSD will not function")
 
 
+# Number of worker processes for SSD construction (0 = number of cores,
+# 1 = construct the SSDs in the simulation process)
+bs.settings.set_variable_defaults(asas_ssdworkers=0)
+
+# Minimum number of SSDs to construct before a process pool is used
+MINPOOL = 16
+# Process pool for SSD construction, created when it is first needed. The
+# workers are spawned rather than forked, because forking the multithreaded
+# simulation process can deadlock the workers.
+pool = None
+
+# Discretize the circles using points on circle
+N_angle = 180  # [-] Number of points on circle (discretization)
+angles = np.arange(0, 2 * np.pi, 2 * np.pi / N_angle)
+# Put points of unit-circle in a (180x2)-array (CW)
+xyc = np.transpose(np.reshape(np.concatenate((np.sin(angles), np.cos(angles))), (2, N_angle)))
+
+
 # TODO: not completely migrated yet to class-based implementation
 
 
@@ -30,6 +55,10 @@ def init_plugin():
 
 
 class SSD(ConflictResolution):
+    def reset(self):
+        super().reset()
+        shutdownpool()
+
     def setprio(self, flag=None, priocode=''):
         '''Set the prio switch and the type of prio '''
         if flag is None:
@@ -136,24 +165,16 @@ class SSD(ConflictResolution):
 
     def constructSSD(self, conf, ownship, priocode="RS1"):
         """ Calculates the FRV and ARV of the SSD """
-        N = 0
         # Parameters
-        N_angle = 180  # [-] Number of points on circle (discretization)
         hsep = conf.rpz  # [m] Horizontal separation (5 NM)
         margin = self.resofach  # [-] Safety margin for evasion
-        hsepm = hsep * margin  # [m] Horizontal separation with safety margin
-        alpham = 0.4999 * np.pi  # [rad] Maximum half-angle for VO
-        betalos = np.pi / 4  # [rad] Minimum divertion angle for LOS (45 deg seems optimal)
         adsbmax = 65. * nm  # [m] Maximum ADS-B range
-        beta = np.pi / 4 + betalos / 2
         if priocode == "RS7" or priocode == "RS8":
             adsbmax /= 2
 
         # Relevant info from traf
         gsnorth = ownship.gsnorth
         gseast = ownship.gseast
-        lat = ownship.lat
-        lon = ownship.lon
         ntraf = ownship.ntraf
         hdg = ownship.hdg
         gs_ap = ownship.ap.tas
@@ -169,299 +190,50 @@ class SSD(ConflictResolution):
         FRV_area_loc = np.zeros(ownship.ntraf, dtype=np.float32)
         ARV_area_loc = np.zeros(ownship.ntraf, dtype=np.float32)
 
-        # # Use velocity limits for the ring-shaped part of the SSD
-        # Discretize the circles using points on circle
-        angles = np.arange(0, 2 * np.pi, 2 * np.pi / N_angle)
-        # Put points of unit-circle in a (180x2)-array (CW)
-        xyc = np.transpose(np.reshape(np.concatenate((np.sin(angles), np.cos(angles))), (2, N_angle)))
-
         # If no traffic
         if ntraf == 0:
             return
 
-        # # If only one aircraft
-        # elif ntraf == 1:
-        #     # Map them into the format ARV wants. Outercircle CCW, innercircle CW
-        #     ARV_loc[0] = circle_lst
-        #     FRV_loc[0] = []
-        #     ARV_calc_loc[0] = ARV_loc[0]
-        #     # Calculate areas and store in asas
-        #     FRV_area_loc[0] = 0
-        #     ARV_area_loc[0] = np.pi * (vmax ** 2 - vmin ** 2)
-        #     return
-
-        # Function qdrdist_matrix needs 4 vectors as input (lat1,lon1,lat2,lon2)
-        # To be efficient, calculate all qdr and dist in one function call
-        # Example with ntraf = 5:   ind1 = [0,0,0,0,1,1,1,2,2,3]
-        #                           ind2 = [1,2,3,4,2,3,4,3,4,4]
-        # This way the qdrdist is only calculated once between every aircraft
-        # To get all combinations, use this function to get the indices
-        ind1, ind2 = self.qdrdist_matrix_indices(ntraf)
-        # Get absolute bearing [deg] and distance [nm]
-        # Not sure abs/rel, but qdr is defined from [-180,180] deg, w.r.t. North
-        [qdr, dist] = geo.qdrdist_matrix(lat[ind1], lon[ind1], lat[ind2], lon[ind2])
-        # Put result of function from matrix to ndarray
-        qdr = np.reshape(np.array(qdr), np.shape(ind1))
-        dist = np.reshape(np.array(dist), np.shape(ind1))
-        # SI-units from [deg] to [rad]
-        qdr = np.deg2rad(qdr)
-        # Get distance from [nm] to [m]
-        dist = dist * nm
-
-        # In LoS the VO can't be defined, act as if dist is on edge
-        dist[dist < hsepm] = hsepm
-
-        # Calculate vertices of Velocity Obstacle (CCW)
-        # These are still in relative velocity space, see derivation in appendix
-        # Half-angle of the Velocity obstacle [rad]
-        # Include safety margin
-        alpha = np.arcsin(hsepm / dist)
-        # Limit half-angle alpha to 89.982 deg. Ensures that VO can be constructed
-        alpha[alpha > alpham] = alpham
-        # Relevant sin/cos/tan
-        sinqdr = np.sin(qdr)
-        cosqdr = np.cos(qdr)
-        tanalpha = np.tan(alpha)
-        cosqdrtanalpha = cosqdr * tanalpha
-        sinqdrtanalpha = sinqdr * tanalpha
-
-        # Consider every aircraft
-        for i in range(ntraf):
-            # Calculate SSD only for aircraft in conflict (See formulas appendix)
-            if conf.inconf[i]:
-
-                vmin = ownship.perf.vmin[i]
-                vmax = ownship.perf.vmax[i]
-
-                # in the first time step, ASAS runs before perf, which means that his value will be zero
-                # and the SSD cannot be constructed
-                if vmin == vmax == 0:
-                    continue
-
-                # Map them into the format pyclipper wants. Outercircle CCW, innercircle CW
-                circle_tup = (tuple(map(tuple, np.flipud(xyc * vmax))), tuple(map(tuple, xyc * vmin)))
-                circle_lst = [list(map(list, np.flipud(xyc * vmax))), list(map(list, xyc * vmin))]
-
-                # Relevant x1,y1,x2,y2 (x0 and y0 are zero in relative velocity space)
-                x1 = (sinqdr + cosqdrtanalpha) * 2 * vmax
-                x2 = (sinqdr - cosqdrtanalpha) * 2 * vmax
-                y1 = (cosqdr - sinqdrtanalpha) * 2 * vmax
-                y2 = (cosqdr + sinqdrtanalpha) * 2 * vmax
-
-                # SSD for aircraft i
-                # Get indices that belong to aircraft i
-                ind = np.where(np.logical_or(ind1 == i, ind2 == i))[0]
-                # Check whether there are any aircraft in the vicinity
-                if len(ind) == 0:
-                    # No aircraft in the vicinity
-                    # Map them into the format ARV wants. Outercircle CCW, innercircle CW
-                    ARV_loc[i] = circle_lst
-                    FRV_loc[i] = []
-                    ARV_calc_loc[i] = ARV_loc[i]
-                    # Calculate areas and store in asas
-                    FRV_area_loc[i] = 0
-                    ARV_area_loc[i] = np.pi * (vmax ** 2 - vmin ** 2)
+        # Calculate SSD only for aircraft in conflict (See formulas appendix)
+        # In the first time step, ASAS runs before perf, which means that vmin
+        # and vmax will be zero and the SSD cannot be constructed
+        vmin = ownship.perf.vmin
+        vmax = ownship.perf.vmax
+        own = np.flatnonzero(conf.inconf & ~((vmin == 0) & (vmax == 0)))
+
+        # Intruders within ADS-B range of each ownship, pruned with a spatial
+        # index before any geometry is built
+        own_pair, i_other, qdr, dist = adsbpairs(ownship, own, adsbmax)
+        start = np.searchsorted(own_pair, own)
+        end = np.searchsorted(own_pair, own, side='right')
+        # VO from 2 to 1 is mirror of 1 to 2. qdr and dist are calculated from
+        # the aircraft with the lowest index, so need a correction vector that
+        # will mirror the VO
+        fix = np.where(i_other < own_pair, -1., 1.)
+        hsepm = np.maximum(hsep[own_pair], hsep[i_other]) * margin
+
+        # Construct the SSD of each ownship
+        arglist = [(priocode, vmin[i], vmax[i], hdg[i], gs_ap[i], apeast[i], apnorth[i],
+                    gseast[i], gsnorth[i], i_other[i0:i1], qdr[i0:i1], dist[i0:i1],
+                    hsepm[i0:i1], fix[i0:i1], gseast[i_other[i0:i1]], gsnorth[i_other[i0:i1]],
+                    hdg[i_other[i0:i1]]) for i, i0, i1 in zip(own, start, end)]
+        results = ssdmap(ssdownship, arglist)
+
+        for i, i0, i1, result in zip(own, start, end, results):
+            FRV, ARV, ARV_calc, FRV_area, ARV_area, inconf2, ap_free = result
+            FRV_loc[i] = FRV
+            ARV_loc[i] = ARV
+            ARV_calc_loc[i] = ARV_calc
+            FRV_area_loc[i] = FRV_area
+            ARV_area_loc[i] = ARV_area
+            if ntraf > 1:
+                if not priocode == "RS7" and not priocode == "RS8":
+                    # Put it in class-object (not for RS7 and RS8)
+                    conf.inrange[i] = i_other[i0:i1]
                 else:
-                    # The i's of the other aircraft
-                    i_other = np.delete(np.arange(0, ntraf), i)
-                    # Aircraft that are within ADS-B range
-                    ac_adsb = np.where(dist[ind] < adsbmax)[0]
-                    # Now account for ADS-B range in indices of other aircraft (i_other)
-                    ind = ind[ac_adsb]
-                    i_other = i_other[ac_adsb]
-                    if not priocode == "RS7" and not priocode == "RS8":
-                        # Put it in class-object (not for RS7 and RS8)
-                        conf.inrange[i] = i_other
-                    else:
-                        conf.inrange2[i] = i_other
-                    # VO from 2 to 1 is mirror of 1 to 2. Only 1 to 2 can be constructed in
-                    # this manner, so need a correction vector that will mirror the VO
-                    fix = np.ones(np.shape(i_other))
-                    fix[i_other < i] = -1
-                    # Relative bearing [deg] from [-180,180]
-                    # (less required conversions than rad in RotA)
-                    fix_ang = np.zeros(np.shape(i_other))
-                    fix_ang[i_other < i] = 180.
-
-                    # Get vertices in an x- and y-array of size (ntraf-1)*3x1
-                    x = np.concatenate((gseast[i_other],
-                                        x1[ind] * fix + gseast[i_other],
-                                        x2[ind] * fix + gseast[i_other]))
-                    y = np.concatenate((gsnorth[i_other],
-                                        y1[ind] * fix + gsnorth[i_other],
-                                        y2[ind] * fix + gsnorth[i_other]))
-                    # Reshape [(ntraf-1)x3] and put arrays in one array [(ntraf-1)x3x2]
-                    x = np.transpose(x.reshape(3, np.shape(i_other)[0]))
-                    y = np.transpose(y.reshape(3, np.shape(i_other)[0]))
-                    xy = np.dstack((x, y))
-
-                    # Make a clipper object
-                    pc = pyclipper.Pyclipper()
-                    # Add circles (ring-shape) to clipper as subject
-                    pc.AddPaths(pyclipper.scale_to_clipper(circle_tup), pyclipper.PT_SUBJECT, True)
-
-                    # Extra stuff needed for RotA
-                    if priocode == "RS6":
-                        # Make another clipper object for RotA
-                        pc_rota = pyclipper.Pyclipper()
-                        pc_rota.AddPaths(pyclipper.scale_to_clipper(circle_tup), pyclipper.PT_SUBJECT, True)
-                        # Bearing calculations from own view and other view
-                        brg_own = np.mod((np.rad2deg(qdr[ind]) + fix_ang - hdg[i]) + 540., 360.) - 180.
-                        brg_other = np.mod((np.rad2deg(qdr[ind]) + 180. - fix_ang - hdg[i_other]) + 540., 360.) - 180.
-
-                    # Add each other other aircraft to clipper as clip
-                    for j in range(np.shape(i_other)[0]):
-                        ## Debug prints
-                        ## print(traf.id[i] + " - " + traf.id[i_other[j]])
-                        ## print(dist[ind[j]])
-                        # Scale VO when not in LOS
-                        if dist[ind[j]] > hsepm:
-                            # Normally VO shall be added of this other a/c
-                            VO = pyclipper.scale_to_clipper(tuple(map(tuple, xy[j, :, :])))
-                        else:
-                            # Pair is in LOS, instead of triangular VO, use darttip
-                            # Check if bearing should be mirrored
-                            if i_other[j] < i:
-                                qdr_los = qdr[ind[j]] + np.pi
-                            else:
-                                qdr_los = qdr[ind[j]]
-                            # Length of inner-leg of darttip
-                            leg = 1.1 * vmax / np.cos(beta) * np.array([1, 1, 1, 0])
-                            # Angles of darttip
-                            angles_los = np.array([qdr_los + 2 * beta, qdr_los, qdr_los - 2 * beta, 0.])
-                            # Calculate coordinates (CCW)
-                            x_los = leg * np.sin(angles_los)
-                            y_los = leg * np.cos(angles_los)
-                            # Put in array of correct format
-                            xy_los = np.vstack((x_los, y_los)).T
-                            # Scale darttip
-                            VO = pyclipper.scale_to_clipper(tuple(map(tuple, xy_los)))
-                        # Add scaled VO to clipper
-                        pc.AddPath(VO, pyclipper.PT_CLIP, True)
-                        # For RotA it is possible to ignore
-                        if priocode == "RS6":
-                            if brg_own[j] >= -20. and brg_own[j] <= 110.:
-                                # Head-on or converging from right
-                                pc_rota.AddPath(VO, pyclipper.PT_CLIP, True)
-                            elif brg_other[j] <= -110. or brg_other[j] >= 110.:
-                                # In overtaking position
-                                pc_rota.AddPath(VO, pyclipper.PT_CLIP, True)
-                        # Detect conflicts for smaller layer in RS7 and RS8
-                        if priocode == "RS7" or priocode == "RS8":
-                            if pyclipper.PointInPolygon(pyclipper.scale_to_clipper((gseast[i], gsnorth[i])), VO):
-                                conf.inconf2[i] = True
-                        if priocode == "RS5":
-                            if pyclipper.PointInPolygon(pyclipper.scale_to_clipper((apeast[i], apnorth[i])), VO):
-                                conf.ap_free[i] = False
-
-                    # Execute clipper command
-                    FRV = pyclipper.scale_from_clipper(
-                        pc.Execute(pyclipper.CT_INTERSECTION, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO))
-
-                    ARV = pc.Execute(pyclipper.CT_DIFFERENCE, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO)
-
-                    if not priocode == "RS1" and not priocode == "RS5" and not priocode == "RS7" and not priocode == "RS8":
-                        # Make another clipper object for extra intersections
-                        pc2 = pyclipper.Pyclipper()
-                        # When using RotA clip with pc_rota
-                        if priocode == "RS6":
-                            # Calculate ARV for RotA
-                            ARV_rota = pc_rota.Execute(pyclipper.CT_DIFFERENCE, pyclipper.PFT_NONZERO,
-                                                       pyclipper.PFT_NONZERO)
-                            if len(ARV_rota) > 0:
-                                pc2.AddPaths(ARV_rota, pyclipper.PT_CLIP, True)
-                        else:
-                            # Put the ARV in there, make sure it's not empty
-                            if len(ARV) > 0:
-                                pc2.AddPaths(ARV, pyclipper.PT_CLIP, True)
-
-                    # Scale back
-                    ARV = pyclipper.scale_from_clipper(ARV)
-
-                    # Check if ARV or FRV is empty
-                    if len(ARV) == 0:
-                        # No aircraft in the vicinity
-                        # Map them into the format ARV wants. Outercircle CCW, innercircle CW
-                        ARV_loc[i] = []
-                        FRV_loc[i] = circle_lst
-                        ARV_calc_loc[i] = []
-                        # Calculate areas and store in asas
-                        FRV_area_loc[i] = np.pi * (vmax ** 2 - vmin ** 2)
-                        ARV_area_loc[i] = 0
-                    elif len(FRV) == 0:
-                        # Should not happen with one a/c or no other a/c in the vicinity.
-                        # These are handled earlier. Happens when RotA has removed all
-                        # Map them into the format ARV wants. Outercircle CCW, innercircle CW
-                        ARV_loc[i] = circle_lst
-                        FRV_loc[i] = []
-                        ARV_calc_loc[i] = circle_lst
-                        # Calculate areas and store in asas
-                        FRV_area_loc[i] = 0
-                        ARV_area_loc[i] = np.pi * (vmax ** 2 - vmin ** 2)
-                    else:
-                        # Check multi exteriors, if this layer is not a list, it means it has no exteriors
-                        # In that case, make it a list, such that its format is consistent with further code
-                        if not type(FRV[0][0]) == list:
-                            FRV = [FRV]
-                        if not type(ARV[0][0]) == list:
-                            ARV = [ARV]
-                        # Store in asas
-                        FRV_loc[i] = FRV
-                        ARV_loc[i] = ARV
-                        # Calculate areas and store in asas
-                        FRV_area_loc[i] = self.area(FRV)
-                        ARV_area_loc[i] = self.area(ARV)
-
-                        # For resolution purposes sometimes extra intersections are wanted
-                        if priocode == "RS2" or priocode == "RS9" or priocode == "RS6" or priocode == "RS3" or priocode == "RS4":
-                            # Make a box that covers right or left of SSD
-                            own_hdg = hdg[i] * np.pi / 180
-                            # Efficient calculation of box, see notes
-                            if priocode == "RS2" or priocode == "RS6":
-                                # CW or right-turning
-                                sin_table = np.array([[1, 0], [-1, 0], [-1, -1], [1, -1]], dtype=np.float64)
-                                cos_table = np.array([[0, 1], [0, -1], [1, -1], [1, 1]], dtype=np.float64)
-                            elif priocode == "RS9":
-                                # CCW or left-turning
-                                sin_table = np.array([[1, 0], [1, 1], [-1, 1], [-1, 0]], dtype=np.float64)
-                                cos_table = np.array([[0, 1], [-1, 1], [-1, -1], [0, -1]], dtype=np.float64)
-                            # Overlay a part of the full SSD
-                            if priocode == "RS2" or priocode == "RS9" or priocode == "RS6":
-                                # Normalized coordinates of box
-                                xyp = np.sin(own_hdg) * sin_table + np.cos(own_hdg) * cos_table
-                                # Scale with vmax (and some factor) and put in tuple
-                                part = pyclipper.scale_to_clipper(tuple(map(tuple, 1.1 * vmax * xyp)))
-                                pc2.AddPath(part, pyclipper.PT_SUBJECT, True)
-                            elif priocode == "RS3":
-                                # Small ring
-                                xyp = (tuple(map(tuple, np.flipud(xyc * min(vmax, gs_ap[i] + 0.1)))),
-                                       tuple(map(tuple, xyc * max(vmin, gs_ap[i] - 0.1))))
-                                part = pyclipper.scale_to_clipper(xyp)
-                                pc2.AddPaths(part, pyclipper.PT_SUBJECT, True)
-                            elif priocode == "RS4":
-                                hdg_sel = hdg[i] * np.pi / 180
-                                xyp = np.array([[np.sin(hdg_sel - 0.0087), np.cos(hdg_sel - 0.0087)],
-                                                [0, 0],
-                                                [np.sin(hdg_sel + 0.0087), np.cos(hdg_sel + 0.0087)]],
-                                               dtype=np.float64)
-                                part = pyclipper.scale_to_clipper(tuple(map(tuple, 1.1 * vmax * xyp)))
-                                pc2.AddPath(part, pyclipper.PT_SUBJECT, True)
-                            # Execute clipper command
-                            ARV_calc = pyclipper.scale_from_clipper(
-                                pc2.Execute(pyclipper.CT_INTERSECTION, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO))
-                            N += 1
-                            # If no smaller ARV is found, take the full ARV
-                            if len(ARV_calc) == 0:
-                                ARV_calc = ARV
-                            # Check multi exteriors, if this layer is not a list, it means it has no exteriors
-                            # In that case, make it a list, such that its format is consistent with further code
-                            if not type(ARV_calc[0][0]) == list:
-                                ARV_calc = [ARV_calc]
-                        # Shortest way out prio, so use full SSD (ARV_calc = ARV)
-                        else:
-                            ARV_calc = ARV
-                        # Update calculatable ARV for resolutions
-                        ARV_calc_loc[i] = ARV_calc
+                    conf.inrange2[i] = i_other[i0:i1]
+            conf.inconf2[i] |= inconf2
+            conf.ap_free[i] &= ap_free
 
         # If sequential approach, the local should go elsewhere
         if not priocode == "RS7" and not priocode == "RS8":
@@ -605,33 +377,7 @@ class SSD(ConflictResolution):
 
     def area(self, vset):
         """ This function calculates the area of the set of FRV or ARV """
-        # Initialize A as it could be calculated iteratively
-        A = 0
-        # Check multiple exteriors
-        if type(vset[0][0]) == list:
-            # Calc every exterior separately
-            for i in range(len(vset)):
-                A += pyclipper.scale_from_clipper(
-                    pyclipper.scale_from_clipper(pyclipper.Area(pyclipper.scale_to_clipper(vset[i]))))
-        else:
-            # Single exterior
-            A = pyclipper.scale_from_clipper(
-                pyclipper.scale_from_clipper(pyclipper.Area(pyclipper.scale_to_clipper(vset))))
-        return A
-
-
-    def qdrdist_matrix_indices(self, ntraf):
-        """ This function gives the indices that can be used in the lon/lat-vectors """
-        # The indices will be n*(n-1)/2 long
-        # Only works for n >= 2, which is logical...
-        # This is faster than np.triu_indices :)
-        tmp_range = np.arange(ntraf - 1, dtype=np.int32)
-        ind1 = np.repeat(tmp_range, (tmp_range + 1)[::-1])
-        ind2 = np.ones(ind1.shape[0], dtype=np.int32)
-        inds = np.cumsum(tmp_range[1:][::-1] + 1)
-        np.put(ind2, inds, np.arange(ntraf * -1 + 3, 1))
-        ind2 = np.cumsum(ind2, out=ind2)
-        return ind1, ind2
+        return area(vset)
 
 
     def minTLOS(self, conf, ownship, i, i_other, x1, y1, x, y):
@@ -661,7 +407,8 @@ class SSD(ConflictResolution):
         # CPA distance
         dcpa2 = np.square(np.dot(dist.reshape((L, 1)), np.ones((1, W)))) - np.square(tcpa) * vrel2
         # Calculate time to LOS
-        R2 = conf.rpz * conf.rpz
+        rpz = np.maximum(conf.rpz[i], conf.rpz[i_other]).reshape((L, 1))
+        R2 = rpz * rpz
         swhorconf = dcpa2 < R2
         dxinhor = np.sqrt(np.maximum(0, R2 - dcpa2))
         dtinhor = dxinhor / np.sqrt(vrel2)
@@ -670,4 +417,289 @@ class SSD(ConflictResolution):
         # Get index of best solution
         idx = np.argmax(np.sum(tinhor, 0))
 
-        return idx
\ No newline at end of file
+        return idx
+
+
+def area(vset):
+    """ This function calculates the area of the set of FRV or ARV """
+    # Initialize A as it could be calculated iteratively
+    A = 0
+    # Check multiple exteriors
+    if type(vset[0][0]) == list:
+        # Calc every exterior separately
+        for i in range(len(vset)):
+            A += pyclipper.scale_from_clipper(
+                pyclipper.scale_from_clipper(pyclipper.Area(pyclipper.scale_to_clipper(vset[i]))))
+    else:
+        # Single exterior
+        A = pyclipper.scale_from_clipper(
+            pyclipper.scale_from_clipper(pyclipper.Area(pyclipper.scale_to_clipper(vset))))
+    return A
+
+
+def adsbpairs(ownship, own, adsbmax):
+    """ Find all aircraft within ADS-B range of the (sorted) ownships own.
+        Returns the pair indices (ownship, other) sorted by ownship and
+        other, and qdr [rad] and dist [m] of each pair. These are calculated
+        from the aircraft with the lowest index to the other, as in the
+        original all-pairs calculation. """
+    if len(own) == 0 or ownship.ntraf < 2:
+        return np.array([], dtype=int), np.array([], dtype=int), np.array([]), np.array([])
+
+    # Spatial index of all aircraft positions as unit vectors
+    lat = np.radians(ownship.lat)
+    lon = np.radians(ownship.lon)
+    xyz = np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+    # Chord of adsbmax on the smallest earth radius, with some margin,
+    # is always larger than the WGS'84 distance used below
+    chord = 2.0 * np.sin(0.5 * adsbmax / 6356752.0) * 1.01
+    neighbours = cKDTree(xyz).query_ball_point(xyz[own], chord)
+
+    own_pair = np.repeat(own, [len(n) for n in neighbours])
+    i_other = np.concatenate(neighbours).astype(int)
+    order = np.lexsort((i_other, own_pair))
+    own_pair, i_other = own_pair[order], i_other[order]
+    notself = own_pair != i_other
+    own_pair, i_other = own_pair[notself], i_other[notself]
+
+    # Get absolute bearing [deg] and distance [nm]
+    ind1 = np.minimum(own_pair, i_other)
+    ind2 = np.maximum(own_pair, i_other)
+    qdr, dist = geo.qdrdist_matrix(ownship.lat[ind1], ownship.lon[ind1],
+                                   ownship.lat[ind2], ownship.lon[ind2])
+    # SI-units from [deg] to [rad], and from [nm] to [m]
+    qdr = np.deg2rad(np.asarray(qdr).ravel())
+    dist = np.asarray(dist).ravel() * nm
+
+    # Aircraft that are within ADS-B range
+    inrange = dist < adsbmax
+    return own_pair[inrange], i_other[inrange], qdr[inrange], dist[inrange]
+
+
+def ssdmap(fun, arglist):
+    """ Map fun over arglist, in a pool of worker processes if there are
+        enough items. """
+    global pool
+    nworkers = bs.settings.asas_ssdworkers or os.cpu_count() or 1
+    if nworkers < 2 or len(arglist) < MINPOOL:
+        return map(fun, arglist)
+    if pool is None or pool[0] != nworkers:
+        shutdownpool()
+        # Plugins are not on the module search path: add the folder of this
+        # module in the workers, so that they can import fun
+        pool = (nworkers, ProcessPoolExecutor(nworkers, mp_context=multiprocessing.get_context('spawn'),
+                                              initializer=site.addsitedir,
+                                              initargs=(os.path.dirname(os.path.abspath(__file__)),)))
+    return pool[1].map(fun, arglist, chunksize=max(1, len(arglist) // (4 * nworkers)))
+
+
+@atexit.register
+def shutdownpool():
+    """ Stop the worker processes of the SSD construction pool. """
+    global pool
+    if pool is not None:
+        pool[1].shutdown(wait=False, cancel_futures=True)
+        pool = None
+
+
+def ssdownship(args):
+    """ Calculates the FRV and ARV of the SSD of one aircraft from the
+        states of the aircraft within ADS-B range. Returns FRV, ARV,
+        ARV_calc, their areas, and the inconf2 and ap_free flags. """
+    priocode, vmin, vmax, hdg, gs_ap, apeast, apnorth, gseast, gsnorth, \
+        i_other, qdr, dist, hsepm, fix, gseast_o, gsnorth_o, hdg_o = args
+    alpham = 0.4999 * np.pi  # [rad] Maximum half-angle for VO
+    betalos = np.pi / 4  # [rad] Minimum divertion angle for LOS (45 deg seems optimal)
+    beta = np.pi / 4 + betalos / 2
+    inconf2 = False
+    ap_free = True
+
+    # Map them into the format pyclipper wants. Outercircle CCW, innercircle CW
+    circle_tup = (tuple(map(tuple, np.flipud(xyc * vmax))), tuple(map(tuple, xyc * vmin)))
+    circle_lst = [list(map(list, np.flipud(xyc * vmax))), list(map(list, xyc * vmin))]
+
+    # Check whether there are any aircraft in the vicinity
+    if len(i_other) == 0:
+        # No aircraft in the vicinity
+        # Map them into the format ARV wants. Outercircle CCW, innercircle CW
+        return [], circle_lst, circle_lst, 0, np.pi * (vmax ** 2 - vmin ** 2), inconf2, ap_free
+
+    # In LoS the VO can't be defined, act as if dist is on edge
+    dist = np.maximum(dist, hsepm)
+
+    # Calculate vertices of Velocity Obstacle (CCW)
+    # These are still in relative velocity space, see derivation in appendix
+    # Half-angle of the Velocity obstacle [rad]
+    # Include safety margin
+    alpha = np.arcsin(hsepm / dist)
+    # Limit half-angle alpha to 89.982 deg. Ensures that VO can be constructed
+    alpha[alpha > alpham] = alpham
+    # Relevant sin/cos/tan
+    sinqdr = np.sin(qdr)
+    cosqdr = np.cos(qdr)
+    tanalpha = np.tan(alpha)
+    cosqdrtanalpha = cosqdr * tanalpha
+    sinqdrtanalpha = sinqdr * tanalpha
+
+    # Relevant x1,y1,x2,y2 (x0 and y0 are zero in relative velocity space)
+    x1 = (sinqdr + cosqdrtanalpha) * 2 * vmax
+    x2 = (sinqdr - cosqdrtanalpha) * 2 * vmax
+    y1 = (cosqdr - sinqdrtanalpha) * 2 * vmax
+    y2 = (cosqdr + sinqdrtanalpha) * 2 * vmax
+
+    # Relative bearing [deg] from [-180,180]
+    # (less required conversions than rad in RotA)
+    fix_ang = np.where(fix < 0, 180., 0.)
+
+    # Get vertices in an [(nother)x3x2] array
+    x = np.column_stack((gseast_o, x1 * fix + gseast_o, x2 * fix + gseast_o))
+    y = np.column_stack((gsnorth_o, y1 * fix + gsnorth_o, y2 * fix + gsnorth_o))
+    xy = np.dstack((x, y))
+
+    # Make a clipper object
+    pc = pyclipper.Pyclipper()
+    # Add circles (ring-shape) to clipper as subject
+    pc.AddPaths(pyclipper.scale_to_clipper(circle_tup), pyclipper.PT_SUBJECT, True)
+
+    # Extra stuff needed for RotA
+    if priocode == "RS6":
+        # Make another clipper object for RotA
+        pc_rota = pyclipper.Pyclipper()
+        pc_rota.AddPaths(pyclipper.scale_to_clipper(circle_tup), pyclipper.PT_SUBJECT, True)
+        # Bearing calculations from own view and other view
+        brg_own = np.mod((np.rad2deg(qdr) + fix_ang - hdg) + 540., 360.) - 180.
+        brg_other = np.mod((np.rad2deg(qdr) + 180. - fix_ang - hdg_o) + 540., 360.) - 180.
+
+    # Add each other other aircraft to clipper as clip
+    for j in range(len(i_other)):
+        # Scale VO when not in LOS
+        if dist[j] > hsepm[j]:
+            # Normally VO shall be added of this other a/c
+            VO = pyclipper.scale_to_clipper(tuple(map(tuple, xy[j, :, :])))
+        else:
+            # Pair is in LOS, instead of triangular VO, use darttip
+            # Check if bearing should be mirrored
+            if fix[j] < 0:
+                qdr_los = qdr[j] + np.pi
+            else:
+                qdr_los = qdr[j]
+            # Length of inner-leg of darttip
+            leg = 1.1 * vmax / np.cos(beta) * np.array([1, 1, 1, 0])
+            # Angles of darttip
+            angles_los = np.array([qdr_los + 2 * beta, qdr_los, qdr_los - 2 * beta, 0.])
+            # Calculate coordinates (CCW)
+            x_los = leg * np.sin(angles_los)
+            y_los = leg * np.cos(angles_los)
+            # Put in array of correct format
+            xy_los = np.vstack((x_los, y_los)).T
+            # Scale darttip
+            VO = pyclipper.scale_to_clipper(tuple(map(tuple, xy_los)))
+        # Add scaled VO to clipper
+        pc.AddPath(VO, pyclipper.PT_CLIP, True)
+        # For RotA it is possible to ignore
+        if priocode == "RS6":
+            if brg_own[j] >= -20. and brg_own[j] <= 110.:
+                # Head-on or converging from right
+                pc_rota.AddPath(VO, pyclipper.PT_CLIP, True)
+            elif brg_other[j] <= -110. or brg_other[j] >= 110.:
+                # In overtaking position
+                pc_rota.AddPath(VO, pyclipper.PT_CLIP, True)
+        # Detect conflicts for smaller layer in RS7 and RS8
+        if priocode == "RS7" or priocode == "RS8":
+            if pyclipper.PointInPolygon(pyclipper.scale_to_clipper((gseast, gsnorth)), VO):
+                inconf2 = True
+        if priocode == "RS5":
+            if pyclipper.PointInPolygon(pyclipper.scale_to_clipper((apeast, apnorth)), VO):
+                ap_free = False
+
+    # Execute clipper command
+    FRV = pyclipper.scale_from_clipper(
+        pc.Execute(pyclipper.CT_INTERSECTION, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO))
+
+    ARV = pc.Execute(pyclipper.CT_DIFFERENCE, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO)
+
+    if not priocode == "RS1" and not priocode == "RS5" and not priocode == "RS7" and not priocode == "RS8":
+        # Make another clipper object for extra intersections
+        pc2 = pyclipper.Pyclipper()
+        # When using RotA clip with pc_rota
+        if priocode == "RS6":
+            # Calculate ARV for RotA
+            ARV_rota = pc_rota.Execute(pyclipper.CT_DIFFERENCE, pyclipper.PFT_NONZERO,
+                                       pyclipper.PFT_NONZERO)
+            if len(ARV_rota) > 0:
+                pc2.AddPaths(ARV_rota, pyclipper.PT_CLIP, True)
+        else:
+            # Put the ARV in there, make sure it's not empty
+            if len(ARV) > 0:
+                pc2.AddPaths(ARV, pyclipper.PT_CLIP, True)
+
+    # Scale back
+    ARV = pyclipper.scale_from_clipper(ARV)
+
+    # Check if ARV or FRV is empty
+    if len(ARV) == 0:
+        # No aircraft in the vicinity
+        # Map them into the format ARV wants. Outercircle CCW, innercircle CW
+        return circle_lst, [], [], np.pi * (vmax ** 2 - vmin ** 2), 0, inconf2, ap_free
+    if len(FRV) == 0:
+        # Should not happen with one a/c or no other a/c in the vicinity.
+        # These are handled earlier. Happens when RotA has removed all
+        # Map them into the format ARV wants. Outercircle CCW, innercircle CW
+        return [], circle_lst, circle_lst, 0, np.pi * (vmax ** 2 - vmin ** 2), inconf2, ap_free
+
+    # Check multi exteriors, if this layer is not a list, it means it has no exteriors
+    # In that case, make it a list, such that its format is consistent with further code
+    if not type(FRV[0][0]) == list:
+        FRV = [FRV]
+    if not type(ARV[0][0]) == list:
+        ARV = [ARV]
+
+    # For resolution purposes sometimes extra intersections are wanted
+    if priocode == "RS2" or priocode == "RS9" or priocode == "RS6" or priocode == "RS3" or priocode == "RS4":
+        # Make a box that covers right or left of SSD
+        own_hdg = hdg * np.pi / 180
+        # Efficient calculation of box, see notes
+        if priocode == "RS2" or priocode == "RS6":
+            # CW or right-turning
+            sin_table = np.array([[1, 0], [-1, 0], [-1, -1], [1, -1]], dtype=np.float64)
+            cos_table = np.array([[0, 1], [0, -1], [1, -1], [1, 1]], dtype=np.float64)
+        elif priocode == "RS9":
+            # CCW or left-turning
+            sin_table = np.array([[1, 0], [1, 1], [-1, 1], [-1, 0]], dtype=np.float64)
+            cos_table = np.array([[0, 1], [-1, 1], [-1, -1], [0, -1]], dtype=np.float64)
+        # Overlay a part of the full SSD
+        if priocode == "RS2" or priocode == "RS9" or priocode == "RS6":
+            # Normalized coordinates of box
+            xyp = np.sin(own_hdg) * sin_table + np.cos(own_hdg) * cos_table
+            # Scale with vmax (and some factor) and put in tuple
+            part = pyclipper.scale_to_clipper(tuple(map(tuple, 1.1 * vmax * xyp)))
+            pc2.AddPath(part, pyclipper.PT_SUBJECT, True)
+        elif priocode == "RS3":
+            # Small ring
+            xyp = (tuple(map(tuple, np.flipud(xyc * min(vmax, gs_ap + 0.1)))),
+                   tuple(map(tuple, xyc * max(vmin, gs_ap - 0.1))))
+            part = pyclipper.scale_to_clipper(xyp)
+            pc2.AddPaths(part, pyclipper.PT_SUBJECT, True)
+        elif priocode == "RS4":
+            hdg_sel = hdg * np.pi / 180
+            xyp = np.array([[np.sin(hdg_sel - 0.0087), np.cos(hdg_sel - 0.0087)],
+                            [0, 0],
+                            [np.sin(hdg_sel + 0.0087), np.cos(hdg_sel + 0.0087)]],
+                           dtype=np.float64)
+            part = pyclipper.scale_to_clipper(tuple(map(tuple, 1.1 * vmax * xyp)))
+            pc2.AddPath(part, pyclipper.PT_SUBJECT, True)
+        # Execute clipper command
+        ARV_calc = pyclipper.scale_from_clipper(
+            pc2.Execute(pyclipper.CT_INTERSECTION, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO))
+        # If no smaller ARV is found, take the full ARV
+        if len(ARV_calc) == 0:
+            ARV_calc = ARV
+        # Check multi exteriors, if this layer is not a list, it means it has no exteriors
+        # In that case, make it a list, such that its format is consistent with further code
+        if not type(ARV_calc[0][0]) == list:
+            ARV_calc = [ARV_calc]
+    # Shortest way out prio, so use full SSD (ARV_calc = ARV)
+    else:
+        ARV_calc = ARV
+
+    return FRV, ARV, ARV_calc, area(FRV), area(ARV), inconf2, ap_free
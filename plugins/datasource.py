@@ -44,6 +44,8 @@ class DataSource(core.Entity):
     Date: 14-1-2022
     """
 
+    checkpointvars = ('sourcenames', 'sourceupdate', 'datasource')
+
     def __init__(self):
         super().__init__()
 
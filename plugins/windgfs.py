@@ -1,11 +1,12 @@
 import os
 import sys
+from datetime import datetime, timedelta
 import numpy as np
-import pandas as pd
 import pygrib
 import requests
 import bluesky as bs
-from bluesky import settings, stack
+from bluesky import settings
+from bluesky.tools.prefetch import Prefetcher
 
 settings.set_variable_defaults(
     windgfs_url="https://www.ncei.noaa.gov/data/global-forecast-system/access/historical/analysis/")
@@ -48,7 +49,8 @@ class WindGFS:
         self.lon0 = -180
         self.lat1 = 90
         self.lon1 = 180
-
+        # Wind data of (area, cycle, forecast hour), the next one is prefetched
+        self.loader = Prefetcher(self.loadwind)
 
     def fetch_grb(self, year, month, day, hour, pred=0):
         ym = "%04d%02d" % (year, month)
@@ -64,7 +66,7 @@ class WindGFS:
         remote_url = settings.windgfs_url + remote_loc
 
         if not os.path.isfile(fpath):
-            bs.scr.echo("Downloading file, please wait...")
+            # Runs on the prefetch thread: report on the console only
             print("Downloading %s" % remote_url)
 
             response = requests.get(remote_url, stream=True)
@@ -88,56 +90,74 @@ class WindGFS:
                         sys.stdout.write("\r[%s%s]" % ('=' * done, ' ' * (50-done)) )
                         sys.stdout.flush()
 
-        bs.scr.echo("Download completed.")
+            print("Download completed.")
         grb = pygrib.open(fpath)
 
         return grb
 
 
     def extract_wind(self, grb, lat0, lon0, lat1, lon1):
-
+        ''' Wind components [m/s] of the grid points within the area, at the
+            altitudes [m] of the pressure levels up to about 45 kft. '''
         grb_wind_v = grb.select(shortName="v", typeOfLevel=['isobaricInhPa'])
         grb_wind_u = grb.select(shortName="u", typeOfLevel=['isobaricInhPa'])
 
-        lats = np.array([])
-        lons = np.array([])
-        alts = np.array([])
-        vxs = np.array([])
-        vys = np.array([])
+        lat0_ = min(lat0, lat1)
+        lat1_ = max(lat0, lat1)
+        lon0_ = min(lon0, lon1)
+        lon1_ = max(lon0, lon1)
+
+        # All levels have the same grid
+        mask = None
+        alts = []
+        vns = []
+        ves = []
 
         for grbu, grbv in zip(grb_wind_u, grb_wind_v):
             level = grbu.level
 
             if level < 140:  # lesss than 140 hPa, above about 45 k ft
                 continue
-            else:
-                vxs_ = grbu.values
-                vys_ = grbv.values
 
-                p = level * 100
-                h = (1 - (p / 101325.0)**0.190264) * 44330.76923    # in meters
+            if mask is None:
+                lats, lons = grbu.latlons()
+                lats = lats.flatten()
+                lons = (lons.flatten() + 180) % 360.0 - 180.0     # convert range from 0~360 to -180~180
+                mask = (lats > lat0_) & (lats < lat1_) & (lons > lon0_) & (lons < lon1_)
 
-                lats_ = grbu.latlons()[0].flatten()
-                lons_ = grbu.latlons()[1].flatten()
-                alts_ = round(h) * np.ones(len(lats_))
+            p = level * 100
+            h = (1 - (p / 101325.0)**0.190264) * 44330.76923    # in meters
 
-                lats = np.append(lats, lats_)
-                lons = np.append(lons, lons_)
-                alts = np.append(alts, alts_)
-                vxs = np.append(vxs, vxs_)
-                vys = np.append(vys, vys_)
+            alts.append(round(h))
+            ves.append(np.asarray(grbu.values).flatten()[mask])
+            vns.append(np.asarray(grbv.values).flatten()[mask])
 
-        lons = (lons + 180) % 360.0 - 180.0     # convert range from 0~360 to -180~180
-
-        lat0_ = min(lat0, lat1)
-        lat1_ = max(lat0, lat1)
-        lon0_ = min(lon0, lon1)
-        lon1_ = max(lon0, lon1)
+        if mask is None:
+            return None
 
-        mask = (lats > lat0_) & (lats < lat1_) & (lons > lon0_) & (lons < lon1_)
+        return dict(lat=lats[mask], lon=lons[mask], alt=np.array(alts, dtype=float),
+                    vnorth=np.array(vns), veast=np.array(ves))
 
-        data = np.array([lats[mask], lons[mask], alts[mask], vxs[mask], vys[mask]])
+    def loadwind(self, key):
+        ''' Wind of key: (area, cycle, forecast hour), from the npz cache of
+            the area, or extracted from the (downloaded) GRIB file. '''
+        lat0, lon0, lat1, lon1, year, month, day, hour, pred = key
+        fpath = datadir + "gfswind_%04d%02d%02d_%02d00_%03d_%g_%g_%g_%g.npz" \
+            % (year, month, day, hour, pred, lat0, lon0, lat1, lon1)
+        if os.path.isfile(fpath):
+            with np.load(fpath) as npz:
+                return dict(npz)
 
+        grb = self.fetch_grb(year, month, day, hour, pred)
+        if grb is None:
+            return None
+        data = self.extract_wind(grb, lat0, lon0, lat1, lon1)
+        grb.close()
+        if data is not None:
+            try:
+                np.savez(fpath, **data)
+            except OSError as e:
+                print("Could not store wind data in %s: %s" % (fpath, e))
         return data
 
 
@@ -155,45 +175,45 @@ class WindGFS:
             self.year, self.month, self.day, self.hour =  args
 
 
-        # round hour to 3 hours, check if it is a +3h prediction
-        self.hour  = round(self.hour / 3) * 3
-        if self.hour in [3, 9, 15, 21]:
-            self.hour = self.hour - 3
-            pred = 3
-        else:
-            pred = 0
+        time = datetime(self.year, self.month, self.day, self.hour)
+        self.year, self.month, self.day, self.hour, pred = gfscycle(time)
 
         txt = "Loading wind field for %s-%s-%s %s:00..." % (self.year, self.month, self.day, self.hour)
         bs.scr.echo("%s" % txt)
 
-        grb = self.fetch_grb(self.year, self.month, self.day, self.hour, pred)
+        area = (min(self.lat0, self.lat1), min(self.lon0, self.lon1),
+                max(self.lat0, self.lat1), max(self.lon0, self.lon1))
+        data = self.loader.get(area + (self.year, self.month, self.day, self.hour, pred))
+        # Prefetch the wind field of the next update
+        self.loader.prefetch(area + gfscycle(time + timedelta(hours=3)))
 
-        if grb is None:
+        if data is None:
             return False, "Wind data not exist in area [%d, %d], [%d, %d]. " \
                 % (self.lat0, self.lat1, self.lon0, self.lon1) \
                 + "time: %04d-%02d-%02d %02d:00" \
                 % (self.year, self.month, self.day, self.hour)
 
-        # first clear exisiting wind field
-        stack.stack('DEL wind')
-
-        # add new wind field
-        data = self.extract_wind(grb, self.lat0, self.lon0, self.lat1, self.lon1)
-        df = pd.DataFrame(data.T, columns=['lat','lon','alt','vx','vy'])
-        df['dir'] = np.degrees(np.arctan2(df.vx, df.vy))
-        df['spd'] = np.sqrt(df.vx**2 + df.vy**2)
-
-        for (lat, lon), d in df.groupby(['lat', 'lon']):
-            cmd = "WIND %d,%d," % (lat, lon)
-            for idx, r in d.iterrows():
-                cmd += "%d,%d,%d," % (r.alt, r.dir, r.spd)
-            stack.stack(cmd)
+        # replace the wind field by the wind of the grid points
+        bs.traf.wind.clear()
+        bs.traf.wind.addpoints(data['lat'], data['lon'], data['vnorth'], data['veast'], data['alt'])
 
         return True, "Wind field update in area [%d, %d], [%d, %d]. " \
             % (self.lat0, self.lat1, self.lon0, self.lon1) \
             + "time: %04d-%02d-%02d %02d:00" \
-            % (self.year, self.month, self.day, self.hour)
+            % (self.year, self.month, self.day, self.hour) \
+            + " (%s)" % self.loader.info()
 
 
     def update(self):
         return self.create(self.lat0, self.lon0, self.lat1, self.lon1)
+
+
+def gfscycle(time):
+    ''' GFS cycle (year, month, day, hour) and forecast hour of the wind at
+        time: the time is rounded to 3 hours, and the +3h forecast of the
+        previous 6-hourly cycle is used for 3, 9, 15 and 21h. '''
+    time = time.replace(minute=0, second=0, microsecond=0, hour=0) + \
+        timedelta(hours=round(time.hour / 3) * 3)
+    pred = time.hour % 6
+    time -= timedelta(hours=pred)
+    return time.year, time.month, time.day, time.hour, pred
@@ -0,0 +1,102 @@
+"""
+Benchmark of the scaling of the conflict detection methods with the number
+of aircraft, in computation time and peak memory use.
+
+Random traffic is generated in an area of fixed size, so that the traffic
+density increases with the number of aircraft. Run from the BlueSky root
+directory:
+
+    python utils/benchmarks/cdbench.py [n1 n2 ...]
+
+The scaling of the multithreaded native implementation (CStateBasedMT) with
+the number of threads is benchmarked with:
+
+    python utils/benchmarks/cdbench.py --threads ntraf [t1 t2 ...]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+from types import SimpleNamespace
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+
+from bluesky import settings
+from bluesky.tools.aero import nm, ft
+from bluesky.traffic.asas import StateBased, GridStateBased
+from bluesky.traffic.asas import statebased
+
+# Skip the untiled dense method above this number of aircraft
+DENSE_MAX = 5000
+# Tile size for the tiled dense method
+TILE = 256
+
+
+def randomtraffic(ntraf, size=20.0, seed=42):
+    ''' Generate random traffic in a square area of size x size degrees. '''
+    rng = np.random.default_rng(seed)
+    traf = SimpleNamespace(ntraf=ntraf, id=[f'AC{i:05d}' for i in range(ntraf)])
+    traf.lat = 50.0 + rng.uniform(-0.5 * size, 0.5 * size, ntraf)
+    traf.lon = 5.0 + rng.uniform(-0.5 * size, 0.5 * size, ntraf)
+    traf.alt = rng.uniform(2000.0, 40000.0, ntraf) * ft
+    traf.trk = rng.uniform(0.0, 360.0, ntraf)
+    traf.gs = rng.uniform(100.0, 250.0, ntraf)
+    traf.vs = rng.choice([-10.0, 0.0, 0.0, 10.0], ntraf)
+    traf.gseast = traf.gs * np.sin(np.radians(traf.trk))
+    traf.gsnorth = traf.gs * np.cos(np.radians(traf.trk))
+    return traf
+
+
+def bench(method, traf, tile=0, repeat=3):
+    ''' Return the best time of repeat calls to the detect function of method,
+        and the peak memory use [MB] of one call. '''
+    settings.asas_cdtile = tile
+    rpz = np.ones(traf.ntraf) * 5.0 * nm
+    hpz = np.ones(traf.ntraf) * 1000.0 * ft
+    dtlook = np.ones(traf.ntraf) * 300.0
+
+    def detect():
+        return method.detect(None, traf, traf, rpz, hpz, dtlook)
+
+    tracemalloc.start()
+    detect()
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+
+    return min(timeit.Timer(detect).repeat(repeat=repeat, number=1)), peak
+
+
+def main(sizes):
+    nan = (float('nan'), float('nan'))
+    print(f'{"":8} {"StateBased":>20} {f"StateBased tile={TILE}":>22} {"GridStateBased":>20}')
+    print(f'{"ntraf":>8}' + 3 * f' {"[s]":>10} {"[MB]":>10}')
+    for ntraf in sizes:
+        traf = randomtraffic(ntraf)
+        dense = bench(StateBased, traf) if ntraf <= DENSE_MAX else nan
+        tiled = bench(StateBased, traf, TILE)
+        grid = bench(GridStateBased, traf)
+        print(f'{ntraf:8d}' + ''.join(f' {t:10.4f} {m:10.1f}' for t, m in (dense, tiled, grid)))
+
+
+def threads(ntraf, nthreads):
+    if not hasattr(statebased, 'CStateBasedMT'):
+        print('casas_mt is not compiled, build it with bluesky/traffic/asas/src_cpp/setup.py')
+        return
+    traf = randomtraffic(ntraf)
+    print(f'{ntraf} aircraft')
+    print(f'{"threads":>8} {"[s]":>10} {"speedup":>10}')
+    tref = None
+    for n in nthreads:
+        settings.asas_cdthreads = n
+        t, _ = bench(statebased.CStateBasedMT, traf)
+        tref = tref or t
+        print(f'{n:8d} {t:10.4f} {tref / t:10.2f}')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--threads']:
+        threads(int(sys.argv[2]) if len(sys.argv) > 2 else 5000,
+                [int(n) for n in sys.argv[3:]] or [1, 2, 4, 8])
+    else:
+        main([int(n) for n in sys.argv[1:]] or [100, 500, 1000, 2000, 3000, 5000, 10000])
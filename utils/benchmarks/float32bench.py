@@ -0,0 +1,119 @@
+"""
+Benchmark of the float32 traffic state mode (settings.traf_float32) against
+the default float64 state, in memory use, computation time per timestep,
+and numerical drift of the positions.
+
+The traffic state is a TrafficArrays tree with the kinematic state of
+Traffic and a number of additional per-aircraft arrays, of which the size
+is similar to the full traffic tree (performance, autopilot, ASAS, LVNL).
+Aircraft accelerate, turn and climb during the scenario. Run from the
+BlueSky root directory:
+
+    python utils/benchmarks/float32bench.py [n1 n2 ...]
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+
+from bluesky import settings
+from bluesky.core import TrafficArrays
+from bluesky.traffic import Traffic
+
+# Number of additional float arrays per aircraft
+NEXTRA = 150
+# Simulated time [s] and timestep [s]
+DURATION = 3600.0
+DT = 1.0
+
+
+class Kinematics(TrafficArrays):
+    ''' Traffic state with the kinematics of Traffic. '''
+    float64vars = Traffic.float64vars
+
+    def __init__(self):
+        super().__init__()
+        TrafficArrays.setroot(self)
+        self.ntraf = 0
+        with self.settrafarrays():
+            self.lat = np.array([])
+            self.lon = np.array([])
+            self.alt = np.array([])
+            self.distflown = np.array([])
+            self.tas = np.array([])
+            self.trk = np.array([])
+            self.vs = np.array([])
+            self.gsnorth = np.array([])
+            self.gseast = np.array([])
+            self.coslat = np.array([])
+            for i in range(NEXTRA):
+                setattr(self, f'extra{i}', np.array([]))
+
+    def update(self, dt, t):
+        # Additional state (performance, autopilot, ASAS) is updated before
+        # the kinematics, like in Traffic.update: read and write each array
+        for i in range(NEXTRA):
+            arr = getattr(self, f'extra{i}')
+            arr *= 0.999
+            arr += self.tas
+
+        idx = np.arange(self.ntraf)
+        seltas = 150.0 + 50.0 * np.sin(t / 600.0 + idx)
+        turnrate = 3.0 * (idx % 3 - 1) * (t % 900 < 60)
+        self.vs[:] = 5.0 * np.cos(t / 300.0 + idx)
+        self.tas = self.tas + np.clip(seltas - self.tas, -0.5 * dt, 0.5 * dt)
+        self.trk = (self.trk + turnrate * dt) % 360.0
+        self.gsnorth = self.tas * np.cos(np.radians(self.trk))
+        self.gseast = self.tas * np.sin(np.radians(self.trk))
+        self.alt = np.round(self.alt + self.vs * dt, 6)
+        self.lat = self.lat + np.degrees(dt * self.gsnorth / 6371000.0)
+        self.coslat = np.cos(np.deg2rad(self.lat))
+        self.lon = self.lon + np.degrees(dt * self.gseast / self.coslat / 6371000.0)
+        self.distflown += self.tas * dt
+
+        self.castarrays()
+
+
+def run(ntraf, float32):
+    ''' Run the scenario, and return the traffic, the memory use of the
+        traffic arrays [MB] and the computation time per timestep [ms]. '''
+    settings.traf_float32 = float32
+    traf = Kinematics()
+    settings.traf_float32 = False
+
+    rng = np.random.default_rng(42)
+    traf.create(ntraf)
+    traf.ntraf = ntraf
+    traf.lat[:] = rng.uniform(50.0, 54.0, ntraf)
+    traf.lon[:] = rng.uniform(2.0, 8.0, ntraf)
+    traf.alt[:] = rng.uniform(1000.0, 10000.0, ntraf)
+    traf.tas[:] = rng.uniform(100.0, 200.0, ntraf)
+    traf.trk[:] = rng.uniform(0.0, 360.0, ntraf)
+
+    nsteps = int(DURATION / DT)
+    t0 = time.perf_counter()
+    for step in range(nsteps):
+        traf.update(DT, step * DT)
+    tstep = (time.perf_counter() - t0) / nsteps * 1e3
+
+    memory = sum(traf.__dict__[v].nbytes for v in traf._ArrVars) / 1e6
+    return traf, memory, tstep
+
+
+def main(sizes):
+    print(f'{"":8} {"float64":>20} {"float32":>20} {"drift after 1 hour":>24}')
+    print(f'{"ntraf":>8}' + 2 * f' {"[MB]":>9} {"[ms/step]":>10}' + f' {"pos [m]":>11} {"alt [m]":>12}')
+    for ntraf in sizes:
+        ref, mem64, t64 = run(ntraf, False)
+        traf, mem32, t32 = run(ntraf, True)
+        dist = 6371000.0 * np.hypot(np.radians(traf.lat - ref.lat),
+                                    np.radians(traf.lon - ref.lon) * ref.coslat)
+        dalt = np.abs(traf.alt - ref.alt)
+        print(f'{ntraf:8d} {mem64:9.1f} {t64:10.3f} {mem32:9.1f} {t32:10.3f} '
+              f'{np.max(dist):11.4f} {np.max(dalt):12.6f}')
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1000, 10000, 50000])